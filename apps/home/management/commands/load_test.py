@@ -0,0 +1,490 @@
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from apps.home.management.commands.smoke_benchmark import request_host
+from apps.venue.constants import FoodType
+from apps.venue.models import BookingModel, City, Price, VenueModel
+from apps.venue.services.location import LOCATION_COOKIE_SALT
+
+# Relative weight of each scenario in the replayed traffic
+DEFAULT_MIX = {
+    "home": 15,
+    "search": 25,
+    "city": 15,
+    "venue": 15,
+    "venue_location": 10,
+    "booking": 5,
+    "dashboard": 10,
+    "vendor_stats": 5,
+}
+
+# Scenarios that need --user / --vendor
+CUSTOMER_SCENARIOS = {"booking", "dashboard"}
+VENDOR_SCENARIOS = {"vendor_stats"}
+
+DASHBOARD_URLS = ("users:profile", "users:bookings", "users:recent_venues", "users:recent_transactions")
+
+# Budget keys: upper limits, except min_rps
+BUDGET_KEYS = ("p50_ms", "p95_ms", "p99_ms", "error_rate", "min_rps")
+
+
+def parse_mix(value):
+    """``home=20,search=30`` -> ``{"home": 20, "search": 30}``."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise CommandError(f"Unknown scenario {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight for {name!r}: {weight!r}")
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def percentile(timings, fraction):
+    """Nearest-rank percentile of already sorted ``timings``."""
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+class Targets:
+    """Cities, venues and price ranges sampled from the database for the scenarios to pick from."""
+
+    def __init__(self, sample=50):
+        self.cities = list(City.objects.exclude(slug=None).values("id", "name", "slug")[:sample])
+        self.venues = list(
+            VenueModel.objects.exclude(slug=None).values("id", "name", "slug", "capacity", "lat", "lng")[:sample]
+        )
+        priced = set(Price.objects.filter(venue__in=[v["id"] for v in self.venues]).values_list("venue_id", flat=True))
+        self.bookable = [venue for venue in self.venues if venue["id"] in priced and venue["capacity"]]
+        prices = Price.objects.aggregate(low=Min("price"), high=Max("price"))
+        self.price_low = int(prices["low"] or 0)
+        self.price_high = int(prices["high"] or 0)
+
+    def missing(self, scenario):
+        """Why ``scenario`` can't run against this database, or None."""
+        if scenario == "city" and not self.cities:
+            return "no cities with a slug"
+        if scenario in ("venue", "venue_location") and not self.venues:
+            return "no venues with a slug"
+        if scenario == "booking" and not self.bookable:
+            return "no venues with a capacity and a price"
+        return None
+
+
+class Scenarios:
+    """
+    Builds one request for a scenario as ``(method, path, body, cookies)``;
+    ``rng`` is per worker so runs with the same --seed replay the same mix.
+    """
+
+    def __init__(self, targets, rng, customer_id=None):
+        self.targets = targets
+        self.rng = rng
+        self.customer_id = customer_id
+
+    def build(self, scenario):
+        return getattr(self, scenario)()
+
+    def home(self):
+        return "GET", reverse("home:index"), None, {}
+
+    def search(self):
+        rng = self.rng
+        params = {}
+        if self.targets.venues and rng.random() < 0.5:
+            params["q"] = rng.choice(self.targets.venues)["name"].split()[0]
+        if self.targets.cities and rng.random() < 0.4:
+            params["city"] = rng.choice(self.targets.cities)["id"]
+        if rng.random() < 0.3:
+            params["min_capacity"] = rng.choice((50, 100, 200, 500))
+        if self.targets.price_high and rng.random() < 0.4:
+            low = rng.randint(self.targets.price_low, self.targets.price_high)
+            params["min_price"] = low
+            params["max_price"] = rng.randint(low, self.targets.price_high)
+        if rng.random() < 0.2:
+            params["date"] = (timezone.now().date() + timedelta(days=rng.randint(1, 90))).isoformat()
+        return "GET", f"{reverse('home:search')}?{urlencode(params)}", None, {}
+
+    def city(self):
+        slug = self.rng.choice(self.targets.cities)["slug"]
+        return "GET", reverse("venue:city-detail", args=[slug]), None, {}
+
+    def venue(self):
+        slug = self.rng.choice(self.targets.venues)["slug"]
+        return "GET", reverse("venue:venue-detail", args=[slug]), None, {}
+
+    def venue_location(self):
+        # A visitor near a random venue, as store_user_location would have remembered them
+        near = self.rng.choice(self.targets.venues)
+        lat = float(near["lat"]) + self.rng.uniform(-0.05, 0.05)
+        lng = float(near["lng"]) + self.rng.uniform(-0.05, 0.05)
+        name = getattr(settings, "USER_LOCATION_COOKIE_NAME", "user_location")
+        value = signing.get_cookie_signer(salt=name + LOCATION_COOKIE_SALT).sign(f"{lat:.6f},{lng:.6f}")
+        _, path, body, cookies = self.venue()
+        return "GET", path, body, {**cookies, name: value}
+
+    def booking(self):
+        venue = self.rng.choice(self.targets.bookable)
+        body = {
+            "venue": venue["id"],
+            "user": self.customer_id,
+            "total_people": self.rng.randint(1, min(venue["capacity"], 300)),
+            "meal_type": FoodType.VEG.value,
+            # Far enough ahead to stay clear of real near-term bookings
+            "booked_for": (timezone.now().date() + timedelta(days=self.rng.randint(180, 540))).isoformat(),
+        }
+        return "POST", reverse("venue:booking", args=[venue["id"]]), json.dumps(body), {}
+
+    def dashboard(self):
+        return "GET", reverse(self.rng.choice(DASHBOARD_URLS)), None, {}
+
+    def vendor_stats(self):
+        return "GET", reverse("venue:vendor-stats"), None, {}
+
+
+def session_cookie(user):
+    """A logged-in session for ``user`` in the configured session store, as (cookie name, value)."""
+    client = Client()
+    client.force_login(user)
+    return settings.SESSION_COOKIE_NAME, client.cookies[settings.SESSION_COOKIE_NAME].value
+
+
+class InProcessTransport:
+    """Sends requests through the Django test client in this process."""
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False, HTTP_HOST=request_host())
+
+    def send(self, method, path, body, cookies):
+        headers = {"HTTP_COOKIE": "; ".join(f"{k}={v}" for k, v in cookies.items())}
+        if method == "POST":
+            response = self.client.post(path, data=body, content_type="application/json", **headers)
+        else:
+            response = self.client.get(path, **headers)
+        return response.status_code, response.content
+
+    def close(self):
+        connection.close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Report redirects like the test client does instead of following them
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """Sends requests to a running server over HTTP; sessions must live in the database this command uses."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(_NoRedirect)
+        # Double-submit CSRF: any token works as long as the cookie and header agree
+        self.csrf_token = get_random_string(32)
+
+    def send(self, method, path, body, cookies):
+        cookies = {**cookies, settings.CSRF_COOKIE_NAME: self.csrf_token}
+        request = urllib.request.Request(
+            self.base_url + path, method=method, data=body.encode() if body else None,
+            headers={
+                "Cookie": "; ".join(f"{k}={v}" for k, v in cookies.items()),
+                "Content-Type": "application/json",
+                "X-CSRFToken": self.csrf_token,
+                "Origin": self.base_url,
+                "Referer": self.base_url + "/",
+            },
+        )
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def close(self):
+        connection.close()
+
+
+def run_load_test(mix, concurrency, total_requests=None, duration=None, base_url=None,
+                  customer=None, vendor=None, warmup=1, seed=None, booking_ids=None):
+    """
+    Replay ``mix`` (scenario -> weight) with ``concurrency`` client threads,
+    each with its own sessions, until ``total_requests`` have been sent or
+    ``duration`` seconds have passed. A response is an error when sending it
+    raised or its status is 5xx; other statuses are reported per scenario.
+
+    Returns the per-scenario and overall report. The ids of bookings the run
+    creates are appended to ``booking_ids`` as they are made, so the caller
+    can still remove them when the run fails or is interrupted.
+    """
+    targets = Targets()
+    skipped = {}
+    for scenario in list(mix):
+        reason = targets.missing(scenario)
+        if reason is None and scenario in CUSTOMER_SCENARIOS and customer is None:
+            reason = "needs --user"
+        if reason is None and scenario in VENDOR_SCENARIOS and vendor is None:
+            reason = "needs --vendor"
+        if reason:
+            skipped[scenario] = reason
+            del mix[scenario]
+    if not mix:
+        raise CommandError(f"Nothing to run: {skipped}")
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = {name: {"timings": [], "errors": 0, "statuses": {}} for name in names}
+    booking_ids = booking_ids if booking_ids is not None else []
+    lock = threading.Lock()
+    stop = threading.Event()
+    remaining = [total_requests]
+    seed = seed if seed is not None else random.randrange(2 ** 32)
+    failures = []
+    clock = {}
+
+    def mark_start():
+        # Runs once every client is logged in and ready, just before they are released
+        clock["began"] = time.perf_counter()
+        clock["deadline"] = clock["began"] + duration if duration is not None else None
+
+    def next_slot():
+        if stop.is_set():
+            return False
+        if clock["deadline"] is not None and time.perf_counter() >= clock["deadline"]:
+            return False
+        with lock:
+            if remaining[0] is None:
+                return True
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker(index, start):
+        transport = HttpTransport(base_url) if base_url else InProcessTransport()
+        try:
+            customer_cookies = dict([session_cookie(customer)]) if customer else {}
+            vendor_cookies = dict([session_cookie(vendor)]) if vendor else {}
+            scenarios = Scenarios(targets, random.Random(seed + index), customer_id=customer and customer.pk)
+            start.wait()
+
+            while next_slot():
+                scenario = scenarios.rng.choices(names, weights)[0]
+                method, path, body, extra = scenarios.build(scenario)
+                if scenario in CUSTOMER_SCENARIOS:
+                    extra = {**customer_cookies, **extra}
+                elif scenario in VENDOR_SCENARIOS:
+                    extra = {**vendor_cookies, **extra}
+
+                started = time.perf_counter()
+                try:
+                    status, content = transport.send(method, path, body, extra)
+                except Exception as e:
+                    status, content = type(e).__name__, b""
+                elapsed = (time.perf_counter() - started) * 1000
+
+                with lock:
+                    result = results[scenario]
+                    result["timings"].append(elapsed)
+                    result["statuses"][str(status)] = result["statuses"].get(str(status), 0) + 1
+                    if not isinstance(status, int) or status >= 500:
+                        result["errors"] += 1
+                    if scenario == "booking" and status == 201:
+                        booking_ids.append(json.loads(content)["booking_id"])
+        except Exception as e:
+            failures.append(e)
+            start.abort()
+        finally:
+            transport.close()
+
+    if warmup:
+        transport = HttpTransport(base_url) if base_url else InProcessTransport()
+        warm = Scenarios(targets, random.Random(seed))
+        for name in names:
+            if name in CUSTOMER_SCENARIOS | VENDOR_SCENARIOS:
+                continue
+            for _ in range(warmup):
+                method, path, body, cookies = warm.build(name)
+                try:
+                    transport.send(method, path, body, cookies)
+                except Exception as e:
+                    raise CommandError(f"Warm-up request to {path} failed: {e!r}")
+
+    start = threading.Barrier(concurrency, action=mark_start)
+    threads = [threading.Thread(target=worker, args=(index, start)) for index in range(concurrency)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        # On Ctrl-C, let each client finish its request in flight and stop, so
+        # nothing is booked after the caller has cleaned up
+        stop.set()
+        start.abort()
+        for thread in threads:
+            if thread.is_alive():
+                thread.join()
+    if failures:
+        raise CommandError(f"A client failed: {failures[0]!r}")
+    elapsed = time.perf_counter() - clock["began"]
+
+    report = {
+        "seed": seed,
+        "concurrency": concurrency,
+        "target": base_url or "in-process",
+        "duration_s": round(elapsed, 3),
+        "endpoints": {},
+        "skipped": skipped,
+    }
+    everything = []
+    errors = 0
+    for name, result in results.items():
+        timings = sorted(result["timings"])
+        everything += timings
+        errors += result["errors"]
+        if timings:
+            report["endpoints"][name] = summarize(timings, result["errors"], elapsed, result["statuses"])
+    everything.sort()
+    report["overall"] = summarize(everything, errors, elapsed) if everything else {}
+    return report
+
+
+def summarize(timings, errors, elapsed, statuses=None):
+    summary = {
+        "requests": len(timings),
+        "rps": round(len(timings) / elapsed, 2) if elapsed else None,
+        "error_rate": round(errors / len(timings), 4),
+        "mean_ms": round(sum(timings) / len(timings), 2),
+        "p50_ms": round(percentile(timings, 0.50), 2),
+        "p95_ms": round(percentile(timings, 0.95), 2),
+        "p99_ms": round(percentile(timings, 0.99), 2),
+        "max_ms": round(timings[-1], 2),
+    }
+    if statuses is not None:
+        summary["statuses"] = statuses
+    return summary
+
+
+def check_budgets(report, budgets):
+    """
+    Compare ``report`` against ``budgets`` (``{"overall" or scenario: {key: limit}}``,
+    keys from BUDGET_KEYS) and return one message per exceeded limit.
+    """
+    violations = []
+    for name, limits in budgets.items():
+        summary = report["overall"] if name == "overall" else report["endpoints"].get(name)
+        if not summary:
+            continue
+        for key, limit in limits.items():
+            if key not in BUDGET_KEYS:
+                raise CommandError(f"Unknown budget {key!r} for {name}; choose from {', '.join(BUDGET_KEYS)}")
+            if key == "min_rps":
+                if summary["rps"] < limit:
+                    violations.append(f"{name}: {summary['rps']} requests/s is below {limit}")
+            elif summary[key] > limit:
+                violations.append(f"{name}: {key} {summary[key]} exceeds {limit}")
+    return violations
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays a weighted traffic mix with concurrent clients, in process or against a running server, '
+        'and reports throughput, latency percentiles and error rates per scenario as JSON'
+    )
+
+    def add_arguments(self, parser):
+        default_mix = ",".join(f"{name}={weight}" for name, weight in DEFAULT_MIX.items())
+        parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX), help=f'Scenario weights (default: {default_mix})')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=200, help='Total requests across all clients')
+        parser.add_argument('--duration', type=float, help='Run for this many seconds instead of a request count')
+        parser.add_argument(
+            '--base-url',
+            help='Send requests to a running server (e.g. http://127.0.0.1:8000) instead of the in-process test client; '
+                 'it must share this database so the login sessions resolve',
+        )
+        parser.add_argument('--user', help='Username for booking and dashboard scenarios')
+        parser.add_argument('--vendor', help='Vendor username for the vendor_stats scenario')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed requests per anonymous scenario first')
+        parser.add_argument('--seed', type=int, help='Seed for the request mix, to replay a run')
+        parser.add_argument('--keep-bookings', action='store_true', help='Keep the held bookings the run created')
+        parser.add_argument('--budgets', help='JSON file of limits, e.g. {"overall": {"p95_ms": 300}, "booking": {"error_rate": 0}}')
+        parser.add_argument('--max-p95-ms', type=float, help='Overall p95 budget in milliseconds')
+        parser.add_argument('--max-error-rate', type=float, help='Overall error rate budget (0-1)')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        if options['base_url'] and urlsplit(options['base_url']).scheme not in ("http", "https"):
+            raise CommandError("--base-url must be an http(s) URL")
+
+        budgets = {}
+        if options['budgets']:
+            with open(options['budgets']) as f:
+                budgets = json.load(f)
+        overall = budgets.setdefault("overall", {})
+        if options['max_p95_ms'] is not None:
+            overall["p95_ms"] = options['max_p95_ms']
+        if options['max_error_rate'] is not None:
+            overall["error_rate"] = options['max_error_rate']
+
+        customer = self.get_user(options['user'])
+        vendor = self.get_user(options['vendor'])
+        booking_ids = []
+        try:
+            report = run_load_test(
+                dict(options['mix']),
+                options['concurrency'],
+                total_requests=None if options['duration'] else options['requests'],
+                duration=options['duration'],
+                base_url=options['base_url'],
+                customer=customer,
+                vendor=vendor,
+                warmup=options['warmup'],
+                seed=options['seed'],
+                booking_ids=booking_ids,
+            )
+        finally:
+            # Also after a failed client, a failed warm-up or Ctrl-C
+            if booking_ids and not options['keep_bookings']:
+                BookingModel.objects.filter(id__in=booking_ids).delete()
+        report["bookings_created"] = len(booking_ids)
+        report["budget_violations"] = check_budgets(report, budgets)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        if report["budget_violations"]:
+            raise CommandError("Performance budget exceeded:\n" + "\n".join(report["budget_violations"]))
+
+    def get_user(self, username):
+        if not username:
+            return None
+        try:
+            return get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {username!r}")
@@ -0,0 +1,126 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+DEFAULT_PATHS = ["/", "/venue/cities/", "/search?q=hall"]
+
+
+def request_host():
+    """A host the current settings accept, for requests built in process."""
+    return next((h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")), "localhost")
+
+
+def benchmark(paths, requests):
+    """
+    Time ``requests`` sequential GETs per path through a real WSGI handler
+    (after one warm-up request), so connection setup and teardown between
+    requests is included, and count the queries and database connections
+    each path costs. Returns one result dict per path.
+    """
+    factory = RequestFactory(HTTP_HOST=request_host())
+    handler = WSGIHandler()
+    queries = []
+    opened = []
+
+    def get(path):
+        status = []
+        response = handler(factory.get(path).environ, lambda line, headers, exc_info=None: status.append(line))
+        b"".join(response)
+        response.close()
+        return int(status[0].split()[0])
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def count_connection(sender, **kwargs):
+        opened.append(1)
+
+    results = []
+    connection_created.connect(count_connection)
+    try:
+        for path in paths:
+            get(path)
+            queries.clear()
+            opened.clear()
+            timings = []
+            with connection.execute_wrapper(count_query):
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    status = get(path)
+                    timings.append((time.perf_counter() - started) * 1000)
+
+            timings.sort()
+            results.append({
+                "path": path,
+                "status": status,
+                "mean_ms": round(statistics.fmean(timings), 2),
+                "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+                "queries": round(len(queries) / requests, 1),
+                "connections": len(opened),
+            })
+    finally:
+        connection_created.disconnect(count_connection)
+    return results
+
+
+class Command(BaseCommand):
+    help = 'Times repeated page requests under the current settings, or compares several settings profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=30, help='Timed requests per path')
+        parser.add_argument('--path', action='append', help=f'Path to request (default: {", ".join(DEFAULT_PATHS)})')
+        parser.add_argument(
+            '--compare', nargs='+', metavar='SETTINGS_MODULE',
+            help='Run once per settings module in a subprocess, e.g. core.settings.dev core.settings.production',
+        )
+        parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+
+    def handle(self, *args, **options):
+        paths = options['path'] or DEFAULT_PATHS
+        if options['compare']:
+            results = {profile: self.run_profile(profile, paths, options['requests']) for profile in options['compare']}
+        else:
+            results = {os.environ.get("DJANGO_SETTINGS_MODULE", "current"): benchmark(paths, options['requests'])}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+
+        self.stdout.write(f"{'profile':<28} {'path':<24} {'status':>6} {'mean ms':>9} {'p95 ms':>9} {'queries':>8} {'conns':>6}")
+        for profile, rows in results.items():
+            for row in rows:
+                self.stdout.write(
+                    f"{profile:<28} {row['path']:<24} {row['status']:>6} {row['mean_ms']:>9} {row['p95_ms']:>9} "
+                    f"{row['queries']:>8} {row['connections']:>6}"
+                )
+
+    def run_profile(self, profile, paths, requests):
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "smoke_benchmark",
+            "--settings", profile, "--requests", str(requests), "--json",
+        ]
+        for path in paths:
+            command += ["--path", path]
+
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=profile)
+        # Local runs only: the production profile refuses to start without these
+        env.setdefault("DJANGO_SECRET_KEY", "smoke-benchmark-only")
+        env.setdefault("ALLOWED_HOSTS", "localhost")
+        env.setdefault("SECURE_COOKIES", "False")
+        env.setdefault("ALLOW_LOCAL_CACHE", "True")
+
+        completed = subprocess.run(command, capture_output=True, text=True, env=env)
+        if completed.returncode:
+            raise CommandError(f"{profile} failed (the production profile needs collectstatic first):\n{completed.stderr}")
+        return json.loads(completed.stdout)[profile]
@@ -1,3 +1,339 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from io import StringIO
+from unittest import mock
+
+import brotli
+import redis
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.core.cache import CacheHandler, caches
+from django.core.exceptions import ImproperlyConfigured
+from prometheus_client import REGISTRY
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from apps.venue.constants import FoodType
+from apps.venue.models import BookingModel, City, Price, VenueModel
+from core.logging import NonBlockingQueueHandler, RequestContextFilter, begin_request, end_request
+from core.middleware import sql_fingerprint
+
 
 # Create your tests here.
+class StaticAssetTest(TestCase):
+    """collectstatic writes hashed, precompressed assets and the middleware negotiates them."""
+
+    def setUp(self):
+        source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        os.makedirs(os.path.join(source, "css"))
+        with open(os.path.join(source, "css", "main.css"), "w") as css:
+            css.write("body { color: #333; }\n" * 200)
+
+        overrides = override_settings(
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+            STATIC_ROOT=self.root,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "core.storage.CompressedManifestStaticFilesStorage"},
+            },
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        self.url = staticfiles_storage.url("css/main.css")
+
+    def test_collectstatic_writes_hashed_gzip_variants(self):
+        self.assertRegex(self.url, r"^/static/css/main\.[0-9a-f]{12}\.css$")
+        hashed = os.path.join(self.root, self.url[len("/static/"):])
+        with open(hashed, "rb") as original, gzip.open(hashed + ".gz") as compressed:
+            self.assertEqual(compressed.read(), original.read())
+
+    def test_hashed_assets_are_served_compressed_and_immutable(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), b"body { color: #333; }\n" * 200)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"], HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 304)
+
+    def test_brotli_is_preferred_when_accepted(self):
+        hashed = os.path.join(self.root, self.url[len("/static/"):])
+        with open(hashed, "rb") as original, open(hashed + ".br", "rb") as compressed:
+            self.assertEqual(brotli.decompress(compressed.read()), original.read())
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(brotli.decompress(b"".join(response.streaming_content)), b"body { color: #333; }\n" * 200)
+
+    def test_identity_and_unhashed_requests(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(int(response["Content-Length"]), len("body { color: #333; }\n") * 200)
+
+        response = self.client.get("/static/css/main.css")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("immutable", response["Cache-Control"])
+
+        self.assertEqual(self.client.get("/static/../manage.py").status_code, 404)
+
+
+class ProductionSettingsTest(TestCase):
+    def load(self, **env):
+        sys.modules.pop("core.settings.production", None)
+        self.addCleanup(sys.modules.pop, "core.settings.production", None)
+        with mock.patch.dict(os.environ, {"DJANGO_SECRET_KEY": "not-a-secret", **env}):
+            return importlib.import_module("core.settings.production")
+
+    def test_production_profile(self):
+        production = self.load(ALLOWED_HOSTS="venuewise.com,.venuewise.com", REDIS_URL="redis://cache:6379/1")
+
+        self.assertFalse(production.DEBUG)
+        self.assertEqual(production.ALLOWED_HOSTS, ["venuewise.com", ".venuewise.com"])
+        self.assertNotIn("django_browser_reload", production.INSTALLED_APPS)
+        self.assertNotIn("django_browser_reload.middleware.BrowserReloadMiddleware", production.MIDDLEWARE)
+        self.assertTrue(production.DATABASES["default"]["CONN_HEALTH_CHECKS"])
+        self.assertEqual(production.TEMPLATES[0]["OPTIONS"]["loaders"][0][0], "django.template.loaders.cached.Loader")
+        self.assertEqual(production.SESSION_ENGINE, "django.contrib.sessions.backends.cached_db")
+        self.assertFalse(production.METRICS_ALLOW_ANONYMOUS)
+        self.assertFalse(production.REQUEST_PROFILING_SERVER_TIMING)
+
+        # The shared base profile is copied, never modified
+        base = importlib.import_module("core.settings.base")
+        self.assertNotIn("CONN_HEALTH_CHECKS", base.DATABASES["default"])
+        self.assertNotIn("loaders", base.TEMPLATES[0]["OPTIONS"])
+
+    def test_redis_cache_is_shared_by_both_aliases(self):
+        # Port 1 on localhost: nothing listens, so a lookup reaches redis-py and fails to connect
+        production = self.load(REDIS_URL="redis://127.0.0.1:1/1")
+        for alias in ("default", "fragments"):
+            self.assertEqual(production.CACHES[alias]["BACKEND"], "django.core.cache.backends.redis.RedisCache")
+        self.assertNotEqual(production.CACHES["default"]["KEY_PREFIX"], production.CACHES["fragments"]["KEY_PREFIX"])
+
+        # Build the configured backends for real: the redis package must be importable
+        with override_settings(CACHES=production.CACHES):
+            handler = CacheHandler()
+            for alias in ("default", "fragments"):
+                with self.assertRaises(redis.exceptions.ConnectionError):
+                    handler[alias].get("probe")
+
+    def test_server_entry_points_default_to_production(self):
+        for module, factory in (("core.wsgi", "django.core.wsgi.get_wsgi_application"),
+                                ("core.asgi", "django.core.asgi.get_asgi_application")):
+            sys.modules.pop(module, None)
+            self.addCleanup(sys.modules.pop, module, None)
+            with mock.patch.dict(os.environ), mock.patch(factory):
+                os.environ.pop("DJANGO_SETTINGS_MODULE", None)
+                importlib.import_module(module)
+                self.assertEqual(os.environ["DJANGO_SETTINGS_MODULE"], "core.settings.production")
+
+    def test_missing_redis_url_fails_loudly(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, "REDIS_URL"):
+            self.load(REDIS_URL="")
+
+        production = self.load(REDIS_URL="", ALLOW_LOCAL_CACHE="True")
+        self.assertEqual(production.CACHES["default"]["BACKEND"], "django.core.cache.backends.locmem.LocMemCache")
+
+
+@override_settings(
+    REQUEST_PROFILING_SAMPLE_RATE=1.0, REQUEST_PROFILING_N_PLUS_ONE_THRESHOLD=3, REQUEST_PROFILING_SERVER_TIMING=True
+)
+class RequestProfilingTest(TestCase):
+    def setUp(self):
+        caches["fragments"].clear()
+        for index in range(4):
+            venue = VenueModel.objects.create(name=f"Profiled Hall {index}", capacity=100, lat=27.7, lng=85.3)
+            Price.objects.create(venue=venue, price=500, type=FoodType.VEG.value)
+
+    def test_server_timing_and_suspected_n_plus_one(self):
+        with self.assertLogs("core.profiling", "INFO") as logs:
+            response = self.client.get("/search", {"q": "Profiled"})
+
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", view;dur=[\d.]+, template;dur=[\d.]+, total;dur=[\d.]+$')
+        summary, warning = logs.records[0], logs.records[-1]
+        self.assertEqual(summary.view, "home:search")
+        self.assertGreaterEqual(summary.queries, 4)
+        self.assertEqual(warning.levelname, "WARNING")
+        self.assertIn("Suspected N+1", warning.getMessage())
+        self.assertTrue(any(suspect["origin"].startswith("apps/venue/models.py") for suspect in warning.suspects))
+
+    @override_settings(REQUEST_PROFILING_SERVER_TIMING=False)
+    def test_server_timing_is_staff_only_when_off(self):
+        with self.assertLogs("core.profiling", "INFO"):
+            self.assertNotIn("Server-Timing", self.client.get("/search"))
+
+        staff = get_user_model().objects.create_user(
+            username="profiler", email="profiler@example.com", password="pass", is_staff=True
+        )
+        self.client.force_login(staff)
+        self.assertIn("Server-Timing", self.client.get("/search"))
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0)
+    def test_disabled_when_not_sampled(self):
+        self.assertNotIn("Server-Timing", self.client.get("/search"))
+
+    def test_fingerprint_ignores_literals_and_in_list_length(self):
+        self.assertEqual(
+            sql_fingerprint("SELECT * FROM venue WHERE id IN (%s, %s, %s) AND name = 'a'"),
+            sql_fingerprint("SELECT * FROM venue WHERE id IN (%s)  AND name = 'b'"),
+        )
+
+
+class MetricsEndpointTest(TestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_and_cache_lookups_are_exported(self):
+        before = self.sample(
+            "venuewise_http_request_duration_seconds_count", view="venue:cities", method="GET", status="200"
+        )
+        self.client.get("/venue/cities/")
+        self.client.get("/venue/cities/")
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertEqual(
+            self.sample("venuewise_http_request_duration_seconds_count", view="venue:cities", method="GET", status="200"),
+            before + 2,
+        )
+        body = response.content.decode()
+        self.assertIn('venuewise_cache_lookups_total{cache="city_directory",result="hit"}', body)
+        self.assertIn('venuewise_http_request_db_queries_bucket{le="0.0",view="venue:cities"}', body)
+
+    def test_unknown_paths_share_one_label(self):
+        self.client.get("/venue/cities/nope/deeper/")
+        self.assertIn('view="unresolved"', self.client.get("/metrics").content.decode())
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None, METRICS_ALLOW_ANONYMOUS=False)
+    def test_anonymous_access_is_refused_by_default(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    def test_multiprocess_directory_is_aggregated(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with mock.patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory}):
+            response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        # Samples come from the (empty) shared directory, not this process's registry
+        self.assertNotIn(b"venuewise_http_request_duration_seconds_count", response.content)
+
+
+class CollectingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class RequestLoggingTest(TestCase):
+    def test_request_id_is_echoed_and_logged(self):
+        with self.assertLogs("core.requests", "INFO") as logs:
+            response = self.client.get("/venue/cities/", HTTP_X_REQUEST_ID="edge-1234")
+
+        self.assertEqual(response["X-Request-ID"], "edge-1234")
+        record = logs.records[-1]
+        self.assertEqual((record.view, record.status), ("venue:cities", 200))
+        self.assertGreater(record.duration_ms, 0)
+
+    def test_unsafe_incoming_ids_are_replaced(self):
+        response = self.client.get("/venue/cities/", HTTP_X_REQUEST_ID="bad id\nwith newline")
+        self.assertRegex(response["X-Request-ID"], r"^[0-9a-f]{32}$")
+
+    def test_queue_handler_stamps_request_context_and_keeps_tracebacks_apart(self):
+        target = CollectingHandler()
+        handler = NonBlockingQueueHandler([target])
+        handler.addFilter(RequestContextFilter())
+        logger = logging.getLogger("tests.queue")
+        logger.addHandler(handler)
+        logger.propagate = False
+        self.addCleanup(setattr, logger, "propagate", True)
+        self.addCleanup(logger.removeHandler, handler)
+
+        request_id, token = begin_request("req-1")
+        try:
+            logger.warning("booking %s failed", 7)
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("lookup failed")
+        finally:
+            end_request(token)
+        handler.stop()
+
+        first, second = target.records
+        self.assertEqual((first.getMessage(), first.request_id), ("booking 7 failed", "req-1"))
+        self.assertIsNotNone(first.elapsed_ms)
+        self.assertEqual(second.getMessage(), "lookup failed")
+        self.assertIn("ValueError: boom", second.exc_text)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = NonBlockingQueueHandler([CollectingHandler()], queue_size=1)
+        handler.stop()
+        for index in range(3):
+            handler.handle(logging.makeLogRecord({"msg": f"record {index}"}))
+        self.assertEqual(handler.dropped, 2)
+
+
+class LoadTestCommandTest(TransactionTestCase):
+    """load_test replays the mix with real threads, so the data has to be committed."""
+
+    def setUp(self):
+        city = City.objects.create(name="Pokhara")
+        venue = VenueModel.objects.create(name="Lakeside Hall", capacity=300, lat=28.2, lng=83.9, city=city)
+        Price.objects.create(venue=venue, price=1200, type=FoodType.VEG.value)
+        get_user_model().objects.create_user(username="loadtester", email="load@example.com", password="pass")
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("load_test", "--requests", "40", "--concurrency", "3", "--seed", "7", *args, stdout=out)
+        return json.loads(out.getvalue())
+
+    def test_reports_every_scenario_and_removes_its_bookings(self):
+        report = self.run_command("--user", "loadtester")
+
+        self.assertEqual(report["overall"]["requests"], 40)
+        self.assertEqual(report["skipped"], {"vendor_stats": "needs --vendor"})
+        self.assertLessEqual(report["overall"]["p50_ms"], report["overall"]["p99_ms"])
+        for name, summary in report["endpoints"].items():
+            self.assertEqual(summary["error_rate"], 0, (name, summary["statuses"]))
+        self.assertEqual(report["budget_violations"], [])
+        self.assertFalse(BookingModel.objects.exists())
+
+    def test_bookings_are_removed_when_the_run_fails(self):
+        created = []
+
+        def fail(*args, **kwargs):
+            created.append(BookingModel.objects.count())
+            raise RuntimeError("report failed")
+
+        with mock.patch("apps.home.management.commands.load_test.summarize", side_effect=fail):
+            with self.assertRaisesMessage(RuntimeError, "report failed"):
+                self.run_command("--user", "loadtester", "--mix", "booking=1")
+        self.assertGreater(created[0], 0)
+        self.assertFalse(BookingModel.objects.exists())
+
+    def test_budget_violation_fails_the_command(self):
+        with self.assertRaisesMessage(CommandError, "Performance budget exceeded"):
+            self.run_command("--mix", "home=1,search=1", "--max-p95-ms", "0.001")
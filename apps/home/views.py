@@ -1,12 +1,17 @@
+import logging
 from decimal import Decimal
 
 from django.db.models import Q
 from django.views.generic import TemplateView
 
 from apps.venue.constants import FoodType, VenueBookingStatus, BookingStatus
-from apps.venue.models import City, VenueModel, Price
+from apps.venue.models import City, VenueModel, Price, BookingModel
+from apps.venue.services.bookings import blocking_bookings_q
+from apps.venue.services.cities import get_city_directory
 from django.db.models import Sum, Count, ExpressionWrapper, FloatField, F
 
+logger = logging.getLogger(__name__)
+
 
 # Create your views here.
 class HomeView(TemplateView):
@@ -14,7 +19,7 @@ class HomeView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        cities = City.objects.all()
+        cities = get_city_directory().cities
         venues = VenueModel.objects.all()[:8]
 
         context.update({
@@ -36,9 +41,10 @@ class SearchView(TemplateView):
         max_price = self.request.GET.get('max_price')
         date = self.request.GET.get('date')
 
-        qs = VenueModel.objects.all()
+        # Cards are rendered through the fragment cache; city is only read on a miss
+        qs = VenueModel.objects.select_related("city")
 
-        cities = City.objects.all()
+        cities = get_city_directory().cities
 
         if search_term:
             qs = qs.filter(Q(name__icontains=search_term) | Q(city__name__icontains=search_term))
@@ -64,10 +70,14 @@ class SearchView(TemplateView):
                 qs = qs.filter(prices__price__lte=max_price)
 
         except Exception as e:
-            print("Price filter error:", e)
+            logger.info(
+                "Ignoring invalid price filter: %s", e,
+                extra={"min_price": self.request.GET.get("min_price"), "max_price": self.request.GET.get("max_price")},
+            )
 
         if date:
-            qs = qs.exclude(venue_bookings__booked_for=date, venue_bookings__status=BookingStatus.ONGOING)
+            booked_venues = BookingModel.objects.filter(blocking_bookings_q(), booked_for=date).values("venue_id")
+            qs = qs.exclude(id__in=booked_venues)
 
         context.update({
             "venues": qs.distinct(),
@@ -13,6 +13,10 @@ class AuthUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'is_staff', 'is_active', 'is_vendor', 'approve_button')
     actions = ['make_vendor']
 
+    def get_queryset(self, request):
+        # is_vendor is rendered per row; prefetch groups so it costs no extra queries
+        return super().get_queryset(request).prefetch_related('groups')
+
     @admin.action(description="Approve selected users to Vendors Group")
     def make_vendor(self, request, queryset):
         group, created = Group.objects.get_or_create(name='Vendors')
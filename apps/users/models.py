@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils.functional import cached_property
 
 
 # Create your models here.
@@ -7,6 +8,16 @@ class AuthUser(AbstractUser):
     profile_image = models.ImageField(upload_to="users/", null=True, blank=True)
     phone = models.CharField(max_length=20, null=True, blank=True)
 
+    @cached_property
+    def group_names(self):
+        # Loaded once per instance (i.e. once per request for request.user);
+        # reuses prefetch_related("groups") results on admin changelists.
+        return frozenset(group.name for group in self.groups.all())
+
     @property
     def is_vendor(self):
-        return self.groups.filter(name='Vendors').exists()
+        return 'Vendors' in self.group_names
+
+    def clear_group_cache(self):
+        self.__dict__.pop('group_names', None)
+        getattr(self, '_prefetched_objects_cache', {}).pop('groups', None)
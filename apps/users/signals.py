@@ -1,6 +1,21 @@
 from django.contrib.auth import logout
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
 from django.contrib import messages
 from django.shortcuts import redirect
 from django.urls import reverse
+
+from apps.users.models import AuthUser
+from apps.venue.services.images import schedule_derivatives
+
+
+@receiver(m2m_changed, sender=AuthUser.groups.through)
+def reset_cached_groups(sender, instance, **kwargs):
+    if isinstance(instance, AuthUser) and kwargs.get('action', '').startswith('post_'):
+        instance.clear_group_cache()
+
+
+@receiver(post_save, sender=AuthUser)
+def generate_profile_image_derivatives(sender, instance, **kwargs):
+    schedule_derivatives(instance.profile_image)
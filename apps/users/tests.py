@@ -1,3 +1,122 @@
+import re
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.venue.constants import BookingStatus, FoodType
+from apps.venue.models import BookingModel, City, KhaltiTransaction, Price, VenueModel, VenueRatingModel
+
+User = get_user_model()
+
 
 # Create your tests here.
+class DashboardQueryTest(TestCase):
+    """
+    The booking, recent venue and transaction pages must cost the same number
+    of queries for a short history and a long one, and keyset pagination must
+    walk the whole history exactly once.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="regular", email="regular@example.com", password="pass")
+        self.city = City.objects.create(name="Pokhara")
+        self.client.force_login(self.user)
+        self.venues = 0
+
+    def add_history(self, count):
+        today = timezone.now().date()
+        for _ in range(count):
+            self.venues += 1
+            venue = VenueModel.objects.create(
+                name=f"Venue {self.venues}", capacity=100, lat=27.7, lng=85.3, city=self.city
+            )
+            Price.objects.create(venue=venue, price=500, type=FoodType.VEG.value)
+            VenueRatingModel.objects.create(user=self.user, venue=venue, rating=4)
+            booking = BookingModel.objects.create(
+                venue=venue, user=self.user, total_people=10, meal_type=FoodType.VEG.value,
+                booked_for=today + timedelta(days=self.venues), status=BookingStatus.ONGOING,
+            )
+            KhaltiTransaction.objects.create(
+                booking=booking, user=self.user, pidx=f"dash-{self.venues}", status="Completed",
+                total_amount=booking.total_amount, purchase_order_id=booking.id, purchase_order_name="Booking",
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_pages_cost_a_fixed_number_of_queries(self):
+        urls = [reverse("users:bookings"), reverse("users:recent_venues"), reverse("users:recent_transactions")]
+
+        self.add_history(3)
+        short = [self.count_queries(url) for url in urls]
+        self.add_history(40)
+        long = [self.count_queries(url) for url in urls]
+
+        self.assertEqual(short, long)
+
+    def test_keyset_pagination_walks_every_row_once(self):
+        self.add_history(45)
+        url = reverse("users:recent_transactions")
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(transaction.pidx for transaction in response.context["recent_transactions"])
+            cursor = response.context["next_cursor"]
+            url = f"{reverse('users:recent_transactions')}?after={cursor}" if cursor else None
+
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(seen)), 45)
+        self.assertEqual(seen, sorted(seen, key=lambda pidx: -int(re.sub(r"\D", "", pidx))))
+
+    def test_tampered_cursor_restarts_from_newest(self):
+        self.add_history(2)
+        response = self.client.get(reverse("users:bookings"), {"after": "not-a-cursor"})
+        self.assertEqual(len(response.context["bookings"]), 2)
+        self.assertEqual(response.context["bookings"][0].amount, 10 * 500)
+
+
+class ClearExpiredSessionsTest(TestCase):
+    def test_deletes_only_expired_sessions_in_batches(self):
+        for index in range(7):
+            store = SessionStore()
+            store["visit"] = index
+            store.set_expiry(-60 if index < 5 else 3600)
+            store.save()
+
+        out = StringIO()
+        call_command("clear_expired_sessions", batch_size=2, stdout=out)
+
+        self.assertEqual(Session.objects.count(), 2)
+        self.assertIn("Deleted 5 expired sessions in 3 batches", out.getvalue())
+
+
+class GroupNamesTest(TestCase):
+    def test_group_changes_reset_the_cached_names(self):
+        user = get_user_model().objects.create_user(username="groupie", email="groupie@example.com", password="pass")
+        vendors = Group.objects.create(name="Vendors")
+
+        with self.assertNumQueries(1):
+            self.assertFalse(user.is_vendor)
+            self.assertEqual(user.group_names, frozenset())
+
+        user.groups.add(vendors)
+        self.assertTrue(user.is_vendor)
+        user.groups.remove(vendors)
+        self.assertFalse(user.is_vendor)
+        user.groups.set([vendors])
+        self.assertEqual(user.group_names, frozenset({"Vendors"}))
+        user.groups.clear()
+        self.assertEqual(user.group_names, frozenset())
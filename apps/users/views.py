@@ -4,13 +4,18 @@ import json
 from django.contrib.auth import get_user_model
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import DecimalField, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.http import JsonResponse
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.views.generic import UpdateView, ListView
 
 from apps.users.forms import UserProfileForm
-from apps.venue.models import BookingModel, VenueModel, VenueRatingModel, KhaltiTransaction
+from apps.users.mixins import KeysetPaginationMixin
+from apps.venue.constants import BookingStatus
+from apps.venue.models import BookingModel, VenueModel, KhaltiTransaction, Price, VenueRatingModel
+from apps.venue.services.ratings import rate_venue
 
 
 class UserProfileView(LoginRequiredMixin, UpdateView):
@@ -32,48 +37,68 @@ class UserProfileView(LoginRequiredMixin, UpdateView):
     def get_success_url(self):
         return reverse_lazy('users:profile')
 
-class UserBookingView(LoginRequiredMixin, ListView):
+class UserBookingView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name = 'users/user_bookings.html'
     model = BookingModel
     context_object_name = "bookings"
+    keyset_fields = ("booked_at", "id")
 
     def get_queryset(self):
-        return BookingModel.objects.filter(user=self.request.user, is_paid=True).order_by('-booked_at')
+        # Bookings made before prices were snapshotted fall back to the current price
+        unit_price = Price.objects.filter(venue=OuterRef("venue"), type=OuterRef("meal_type")).values("price")[:1]
+        # Unpaid holds that lapsed never became bookings from the user's point of view
+        return BookingModel.objects.filter(user=self.request.user).exclude(
+            status=BookingStatus.EXPIRED, is_paid=False
+        ).select_related("venue").annotate(
+            amount=Coalesce(
+                "total_amount", F("total_people") * Subquery(unit_price),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
 
-class UserRecentVenuesView(LoginRequiredMixin, ListView):
+class UserRecentVenuesView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name = 'users/user_recent_venues.html'
     model = VenueModel
     context_object_name = "recent_venues"
+    # Most recently booked first; a booking id is unique, so it is a complete key
+    keyset_fields = ("last_booking",)
 
     def get_queryset(self):
-        return VenueModel.objects.filter(venue_bookings__user=self.request.user).distinct()
+        user = self.request.user
+        my_rating = VenueRatingModel.objects.filter(user=user, venue=OuterRef("pk")).values("rating")[:1]
+        return VenueModel.objects.filter(venue_bookings__user=user).select_related("city").annotate(
+            last_booking=Max("venue_bookings__id"),
+            my_rating=Subquery(my_rating),
+        )
 
     def post(self, request, *args, **kwargs):
         data = json.loads(request.body)
 
-        rating = data.get('rating')
         user = request.user
         venue_id = data.get('venue_id')
 
-        VenueRatingModel.objects.create(
-            user=user,
-            venue_id=venue_id,
-            rating=rating,
-        )
+        try:
+            rating = int(float(data.get('rating')))
+        except (TypeError, ValueError):
+            return JsonResponse({"success": False, "message": "Invalid rating"}, status=400)
+
+        if not 0 <= rating <= 5:
+            return JsonResponse({"success": False, "message": "Rating must be between 0 and 5"}, status=400)
+
+        if not VenueModel.objects.filter(id=venue_id).exists():
+            return JsonResponse({"success": False, "message": "Venue not found"}, status=404)
+
+        rate_venue(user, venue_id, rating)
 
         return JsonResponse({
             "success": True,
         })
 
-class RecentTransactionView(LoginRequiredMixin, ListView):
+class RecentTransactionView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name = 'users/user_recent_transactions.html'
+    context_object_name = "recent_transactions"
+    keyset_fields = ("created_at", "id")
 
     def get_queryset(self):
-        return KhaltiTransaction.objects.filter(user=self.request.user).order_by('-created_at')
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context.update({
-            "recent_transactions": self.get_queryset(),
-        })
-        return context
\ No newline at end of file
+        # str(transaction.booking) renders the venue and user names
+        return KhaltiTransaction.objects.filter(user=self.request.user).select_related("booking__venue", "booking__user")
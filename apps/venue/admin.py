@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from apps.venue.models import VenueModel, City, VenueImages, Price, BookingModel, KhaltiTransaction
+from apps.venue.models import VenueModel, City, VenueImages, Price, BookingModel, KhaltiTransaction, VenueDailyStats
 
 # Register your models here.
 class UniqueVendorAdmin(admin.ModelAdmin):
@@ -29,6 +29,8 @@ class UniqueVendorAdmin(admin.ModelAdmin):
 
 class VenueModelAdmin(UniqueVendorAdmin):
     exclude = ("owner",)
+    # Maintained from submitted ratings; rebuild with manage.py rebuild_venue_ratings
+    readonly_fields = ("rating_sum", "rating_count")
 
     def save_model(self, request, obj, form, change):
         if not change:
@@ -36,9 +38,25 @@ class VenueModelAdmin(UniqueVendorAdmin):
         super().save_model(request, obj, form, change)
 
 
+class BookingModelAdmin(UniqueVendorAdmin):
+    readonly_fields = ("unit_price", "total_amount")
+
+
+class KhaltiTransactionAdmin(admin.ModelAdmin):
+    list_display = ("pidx", "booking", "status", "total_amount", "verified_at", "needs_review")
+    list_filter = ("status", "needs_review")
+
+
+class VenueDailyStatsAdmin(UniqueVendorAdmin):
+    # Maintained by apps.venue.services.rollups; rebuild with manage.py rebuild_venue_stats
+    list_display = ("venue", "date", "bookings", "guests", "revenue")
+    readonly_fields = ("venue", "date", "bookings", "guests", "revenue")
+
+
 admin.site.register(VenueModel, VenueModelAdmin)
 admin.site.register(City)
 admin.site.register(VenueImages, UniqueVendorAdmin)
 admin.site.register(Price, UniqueVendorAdmin)
-admin.site.register(BookingModel, UniqueVendorAdmin)
-admin.site.register(KhaltiTransaction)
\ No newline at end of file
+admin.site.register(BookingModel, BookingModelAdmin)
+admin.site.register(KhaltiTransaction, KhaltiTransactionAdmin)
+admin.site.register(VenueDailyStats, VenueDailyStatsAdmin)
\ No newline at end of file
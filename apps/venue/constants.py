@@ -18,4 +18,6 @@ class VenueBookingStatus(TextChoices):
 class BookingStatus(TextChoices):
     CANCELLED = "Cancelled", "Cancelled"
     COMPLETED = "Completed", "Completed"
-    ONGOING = "Ongoing", "Ongoing"
\ No newline at end of file
+    ONGOING = "Ongoing", "Ongoing"
+    HOLD = "Hold", "Hold"
+    EXPIRED = "Expired", "Expired"
\ No newline at end of file
@@ -1,14 +1,18 @@
+from datetime import date, timedelta
+
 from django import forms
 from django.utils import timezone
 
-from apps.venue.constants import BookingStatus
+from apps.venue.constants import FoodType
 from apps.venue.models import BookingModel
+from apps.venue.services.bookings import is_venue_booked
 
 
 class BookingForm(forms.ModelForm):
     class Meta:
         model = BookingModel
-        fields = "__all__"
+        # user, status, is_paid and the price snapshot are set by the server, never the client
+        fields = ("venue", "booked_for", "total_people", "meal_type")
         widgets = {
             'booked_for': forms.DateInput(attrs={'type': 'date'}),  # Ensures date picker in browser
         }
@@ -19,30 +23,89 @@ class BookingForm(forms.ModelForm):
         venue = cleaned_data.get('venue')
         booked_for = cleaned_data.get('booked_for')
 
-        if booked_for and booked_for < timezone.now().date():
-            if not self.instance.pk:
-                self.add_error('booked_for', "Booking date must be in the future.")
-            else:
-               cleaned_data['status'] = BookingStatus.COMPLETED
+        if booked_for and booked_for < timezone.now().date() and not self.instance.pk:
+            self.add_error('booked_for', "Booking date must be in the future.")
 
         if venue and total_people:
             if total_people > venue.capacity:
                 self.add_error('total_people', f"The venue can only accommodate up to {venue.capacity} people.")
 
         if venue and booked_for:
-            is_booked = BookingModel.objects.filter(
-                venue=venue,
-                booked_for=booked_for,
-                status=BookingStatus.ONGOING
-            ).exists()
-            if is_booked:
+            if is_venue_booked(venue, booked_for):
                 self.add_error("booked_for", f"The venue is already booked for {booked_for}")
 
         return cleaned_data
 
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # Availability is checked in clean() with hold expiry taken into account;
+        # the DB constraint on (venue, booked_for) backs it up at insert time.
+        exclude.add("booked_for")
+        return exclude
+
     def clean_booked_for(self):
         booked_for = self.cleaned_data.get('booked_for')
         if booked_for and booked_for < timezone.now().date():
             raise forms.ValidationError("Booking date must be in the future.")
         return booked_for
 
+
+
+class BulkBookingForm(forms.Form):
+    """
+    Several dates for one venue, given either as ``dates`` (a list of
+    YYYY-MM-DD strings) or as an inclusive ``start``/``end`` range.
+    """
+    MAX_DATES = 31
+
+    total_people = forms.IntegerField(min_value=1)
+    meal_type = forms.ChoiceField(choices=FoodType.choices())
+    dates = forms.JSONField(required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    partial = forms.BooleanField(required=False)
+
+    def __init__(self, *args, venue=None, **kwargs):
+        self.venue = venue
+        super().__init__(*args, **kwargs)
+
+    def clean_total_people(self):
+        total_people = self.cleaned_data.get('total_people')
+        if self.venue and total_people and total_people > self.venue.capacity:
+            raise forms.ValidationError(f"The venue can only accommodate up to {self.venue.capacity} people.")
+        return total_people
+
+    def clean(self):
+        cleaned_data = super().clean()
+        dates = cleaned_data.get('dates')
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+
+        if dates:
+            if not isinstance(dates, list):
+                self.add_error('dates', "Dates must be a list of YYYY-MM-DD strings.")
+                return cleaned_data
+            try:
+                booking_dates = {date.fromisoformat(str(value)) for value in dates}
+            except ValueError:
+                self.add_error('dates', "Dates must be a list of YYYY-MM-DD strings.")
+                return cleaned_data
+        elif start and end:
+            if end < start:
+                self.add_error('end', "End date must not be before start date.")
+                return cleaned_data
+            if (end - start).days >= self.MAX_DATES:
+                self.add_error('end', f"At most {self.MAX_DATES} dates can be booked at once.")
+                return cleaned_data
+            booking_dates = {start + timedelta(days=offset) for offset in range((end - start).days + 1)}
+        else:
+            self.add_error('dates', "Provide a list of dates or a start and end date.")
+            return cleaned_data
+
+        if len(booking_dates) > self.MAX_DATES:
+            self.add_error('dates', f"At most {self.MAX_DATES} dates can be booked at once.")
+        elif min(booking_dates) < timezone.now().date():
+            self.add_error('dates', "Booking date must be in the future.")
+
+        cleaned_data['booking_dates'] = sorted(booking_dates)
+        return cleaned_data
@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from apps.venue.tasks import backfill_image_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Generates resized and WebP variants for every uploaded venue, city and profile image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows loaded per batch')
+        parser.add_argument('--workers', type=int, help='Images resized in parallel')
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist')
+
+    def handle(self, *args, **options):
+        result = backfill_image_derivatives(
+            chunk_size=options['chunk_size'], workers=options['workers'], force=options['force']
+        )
+        self.stdout.write(
+            f"Processed {result['processed']} images, {result['errors']} errors ({result['duration']:.3f}s)"
+        )
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from apps.venue.models import VenueModel
+from apps.venue.services.ratings import rebuild_venue_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized venue rating_sum/rating_count from submitted ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--venue', type=int, action='append', help='Only repair the given venue id(s)')
+
+    def handle(self, *args, **options):
+        queryset = VenueModel.objects.all()
+        if options['venue']:
+            queryset = queryset.filter(id__in=options['venue'])
+
+        updated = rebuild_venue_ratings(queryset)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregate for {updated} venues"))
@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from apps.venue.services.rollups import rebuild_venue_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily venue revenue/booking rollups from the full booking and payment history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--venue', type=int, action='append', help='Only rebuild the given venue id(s)')
+
+    def handle(self, *args, **options):
+        written = rebuild_venue_stats(options['venue'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily venue stats rows"))
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+from apps.venue.tasks import reconcile_payments
+
+class Command(BaseCommand):
+    help = 'Verifies unsettled Khalti transactions with the lookup API and marks paid bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Transactions looked up per batch')
+        parser.add_argument('--concurrency', type=int, help='Lookup requests in flight at once')
+
+    def handle(self, *args, **options):
+        result = reconcile_payments(chunk_size=options['chunk_size'], concurrency=options['concurrency'])
+        self.stdout.write(
+            f"Checked {result['checked']} transactions: {result['verified']} verified, "
+            f"{result['completed']} completed, {result['errors']} errors, {result['conflicts']} conflicts "
+            f"({result['duration']:.3f}s)"
+        )
@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+from apps.venue.tasks import release_expired_holds
+
+class Command(BaseCommand):
+    help = 'Expires unpaid booking holds whose hold time has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows updated per transaction')
+
+    def handle(self, *args, **options):
+        result = release_expired_holds(chunk_size=options['chunk_size'])
+        self.stdout.write(
+            f"Released {result['released']} expired holds across {result['venues']} venues ({result['duration']:.3f}s)"
+        )
@@ -4,6 +4,11 @@ from apps.venue.tasks import update_booking_statuses
 class Command(BaseCommand):
     help = 'Updates booking statuses to COMPLETED if booked_for date passed'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows updated per transaction')
+
     def handle(self, *args, **options):
-        update_booking_statuses()
-        self.stdout.write("Updated booking statuses")
\ No newline at end of file
+        result = update_booking_statuses(chunk_size=options['chunk_size'])
+        self.stdout.write(
+            f"Updated {result['updated']} booking statuses in {result['chunks']} chunks ({result['duration']:.3f}s)"
+        )
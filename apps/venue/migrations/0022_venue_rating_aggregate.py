@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-19 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def drop_duplicate_ratings(apps, schema_editor):
+    VenueRatingModel = apps.get_model('venue', 'VenueRatingModel')
+    duplicates = (
+        VenueRatingModel.objects.filter(user__isnull=False, venue__isnull=False)
+        .values('user', 'venue')
+        .annotate(latest=Max('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        VenueRatingModel.objects.filter(user=row['user'], venue=row['venue']).exclude(id=row['latest']).delete()
+
+
+def backfill_rating_aggregate(apps, schema_editor):
+    VenueModel = apps.get_model('venue', 'VenueModel')
+    VenueRatingModel = apps.get_model('venue', 'VenueRatingModel')
+    ratings = VenueRatingModel.objects.filter(venue=OuterRef('pk')).order_by().values('venue')
+    VenueModel.objects.update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating')).values('total')), 0),
+        rating_count=Coalesce(Subquery(ratings.annotate(total=Count('id')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0021_venuemodel_lat_venuemodel_lng'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venuemodel',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venuemodel',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(drop_duplicate_ratings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='venueratingmodel',
+            constraint=models.UniqueConstraint(fields=('user', 'venue'), name='unique_venue_rating_per_user'),
+        ),
+        migrations.RunPython(backfill_rating_aggregate, migrations.RunPython.noop),
+    ]
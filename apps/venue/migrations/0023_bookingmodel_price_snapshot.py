@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-19 08:44
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_price_snapshot(apps, schema_editor):
+    BookingModel = apps.get_model('venue', 'BookingModel')
+    Price = apps.get_model('venue', 'Price')
+    prices = Price.objects.filter(venue=OuterRef('venue'), type=OuterRef('meal_type')).order_by('id')
+    BookingModel.objects.filter(unit_price__isnull=True).update(
+        unit_price=Subquery(prices.values('price')[:1])
+    )
+    BookingModel.objects.filter(unit_price__isnull=False, total_amount__isnull=True).update(
+        total_amount=F('total_people') * F('unit_price')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0022_venue_rating_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookingmodel',
+            name='total_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookingmodel',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_price_snapshot, migrations.RunPython.noop),
+    ]
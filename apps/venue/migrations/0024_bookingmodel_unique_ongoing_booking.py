@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-19 08:46
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def cancel_double_bookings(apps, schema_editor):
+    # Keep the earliest ongoing booking per venue/date; later ones were double-bookings
+    BookingModel = apps.get_model('venue', 'BookingModel')
+    duplicates = (
+        BookingModel.objects.filter(status='Ongoing', venue__isnull=False, booked_for__isnull=False)
+        .values('venue', 'booked_for')
+        .annotate(first=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        BookingModel.objects.filter(
+            venue=row['venue'], booked_for=row['booked_for'], status='Ongoing'
+        ).exclude(id=row['first']).update(status='Cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0023_bookingmodel_price_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bookingmodel',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'Ongoing')), fields=('venue', 'booked_for'), name='unique_ongoing_booking_per_venue_date', violation_error_message='The venue is already booked for this date.'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 08:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0024_bookingmodel_unique_ongoing_booking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookingmodel',
+            index=models.Index(fields=['status', 'booked_for'], name='booking_status_date_idx'),
+        ),
+    ]
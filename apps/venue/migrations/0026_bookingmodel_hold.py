@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-19 08:49
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def hold_unpaid_bookings(apps, schema_editor):
+    # Unpaid upcoming bookings used to block their date for good; give them the
+    # same hold (and expiry) a new booking gets so release_expired_holds frees them
+    BookingModel = apps.get_model('venue', 'BookingModel')
+    ttl = timedelta(minutes=getattr(settings, 'BOOKING_HOLD_TTL_MINUTES', 15))
+    BookingModel.objects.filter(status='Ongoing', is_paid=False, booked_for__gte=timezone.now().date()).update(
+        status='Hold', hold_expires_at=timezone.now() + ttl
+    )
+
+
+def unhold_bookings(apps, schema_editor):
+    BookingModel = apps.get_model('venue', 'BookingModel')
+    BookingModel.objects.filter(status='Hold').update(status='Ongoing', hold_expires_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0025_bookingmodel_status_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='bookingmodel',
+            name='unique_ongoing_booking_per_venue_date',
+        ),
+        migrations.AddField(
+            model_name='bookingmodel',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='bookingmodel',
+            name='status',
+            field=models.CharField(blank=True, choices=[('Cancelled', 'Cancelled'), ('Completed', 'Completed'), ('Ongoing', 'Ongoing'), ('Hold', 'Hold'), ('Expired', 'Expired')], default='Ongoing', max_length=25, null=True),
+        ),
+        migrations.RunPython(hold_unpaid_bookings, unhold_bookings),
+        migrations.AddIndex(
+            model_name='bookingmodel',
+            index=models.Index(condition=models.Q(('status', 'Hold')), fields=['hold_expires_at'], name='booking_hold_expiry_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingmodel',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['Ongoing', 'Hold'])), fields=('venue', 'booked_for'), name='unique_ongoing_booking_per_venue_date', violation_error_message='The venue is already booked for this date.'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-19 08:58
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def unmark_unpaid_bookings(apps, schema_editor):
+    # PayBookingView used to set is_paid before redirecting to Khalti; only
+    # bookings with a completed transaction were actually paid. Payment
+    # reconciliation re-verifies those transactions against Khalti.
+    BookingModel = apps.get_model('venue', 'BookingModel')
+    KhaltiTransaction = apps.get_model('venue', 'KhaltiTransaction')
+    paid = KhaltiTransaction.objects.filter(status='Completed').values('booking_id')
+    BookingModel.objects.filter(is_paid=True).exclude(id__in=paid).update(is_paid=False)
+    # Now unpaid, upcoming ones become holds like in 0026 instead of blocking their date for good
+    ttl = timedelta(minutes=getattr(settings, 'BOOKING_HOLD_TTL_MINUTES', 15))
+    BookingModel.objects.filter(status='Ongoing', is_paid=False, booked_for__gte=timezone.now().date()).update(
+        status='Hold', hold_expires_at=timezone.now() + ttl
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0026_bookingmodel_hold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(unmark_unpaid_bookings, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='khaltitransaction',
+            name='verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='khaltitransaction',
+            name='transaction_id',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='khaltitransaction',
+            index=models.Index(fields=['status'], name='khalti_txn_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='khaltitransaction',
+            index=models.Index(condition=models.Q(('verified_at__isnull', True)), fields=['id'], name='khalti_txn_unverified_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-19 09:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    # Same totals as apps.venue.services.rollups.rebuild_venue_stats
+    BookingModel = apps.get_model('venue', 'BookingModel')
+    KhaltiTransaction = apps.get_model('venue', 'KhaltiTransaction')
+    VenueDailyStats = apps.get_model('venue', 'VenueDailyStats')
+
+    rows = {}
+    bookings = (
+        BookingModel.objects.filter(status__in=['Ongoing', 'Completed'], venue__isnull=False, booked_for__isnull=False)
+        .values('venue_id', 'booked_for').order_by()
+        .annotate(bookings=Count('id'), guests=Sum('total_people'))
+    )
+    for row in bookings:
+        rows[(row['venue_id'], row['booked_for'])] = VenueDailyStats(
+            venue_id=row['venue_id'], date=row['booked_for'], bookings=row['bookings'], guests=row['guests'] or 0
+        )
+
+    payments = (
+        KhaltiTransaction.objects.filter(status='Completed', booking__venue__isnull=False)
+        .annotate(day=TruncDate('created_at'))
+        .values('booking__venue_id', 'day').order_by()
+        .annotate(revenue=Sum('total_amount'))
+    )
+    for row in payments:
+        key = (row['booking__venue_id'], row['day'])
+        rows.setdefault(key, VenueDailyStats(venue_id=key[0], date=key[1])).revenue = row['revenue']
+
+    VenueDailyStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0027_khaltitransaction_reconciliation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VenueDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('guests', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('venue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='venue.venuemodel')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('venue', 'date'), name='unique_venue_daily_stats')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 09:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0028_venuedailystats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookingmodel',
+            index=models.Index(fields=['user', '-booked_at', '-id'], name='booking_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='khaltitransaction',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='khalti_txn_user_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-19 09:56
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def recount_non_null_ratings(apps, schema_editor):
+    # 0022 counted NULL ratings too; the aggregate now matches Avg and skips them
+    VenueModel = apps.get_model('venue', 'VenueModel')
+    VenueRatingModel = apps.get_model('venue', 'VenueRatingModel')
+    ratings = VenueRatingModel.objects.filter(venue=OuterRef('pk')).order_by().values('venue')
+    VenueModel.objects.update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating')).values('total')), 0),
+        rating_count=Coalesce(Subquery(ratings.annotate(total=Count('rating')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0030_city_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='venuemodel',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='venuemodel',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(recount_non_null_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0031_rating_aggregate_not_editable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='khaltitransaction',
+            name='needs_review',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2 on 2026-10-19 10:10
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_completed_at(apps, schema_editor):
+    # The completion time was never stored; the last verification is the closest record of it
+    KhaltiTransaction = apps.get_model('venue', 'KhaltiTransaction')
+    KhaltiTransaction.objects.filter(status='Completed').update(
+        completed_at=Coalesce(F('verified_at'), F('created_at'))
+    )
+
+
+
+def rebuild_daily_stats(apps, schema_editor):
+    # Revenue moves from the day a payment was started to the day it completed.
+    # Same totals as apps.venue.services.rollups.rebuild_venue_stats
+    BookingModel = apps.get_model('venue', 'BookingModel')
+    KhaltiTransaction = apps.get_model('venue', 'KhaltiTransaction')
+    VenueDailyStats = apps.get_model('venue', 'VenueDailyStats')
+
+    rows = {}
+    bookings = (
+        BookingModel.objects.filter(status__in=['Ongoing', 'Completed'], venue__isnull=False, booked_for__isnull=False)
+        .values('venue_id', 'booked_for').order_by()
+        .annotate(bookings=Count('id'), guests=Sum('total_people'))
+    )
+    for row in bookings:
+        rows[(row['venue_id'], row['booked_for'])] = VenueDailyStats(
+            venue_id=row['venue_id'], date=row['booked_for'], bookings=row['bookings'], guests=row['guests'] or 0
+        )
+
+    payments = (
+        KhaltiTransaction.objects.filter(status='Completed', booking__venue__isnull=False, completed_at__isnull=False)
+        .annotate(day=TruncDate('completed_at'))
+        .values('booking__venue_id', 'day').order_by()
+        .annotate(revenue=Sum('total_amount'))
+    )
+    for row in payments:
+        key = (row['booking__venue_id'], row['day'])
+        rows.setdefault(key, VenueDailyStats(venue_id=key[0], date=key[1])).revenue = row['revenue']
+
+    VenueDailyStats.objects.all().delete()
+    VenueDailyStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venue', '0032_khaltitransaction_needs_review'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='khaltitransaction',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+        migrations.RunPython(rebuild_daily_stats, migrations.RunPython.noop),
+    ]
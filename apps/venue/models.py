@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import Avg
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.text import slugify
@@ -16,29 +16,106 @@ class AbstractSlugModel(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True, null=True, blank=True)
 
+    # How many times to pick a new slug when a concurrent insert takes ours
+    SLUG_SAVE_ATTEMPTS = 5
+
     class Meta:
         abstract = True
 
+    @classmethod
+    def next_free_suffixes(cls, base_slugs):
+        """
+        Map each base slug to the next unused numeric suffix (0 meaning the bare
+        base slug is free), looked up for all bases in one query of prefix
+        matches that the slug index can serve.
+        """
+        next_free = {base: 0 for base in base_slugs}
+        if not next_free:
+            return next_free
+
+        query = Q()
+        for base in next_free:
+            query |= Q(slug__startswith=base)
+
+        for slug in cls.objects.filter(query).values_list("slug", flat=True):
+            if slug in next_free:
+                next_free[slug] = max(next_free[slug], 1)
+            head, _, suffix = slug.rpartition("-")
+            if head in next_free and suffix.isdigit():
+                next_free[head] = max(next_free[head], int(suffix) + 1)
+        return next_free
+
+    @staticmethod
+    def _suffixed(base_slug, n):
+        return f"{base_slug}-{n}" if n else base_slug
+
+    @classmethod
+    def assign_slugs(cls, objs):
+        """
+        Fill in unique slugs for unsaved instances (e.g. before bulk_create),
+        also avoiding collisions between the instances themselves.
+        """
+        pending = [obj for obj in objs if not obj.slug]
+        next_free = cls.next_free_suffixes({slugify(obj.name) for obj in pending})
+        for obj in pending:
+            base_slug = slugify(obj.name)
+            obj.slug = cls._suffixed(base_slug, next_free[base_slug])
+            next_free[base_slug] += 1
+        return objs
+
+    @classmethod
+    def bulk_create_with_slugs(cls, objs, **kwargs):
+        """
+        bulk_create() for imports: slugs for the whole batch come from one
+        lookup, and are picked again if a concurrent insert takes one first.
+        Like bulk_create() it sends no post_save signals.
+        """
+        objs = list(objs)
+        generated = [obj for obj in objs if not obj.slug]
+        for attempt in range(cls.SLUG_SAVE_ATTEMPTS):
+            cls.assign_slugs(objs)
+            try:
+                with transaction.atomic():
+                    return cls.objects.bulk_create(objs, **kwargs)
+            except IntegrityError:
+                if attempt == cls.SLUG_SAVE_ATTEMPTS - 1 or not generated:
+                    for obj in generated:
+                        obj.slug = None
+                    raise
+                for obj in generated:
+                    obj.slug = None
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            n = 1
-            while type(self).objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{n}"
-                n += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        base_slug = slugify(self.name)
+        for attempt in range(self.SLUG_SAVE_ATTEMPTS):
+            self.slug = self._suffixed(base_slug, type(self).next_free_suffixes([base_slug])[base_slug])
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Only retry when a concurrent insert claimed the same slug
+                taken = type(self).objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if attempt == self.SLUG_SAVE_ATTEMPTS - 1 or not taken:
+                    self.slug = None
+                    raise
 
 
 class City(AbstractSlugModel):
     image = models.ImageField(upload_to="city/", null=True, blank=True)
     description = models.TextField(null=True, blank=True)
 
+    # Also touched when one of its venues (or their prices/images) changes; drives conditional GETs
+    updated_at = models.DateTimeField(auto_now=True)
+
     @property
     def get_venue_count(self):
-        qs = VenueModel.objects.filter(city=self)
-        return qs.count()
+        # Listings annotate venue_count (see services.cities); fall back to a COUNT otherwise
+        if hasattr(self, "venue_count"):
+            return self.venue_count
+        return self.venues.count()
 
     def __str__(self):
         return self.name
@@ -60,6 +137,11 @@ class VenueModel(AbstractSlugModel):
     lat = models.FloatField()
     lng = models.FloatField()
 
+    # Denormalized aggregate of the non-null ratings, kept in sync with F() updates by
+    # the VenueRatingModel signals (services/ratings.py); rebuild_venue_ratings() repairs drift
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):
         return f"{self.name}"
 
@@ -84,13 +166,9 @@ class VenueModel(AbstractSlugModel):
 
     @property
     def get_rating(self):
-        qs = VenueModel.objects.prefetch_related("ratings").annotate(
-            avg_rating=Avg('ratings__rating')
-        ).get(id=self.id)
-        if qs.avg_rating:
-            return round(qs.avg_rating, 2)
-        else:
-            return 0
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 2)
+        return 0
 
 
 class VenueRatingModel(models.Model):
@@ -99,6 +177,11 @@ class VenueRatingModel(models.Model):
     rating = models.PositiveIntegerField(default=0, null=True, blank=True)
     rated_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "venue"], name="unique_venue_rating_per_user"),
+        ]
+
 
 class Price(models.Model):
     venue = models.ForeignKey(VenueModel, on_delete=models.SET_NULL, null=True, related_name="prices")
@@ -128,11 +211,76 @@ class BookingModel(models.Model):
     status = models.CharField(max_length=25, choices=BookingStatus.choices, default=BookingStatus.ONGOING, null=True,
                               blank=True)
 
+    # Unpaid bookings start as HOLD and stop blocking the date once this passes
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+
+    # Price snapshot taken when the booking is created so later price edits don't change it
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # A venue can only hold one ongoing (or held) booking per date; enforced by
+            # the DB so concurrent BookingView requests cannot double-book.
+            models.UniqueConstraint(
+                fields=["venue", "booked_for"],
+                condition=Q(status__in=[BookingStatus.ONGOING, BookingStatus.HOLD]),
+                name="unique_ongoing_booking_per_venue_date",
+                violation_error_message="The venue is already booked for this date.",
+            ),
+        ]
+        indexes = [
+            # Supports the status sweeper in apps.venue.tasks
+            models.Index(fields=["status", "booked_for"], name="booking_status_date_idx"),
+            # Supports releasing expired holds in apps.venue.tasks
+            models.Index(
+                fields=["hold_expires_at"],
+                condition=Q(status=BookingStatus.HOLD),
+                name="booking_hold_expiry_idx",
+            ),
+            # Keyset pagination of a user's bookings (apps.users.views.UserBookingView)
+            models.Index(fields=["user", "-booked_at", "-id"], name="booking_user_recent_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_values = dict(zip(field_names, values))
+        return instance
+
+    def saved_values(self, *attnames):
+        """
+        The given fields as last read from or written to the database, or None
+        when the instance is unsaved or was loaded without one of them.
+        """
+        saved = getattr(self, "_saved_values", {})
+        if not all(attname in saved for attname in attnames):
+            return None
+        return tuple(saved[attname] for attname in attnames)
+
     @property
     def get_total_payment_amount(self):
+        if self.total_amount is not None:
+            return self.total_amount
         price = Price.objects.get(venue=self.venue, type=self.meal_type).price
         return self.total_people * price
 
+    def snapshot_price(self):
+        """
+        Take the price snapshot when the booking is created, and again if its
+        venue or meal type changes while it is unpaid. total_amount follows
+        total_people until the booking is paid, then stays as it was charged.
+        """
+        if self.is_paid and self.total_amount is not None:
+            return
+        saved = self.saved_values("venue_id", "meal_type")
+        if self.venue_id and (self.unit_price is None or saved not in (None, (self.venue_id, self.meal_type))):
+            self.unit_price = Price.objects.filter(
+                venue_id=self.venue_id, type=self.meal_type
+            ).values_list("price", flat=True).first()
+        if self.unit_price is not None:
+            self.total_amount = self.total_people * self.unit_price
+
     @property
     def get_payment_status_display(self):
         if self.is_paid:
@@ -155,7 +303,13 @@ class BookingModel(models.Model):
     def save(self, *args, **kwargs):
         if self.booked_for and self.booked_for < timezone.now().date():
             self.status = BookingStatus.COMPLETED
+        self.snapshot_price()
         super().save(*args, **kwargs)
+        deferred = self.get_deferred_fields()
+        self._saved_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields if field.attname not in deferred
+        }
 
 
 class KhaltiTransaction(models.Model):
@@ -163,7 +317,7 @@ class KhaltiTransaction(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, null=True, related_name="transactions")
 
     pidx = models.CharField(max_length=100, unique=True)
-    transaction_id = models.CharField(max_length=100)
+    transaction_id = models.CharField(max_length=100, db_index=True)
     tidx = models.CharField(max_length=100)
     txn_id = models.CharField(max_length=100)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -171,7 +325,48 @@ class KhaltiTransaction(models.Model):
     purchase_order_id = models.IntegerField()
     purchase_order_name = models.CharField(max_length=255)
 
+    # Set when the status was last confirmed with Khalti's lookup API
+    verified_at = models.DateTimeField(null=True, blank=True)
+    # When the lookup API first reported the payment Completed; revenue is counted on this day
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # The payment can't be matched to its booking (unknown pidx, or the paid amount
+    # differs from the booking's total): the booking is not confirmed automatically
+    needs_review = models.BooleanField(default=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Supports payment reconciliation in apps.venue.tasks
+            models.Index(fields=["status"], name="khalti_txn_status_idx"),
+            models.Index(fields=["id"], condition=Q(verified_at__isnull=True), name="khalti_txn_unverified_idx"),
+            # Keyset pagination of a user's payments (apps.users.views.RecentTransactionView)
+            models.Index(fields=["user", "-created_at", "-id"], name="khalti_txn_user_recent_idx"),
+        ]
+
     def __str__(self):
         return f"KhaltiTransaction {self.pidx} - {self.status}"
+
+
+class VenueDailyStats(models.Model):
+    """
+    Per venue, per day rollup for the vendor dashboard, maintained by
+    apps.venue.services.rollups as bookings and payments change.
+
+    ``bookings``/``guests`` count confirmed (ongoing or completed) bookings
+    for events on ``date``; ``revenue`` sums Khalti payments that completed
+    on ``date``.
+    """
+    venue = models.ForeignKey(VenueModel, on_delete=models.CASCADE, related_name="daily_stats")
+    date = models.DateField()
+    bookings = models.PositiveIntegerField(default=0)
+    guests = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["venue", "date"], name="unique_venue_daily_stats"),
+        ]
+
+    def __str__(self):
+        return f"{self.venue_id} - {self.date}"
@@ -0,0 +1,130 @@
+import calendar
+import time
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.venue.models import BookingModel, VenueModel
+from apps.venue.services.bookings import blocking_bookings_q
+from core.metrics import record_cache
+
+AVAILABILITY_VERSION_KEY = "venue:availability:version:{venue_id}"
+AVAILABILITY_PAYLOAD_KEY = "venue:availability:{etag}"
+AVAILABILITY_PAYLOAD_TIMEOUT = 60 * 60
+
+# Longest range a single availability request may ask for
+MAX_AVAILABILITY_DAYS = 93
+
+
+class AvailabilityDay:
+    PAST = "past"
+    BOOKED = "booked"
+    AVAILABLE = "available"
+
+
+def parse_availability_range(params, today=None, max_days=MAX_AVAILABILITY_DAYS):
+    """
+    Read ``month=YYYY-MM`` or ``start=YYYY-MM-DD&end=YYYY-MM-DD`` from a query
+    dict, defaulting to the current month. Raises ValueError on bad input.
+    """
+    today = today or timezone.now().date()
+
+    if params.get("start") or params.get("end"):
+        start = date.fromisoformat(params.get("start", ""))
+        end = date.fromisoformat(params.get("end", ""))
+    else:
+        month = params.get("month") or today.strftime("%Y-%m")
+        year, month = (int(part) for part in month.split("-"))
+        start = date(year, month, 1)
+        end = date(year, month, calendar.monthrange(year, month)[1])
+
+    if end < start:
+        raise ValueError("end must not be before start")
+    if (end - start).days + 1 > max_days:
+        raise ValueError(f"range must not exceed {max_days} days")
+    return start, end
+
+
+def get_availability_version(venue_id):
+    key = AVAILABILITY_VERSION_KEY.format(venue_id=venue_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_availability_version(venue_id):
+    """
+    Move the venue's availability to a new version once the current
+    transaction commits, so no request can cache pre-commit bookings under it.
+    """
+    transaction.on_commit(lambda: _bump_version(venue_id))
+
+
+def _bump_version(venue_id):
+    key = AVAILABILITY_VERSION_KEY.format(venue_id=venue_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def availability_etag(venue_id, start, end, today=None):
+    # "past" depends on today's date, so it is part of the validator
+    today = today or timezone.now().date()
+    return f"{venue_id}-{get_availability_version(venue_id)}-{start:%Y%m%d}-{end:%Y%m%d}-{today:%Y%m%d}"
+
+
+def booked_dates(venue_id, start, end):
+    return set(
+        BookingModel.objects.filter(
+            blocking_bookings_q(),
+            venue_id=venue_id,
+            booked_for__range=(start, end),
+        ).values_list("booked_for", flat=True)
+    )
+
+
+def get_venue_availability(venue_id, start, end, today=None):
+    """
+    Per-day availability for a venue between start and end (inclusive),
+    computed from a single range query and cached under its ETag.
+    Returns (etag, None) when the venue does not exist.
+    """
+    today = today or timezone.now().date()
+    etag = availability_etag(venue_id, start, end, today)
+    payload_key = AVAILABILITY_PAYLOAD_KEY.format(etag=etag)
+
+    payload = cache.get(payload_key)
+    if payload is not None:
+        record_cache("availability", hits=1)
+        return etag, payload
+    record_cache("availability", misses=1)
+
+    if not VenueModel.objects.filter(id=venue_id).exists():
+        return etag, None
+
+    taken = booked_dates(venue_id, start, end)
+    days = []
+    current = start
+    while current <= end:
+        if current < today:
+            status = AvailabilityDay.PAST
+        elif current in taken:
+            status = AvailabilityDay.BOOKED
+        else:
+            status = AvailabilityDay.AVAILABLE
+        days.append({"date": current.isoformat(), "status": status})
+        current += timedelta(days=1)
+
+    payload = {
+        "venue": venue_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": days,
+    }
+    cache.set(payload_key, payload, AVAILABILITY_PAYLOAD_TIMEOUT)
+    return etag, payload
@@ -0,0 +1,174 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.venue.constants import BookingStatus
+from apps.venue.models import BookingModel, Price
+from core.metrics import BOOKING_ATTEMPTS
+
+
+class BookingConflict(Exception):
+    """Raised when the venue already has an ongoing booking for the requested date."""
+
+
+def blocking_bookings_q(now=None):
+    """Bookings that make a date unavailable: ongoing ones and holds that have not expired."""
+    now = now or timezone.now()
+    return Q(status=BookingStatus.ONGOING) | Q(status=BookingStatus.HOLD, hold_expires_at__gt=now)
+
+
+def is_venue_booked(venue, booked_for):
+    return BookingModel.objects.filter(
+        blocking_bookings_q(),
+        venue=venue,
+        booked_for=booked_for,
+    ).exists()
+
+
+def release_expired_holds_for(venue, dates, now=None):
+    """Expire stale holds on a venue's dates so they stop occupying the unique slot."""
+    now = now or timezone.now()
+    return BookingModel.objects.filter(
+        venue=venue,
+        booked_for__in=dates,
+        status=BookingStatus.HOLD,
+        hold_expires_at__lte=now,
+    ).update(status=BookingStatus.EXPIRED)
+
+
+def create_booking(form, hold=True):
+    """
+    Save a validated BookingForm in its own transaction.
+
+    New bookings start as a HOLD that expires after BOOKING_HOLD_TTL_MINUTES
+    unless payment confirms it. The form's availability check is only
+    advisory; the partial unique constraint on (venue, booked_for) is what
+    decides concurrent requests, and losing that race surfaces here as
+    BookingConflict.
+    """
+    booking = form.instance
+    now = timezone.now()
+    if hold:
+        booking.status = BookingStatus.HOLD
+        booking.hold_expires_at = now + timedelta(minutes=settings.BOOKING_HOLD_TTL_MINUTES)
+
+    try:
+        with transaction.atomic():
+            release_expired_holds_for(booking.venue_id, [booking.booked_for], now)
+            booking = form.save()
+    except IntegrityError:
+        if is_venue_booked(booking.venue_id, booking.booked_for):
+            BOOKING_ATTEMPTS.labels("single", "conflict").inc()
+            raise BookingConflict(f"The venue is already booked for {booking.booked_for}")
+        raise
+    BOOKING_ATTEMPTS.labels("single", "created").inc()
+    return booking
+
+
+def confirm_booking(booking):
+    """
+    Record a verified payment: mark the booking paid and turn a hold into an
+    ONGOING booking. Raises BookingConflict if the hold already expired and
+    someone else has taken the date since; the booking is still marked paid
+    so the payment can be refunded.
+    """
+    update_fields = ["is_paid"]
+    booking.is_paid = True
+    if booking.status in (BookingStatus.HOLD, BookingStatus.EXPIRED):
+        booking.status = BookingStatus.ONGOING
+        booking.hold_expires_at = None
+        update_fields += ["status", "hold_expires_at"]
+
+    try:
+        with transaction.atomic():
+            booking.save(update_fields=update_fields)
+    except IntegrityError:
+        BookingModel.objects.filter(pk=booking.pk).update(is_paid=True)
+        booking.refresh_from_db(fields=["status", "hold_expires_at"])
+        BOOKING_ATTEMPTS.labels("payment", "conflict").inc()
+        raise BookingConflict(f"The venue is already booked for {booking.booked_for}")
+    return booking
+
+
+class BulkBookingResult:
+    CREATED = "created"
+    BOOKED = "booked"
+
+
+def create_bulk_bookings(venue, user, dates, total_people, meal_type, partial=False):
+    """
+    Book ``venue`` on every date in ``dates`` for ``user`` in one transaction.
+
+    Availability for all dates is read with a single range query and the
+    rows are inserted with bulk_create. With ``partial=False`` nothing is
+    created unless every date is free (BookingConflict otherwise); with
+    ``partial=True`` free dates are booked and taken ones reported.
+
+    Returns a list of ``{"date", "status", "booking_id"}`` dicts in date order.
+    """
+    dates = sorted(set(dates))
+    now = timezone.now()
+    hold_expires_at = now + timedelta(minutes=settings.BOOKING_HOLD_TTL_MINUTES)
+    unit_price = Price.objects.filter(venue=venue, type=meal_type).values_list("price", flat=True).first()
+
+    with transaction.atomic():
+        release_expired_holds_for(venue, dates, now)
+        taken = set(
+            BookingModel.objects.filter(
+                blocking_bookings_q(now), venue=venue, booked_for__in=dates
+            ).values_list("booked_for", flat=True)
+        )
+        if taken and not partial:
+            BOOKING_ATTEMPTS.labels("bulk", "conflict").inc()
+            raise BookingConflict(
+                "The venue is already booked for " + ", ".join(str(day) for day in sorted(taken))
+            )
+
+        bookings = [
+            BookingModel(
+                venue=venue,
+                user=user,
+                total_people=total_people,
+                meal_type=meal_type,
+                booked_for=day,
+                is_paid=False,
+                status=BookingStatus.HOLD,
+                hold_expires_at=hold_expires_at,
+                unit_price=unit_price,
+                total_amount=total_people * unit_price if unit_price is not None else None,
+            )
+            for day in dates if day not in taken
+        ]
+
+        if partial:
+            # Rows that lose a race since the read above are skipped, not fatal
+            BookingModel.objects.bulk_create(bookings, ignore_conflicts=True)
+            created = dict(
+                BookingModel.objects.filter(
+                    venue=venue, user=user, status=BookingStatus.HOLD,
+                    hold_expires_at=hold_expires_at, booked_for__in=dates,
+                ).values_list("booked_for", "id")
+            )
+        else:
+            try:
+                with transaction.atomic():
+                    created = {
+                        booking.booked_for: booking.id for booking in BookingModel.objects.bulk_create(bookings)
+                    }
+            except IntegrityError:
+                BOOKING_ATTEMPTS.labels("bulk", "conflict").inc()
+                raise BookingConflict("The venue was booked for one of these dates by someone else")
+
+    BOOKING_ATTEMPTS.labels("bulk", "created" if created else "conflict").inc()
+
+    return [
+        {
+            "date": day.isoformat(),
+            "status": BulkBookingResult.CREATED if day in created else BulkBookingResult.BOOKED,
+            "booking_id": created.get(day),
+        }
+        for day in dates
+    ]
@@ -0,0 +1,92 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from apps.venue.models import City
+from core.metrics import record_cache
+
+CITY_DIRECTORY_VERSION_KEY = "venue:city-directory:version"
+
+_lock = threading.Lock()
+_directory = None
+
+
+class CityDirectory:
+    """
+    Snapshot of every city annotated with ``venue_count``, built from one
+    grouped query and shared by all requests served by this process.
+    """
+
+    def __init__(self, cities, version):
+        self.cities = cities
+        self.version = version
+        self.by_slug = {city.slug: city for city in cities}
+
+    def __iter__(self):
+        return iter(self.cities)
+
+    def __len__(self):
+        return len(self.cities)
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+    def exclude(self, slug):
+        return [city for city in self.cities if city.slug != slug]
+
+
+def get_city_directory_version():
+    """Version of the shared city/venue listing; changes whenever a city or venue is saved or deleted."""
+    return _current_version()
+
+
+def _current_version():
+    version = cache.get(CITY_DIRECTORY_VERSION_KEY)
+    if version is None:
+        # Seed with a timestamp so an evicted key never reuses an old version
+        cache.add(CITY_DIRECTORY_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CITY_DIRECTORY_VERSION_KEY)
+    return version
+
+
+def get_city_directory():
+    """
+    Return the process-wide CityDirectory, rebuilding it when another process
+    (or a signal in this one) has bumped the shared version key.
+    """
+    global _directory
+
+    version = _current_version()
+    directory = _directory
+    if directory is not None and directory.version == version:
+        record_cache("city_directory", hits=1)
+        return directory
+    record_cache("city_directory", misses=1)
+
+    with _lock:
+        if _directory is None or _directory.version != version:
+            cities = list(City.objects.annotate(venue_count=Count("venues")).order_by("id"))
+            _directory = CityDirectory(cities, version)
+        return _directory
+
+
+def invalidate_city_directory():
+    """
+    Move the directory to a new version once the current transaction commits
+    (at once outside a transaction). Bumping earlier would let another worker
+    rebuild from the pre-commit rows and cache them under the new version.
+    """
+    transaction.on_commit(_bump_version)
+
+
+def _bump_version():
+    global _directory
+
+    try:
+        cache.incr(CITY_DIRECTORY_VERSION_KEY)
+    except ValueError:
+        cache.set(CITY_DIRECTORY_VERSION_KEY, time.time_ns(), timeout=None)
+    _directory = None
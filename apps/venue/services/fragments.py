@@ -0,0 +1,129 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.metrics import record_cache
+
+FRAGMENT_VERSION_KEY = "fragment:version:{label}:{pk}"
+FRAGMENT_KEY = "fragment:{template}:{label}:{pk}:{version}"
+
+
+def fragment_cache():
+    return caches[getattr(settings, "FRAGMENT_CACHE_ALIAS", "fragments")]
+
+
+class FragmentStats:
+    """Process-wide fragment cache hit/miss counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        record_cache("fragments", hits, misses)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+stats = FragmentStats()
+
+
+def _version_key(obj):
+    return FRAGMENT_VERSION_KEY.format(label=obj._meta.label_lower, pk=obj.pk)
+
+
+def bump_fragment_version(model, pk):
+    """
+    Invalidate every cached fragment rendered for one object once the current
+    transaction commits, so a card rendered from pre-commit rows can't be
+    stored under the new version.
+    """
+    if pk is None:
+        return
+    bump_fragment_versions(model, [pk])
+
+
+def bump_fragment_versions(model, pks):
+    """bump_fragment_version() for many objects of one model, with a single commit hook."""
+    pks = [pk for pk in pks if pk is not None]
+    if pks:
+        transaction.on_commit(lambda: _bump_versions(model, pks))
+
+
+def _bump_versions(model, pks):
+    cache = fragment_cache()
+    for pk in pks:
+        key = FRAGMENT_VERSION_KEY.format(label=model._meta.label_lower, pk=pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_fragment_versions(objs):
+    cache = fragment_cache()
+    keys = {obj.pk: _version_key(obj) for obj in objs}
+    found = cache.get_many(keys.values())
+
+    versions = {}
+    for pk, key in keys.items():
+        if key not in found:
+            # Seed with a timestamp so an evicted key never reuses an old version
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        versions[pk] = found[key]
+    return versions
+
+
+def render_cached(template_name, objs):
+    """
+    Render ``template_name`` once per object (as ``obj``), reusing cached HTML
+    keyed by the object's id and fragment version. Costs two cache round
+    trips for the whole list plus one render and one write per miss.
+    Returns the rendered fragments in the order of ``objs``.
+    """
+    objs = list(objs)
+    if not objs:
+        return []
+
+    cache = fragment_cache()
+    versions = get_fragment_versions(objs)
+    keys = [
+        FRAGMENT_KEY.format(template=template_name, label=obj._meta.label_lower, pk=obj.pk, version=versions[obj.pk])
+        for obj in objs
+    ]
+    cached = cache.get_many(keys)
+
+    rendered = []
+    missing = {}
+    for obj, key in zip(objs, keys):
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string(template_name, {"obj": obj})
+            missing[key] = html
+        rendered.append(mark_safe(html))
+
+    if missing:
+        cache.set_many(missing, getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 60 * 60 * 24))
+    stats.record(len(objs) - len(missing), len(missing))
+    return rendered
@@ -0,0 +1,156 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Sent with the model instance once its image has derivatives; pages showing it need refreshing
+derivatives_ready = Signal()
+
+DERIVATIVES_KEY = "image:derivatives:{name}"
+
+# Uploaded images that get derivatives, as (model label, field name)
+IMAGE_FIELDS = (
+    ("venue.VenueModel", "thumbnail_image"),
+    ("venue.VenueImages", "image"),
+    ("venue.City", "image"),
+    ("users.AuthUser", "profile_image"),
+)
+
+# Pillow format -> (file extension, save options) for the same-format variant
+FALLBACK_FORMATS = {
+    "JPEG": ("jpg", {"optimize": True, "progressive": True}),
+    "PNG": ("png", {"optimize": True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+
+
+def derivative_widths():
+    return tuple(sorted(getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", (320, 640, 1024))))
+
+
+def derivative_name(name, width, extension):
+    """``venue/hall.jpg`` -> ``venue/hall-640w.webp``: derivatives sit next to the original."""
+    stem, _ = os.path.splitext(name)
+    return f"{stem}-{width}w.{extension}"
+
+
+def _fallback_format(image):
+    if image.format in FALLBACK_FORMATS:
+        return image.format
+    return "PNG" if image.mode in ("RGBA", "LA", "P") else "JPEG"
+
+
+def _encode(image, fmt, **options):
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(field_file, force=False):
+    """
+    Write a resized copy of ``field_file`` in its own format and as WebP for
+    every configured width narrower than the original. Existing files are
+    kept unless ``force``. Returns the manifest cached for image_srcset:
+    ``{"width": original width, "extension": ..., "widths": [...]}``.
+    """
+    storage = field_file.storage
+    quality = getattr(settings, "IMAGE_DERIVATIVE_QUALITY", 80)
+
+    with storage.open(field_file.name, "rb") as original:
+        image = Image.open(original)
+        fmt = _fallback_format(image)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    extension, options = FALLBACK_FORMATS[fmt]
+    if fmt == "JPEG":
+        options = {**options, "quality": quality}
+    widths = [width for width in derivative_widths() if width < image.width]
+
+    for width in widths:
+        resized = None
+        for ext, target, target_options in (
+            (extension, fmt, options),
+            ("webp", "WEBP", {"quality": quality, "method": 4}),
+        ):
+            name = derivative_name(field_file.name, width, ext)
+            if storage.exists(name):
+                if not force:
+                    continue
+                storage.delete(name)
+            if resized is None:
+                height = round(image.height * width / image.width)
+                resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            storage.save(name, _encode(resized, target, **target_options))
+
+    manifest = {"width": image.width, "extension": extension, "widths": widths}
+    cache.set(DERIVATIVES_KEY.format(name=field_file.name), manifest, timeout=None)
+    return manifest
+
+
+def get_derivatives(field_file):
+    """The cached manifest for ``field_file``, or None if it hasn't been processed yet."""
+    if not field_file:
+        return None
+    return cache.get(DERIVATIVES_KEY.format(name=field_file.name))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2),
+                thread_name_prefix="image-derivatives",
+            )
+        return _executor
+
+
+def _run(field_file):
+    try:
+        generate_derivatives(field_file)
+        derivatives_ready.send(sender=type(field_file.instance), instance=field_file.instance)
+    except Exception:
+        logger.exception("Could not generate image derivatives", extra={"image": field_file.name})
+        # Serve the original for a while instead of retrying on every render
+        cache.set(DERIVATIVES_KEY.format(name=field_file.name), {"widths": []}, timeout=60 * 60)
+    finally:
+        with _executor_lock:
+            _in_flight.discard(field_file.name)
+
+
+def _submit(field_file):
+    with _executor_lock:
+        if field_file.name in _in_flight:
+            return
+        _in_flight.add(field_file.name)
+
+    if getattr(settings, "IMAGE_DERIVATIVES_ASYNC", True):
+        _get_executor().submit(_run, field_file)
+    else:
+        _run(field_file)
+
+
+def schedule_derivatives(field_file):
+    """
+    Generate derivatives for ``field_file`` on the worker pool once the
+    current transaction commits, unless they are known to exist or are
+    already being generated. Runs inline when IMAGE_DERIVATIVES_ASYNC is off.
+    """
+    if field_file and get_derivatives(field_file) is None:
+        transaction.on_commit(lambda: _submit(field_file))
@@ -0,0 +1,335 @@
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.metrics import PAYMENT_GATEWAY_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class KhaltiError(Exception):
+    """The Khalti API could not be reached or answered with an error."""
+
+
+class KhaltiUnavailable(KhaltiError):
+    """The circuit breaker is open; Khalti is not being called at all."""
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls
+    for ``reset_timeout`` seconds, then lets a single trial call through
+    (half-open) to decide whether to close again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        # The call ended without a verdict on Khalti (e.g. the task was cancelled):
+        # free the half-open slot so the next call can be the trial
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class LatencyStats:
+    """Per-endpoint call counts, errors and latency, kept in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["calls"] += 1
+            stats["errors"] += 0 if ok else 1
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        PAYMENT_GATEWAY_LATENCY.labels(endpoint, "ok" if ok else "error").observe(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: {**stats, "avg_seconds": stats["total_seconds"] / stats["calls"]}
+                for endpoint, stats in self._stats.items()
+            }
+
+
+# Endpoints that are safe to resend after a 502/503/504. initiate creates a
+# payment (a new pidx) on every call, so it is only retried when the
+# connection could not be made and Khalti never saw the request.
+IDEMPOTENT_ENDPOINTS = ("epayment/lookup/",)
+RETRY_STATUSES = (502, 503, 504)
+
+
+class KhaltiClient:
+    """
+    Thin client for the Khalti ePayment API over a pooled keep-alive session,
+    with connect/read timeouts, bounded retries with backoff on connection
+    errors (and on 502/503/504 for IDEMPOTENT_ENDPOINTS), and a circuit
+    breaker in front of every call.
+    """
+
+    def __init__(self, base_url, secret_key, connect_timeout=3.05, read_timeout=10, max_retries=2,
+                 backoff_factor=0.3, pool_size=10, failure_threshold=5, reset_timeout=30, breaker=None, stats=None):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = stats or LatencyStats()
+
+        connect_only = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=backoff_factor,
+            raise_on_status=False,
+        )
+        with_status = connect_only.new(
+            status=max_retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "POST"}),
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=connect_only)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # requests picks the longest matching prefix, so these endpoints get status retries
+        for endpoint in IDEMPOTENT_ENDPOINTS:
+            self.session.mount(
+                self.base_url + endpoint,
+                HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=with_status),
+            )
+        self.session.headers.update({
+            "Authorization": f"key {secret_key}",
+            "Content-Type": "application/json",
+        })
+
+    def _post(self, endpoint, payload):
+        if not self.breaker.allow():
+            raise KhaltiUnavailable("Khalti is temporarily unavailable")
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.post(self.base_url + endpoint, json=payload, timeout=self.timeout)
+            if response.status_code >= 500:
+                raise KhaltiError(f"Khalti {endpoint} failed with status {response.status_code}")
+            data = response.json()
+            ok = True
+        except (requests.RequestException, ValueError) as e:
+            self.breaker.record_failure()
+            raise KhaltiError(f"Khalti {endpoint} request failed: {e}") from e
+        except KhaltiError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stats.record(endpoint, elapsed, ok)
+            logger.info("Khalti %s took %.3fs", endpoint, elapsed, extra={"endpoint": endpoint, "ok": ok})
+
+        self.breaker.record_success()
+        if response.status_code >= 400:
+            raise KhaltiError(f"Khalti {endpoint} rejected the request: {data}")
+        return data
+
+    def initiate(self, payload):
+        return self._post("epayment/initiate/", payload)
+
+    def lookup(self, pidx):
+        return self._post("epayment/lookup/", {"pidx": pidx})
+
+
+class AsyncKhaltiClient:
+    """
+    asyncio counterpart of KhaltiClient for the async payment views: a
+    pooled httpx.AsyncClient (bound to the event loop it is first used on)
+    with the same timeouts, retry and circuit-breaker rules, so many
+    in-flight calls share a single worker.
+    """
+
+    def __init__(self, base_url, secret_key, connect_timeout=3.05, read_timeout=10, max_retries=2,
+                 backoff_factor=0.3, pool_size=100, failure_threshold=5, reset_timeout=30, breaker=None, stats=None):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.breaker = breaker or CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = stats or LatencyStats()
+        self.session = httpx.AsyncClient(
+            headers={"Authorization": f"key {secret_key}", "Content-Type": "application/json"},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            transport=httpx.AsyncHTTPTransport(
+                retries=max_retries,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            ),
+        )
+
+    async def _send(self, endpoint, payload):
+        for attempt in range(self.max_retries + 1):
+            # The transport itself retries failed connects; statuses only for idempotent endpoints
+            response = await self.session.post(self.base_url + endpoint, json=payload)
+            if (endpoint not in IDEMPOTENT_ENDPOINTS or response.status_code not in RETRY_STATUSES
+                    or attempt == self.max_retries):
+                return response
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    async def _post(self, endpoint, payload):
+        if not self.breaker.allow():
+            raise KhaltiUnavailable("Khalti is temporarily unavailable")
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = await self._send(endpoint, payload)
+            if response.status_code >= 500:
+                raise KhaltiError(f"Khalti {endpoint} failed with status {response.status_code}")
+            data = response.json()
+            ok = True
+        except (httpx.HTTPError, ValueError) as e:
+            self.breaker.record_failure()
+            raise KhaltiError(f"Khalti {endpoint} request failed: {e}") from e
+        except KhaltiError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stats.record(endpoint, elapsed, ok)
+            logger.info("Khalti %s took %.3fs", endpoint, elapsed, extra={"endpoint": endpoint, "ok": ok})
+
+        self.breaker.record_success()
+        if response.status_code >= 400:
+            raise KhaltiError(f"Khalti {endpoint} rejected the request: {data}")
+        return data
+
+    async def initiate(self, payload):
+        return await self._post("epayment/initiate/", payload)
+
+    async def lookup(self, pidx):
+        return await self._post("epayment/lookup/", {"pidx": pidx})
+
+    async def aclose(self):
+        await self.session.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_breaker = None
+_stats = None
+
+
+def _client_options():
+    """Settings shared by the sync and async clients, including the process-wide breaker and stats."""
+    global _breaker, _stats
+    with _client_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(settings.KHALTI_BREAKER_THRESHOLD, settings.KHALTI_BREAKER_RESET)
+            _stats = LatencyStats()
+    return {
+        "connect_timeout": settings.KHALTI_CONNECT_TIMEOUT,
+        "read_timeout": settings.KHALTI_READ_TIMEOUT,
+        "max_retries": settings.KHALTI_MAX_RETRIES,
+        "breaker": _breaker,
+        "stats": _stats,
+    }
+
+
+def get_khalti_client():
+    """Process-wide KhaltiClient built from the KHALTI_* settings."""
+    global _client
+    if _client is None:
+        options = _client_options()
+        with _client_lock:
+            if _client is None:
+                _client = KhaltiClient(settings.KHALTI_BASE_URL, settings.KHALTI_SECRET_KEY, **options)
+    return _client
+
+
+def get_async_khalti_client():
+    """
+    AsyncKhaltiClient for the running event loop (httpx clients are
+    loop-bound). Only for long-lived loops, i.e. under ASGI; see
+    async_khalti_client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncKhaltiClient(settings.KHALTI_BASE_URL, settings.KHALTI_SECRET_KEY, **_client_options())
+        _async_clients[loop] = client
+    return client
+
+
+@contextlib.asynccontextmanager
+async def async_khalti_client(shared=True):
+    """
+    Yields an AsyncKhaltiClient. With ``shared`` it is the pooled client of
+    the running loop. Without it (under WSGI, where async_to_sync runs each
+    request on a fresh loop that is discarded afterwards) a client is built
+    for this call and closed on exit instead of leaking its sockets. The
+    circuit breaker and stats are process-wide either way.
+    """
+    if shared:
+        yield get_async_khalti_client()
+        return
+
+    client = AsyncKhaltiClient(settings.KHALTI_BASE_URL, settings.KHALTI_SECRET_KEY, **_client_options())
+    try:
+        yield client
+    finally:
+        await client.aclose()
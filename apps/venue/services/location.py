@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core import signing
+
+LOCATION_COOKIE_SALT = "venue.user-location"
+
+
+def _cookie_name():
+    return getattr(settings, "USER_LOCATION_COOKIE_NAME", "user_location")
+
+
+def get_user_location(request):
+    """
+    The visitor's (lat, lng) from the signed location cookie, or (None, None).
+    Sessions written before the cookie existed are still read, never written.
+    """
+    value = request.get_signed_cookie(_cookie_name(), default=None, salt=LOCATION_COOKIE_SALT)
+    if value:
+        try:
+            lat, lng = (float(part) for part in value.split(","))
+            return lat, lng
+        except ValueError:
+            pass
+
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return request.session.get("user_lat"), request.session.get("user_lng")
+    return None, None
+
+
+def remember_user_location(request, response, lat, lng):
+    """
+    Store (lat, lng) in the signed cookie on ``response``. Nothing is written
+    when the stored location is already within USER_LOCATION_TOLERANCE
+    degrees, so repeated geolocation pings don't resend the cookie.
+    Returns True if the cookie was set.
+    """
+    tolerance = getattr(settings, "USER_LOCATION_TOLERANCE", 0.001)
+    current_lat, current_lng = get_user_location(request)
+    if current_lat is not None and current_lng is not None:
+        if abs(current_lat - lat) <= tolerance and abs(current_lng - lng) <= tolerance:
+            return False
+
+    response.set_signed_cookie(
+        _cookie_name(),
+        f"{lat:.6f},{lng:.6f}",
+        salt=LOCATION_COOKIE_SALT,
+        max_age=getattr(settings, "USER_LOCATION_COOKIE_AGE", 60 * 60 * 24 * 30),
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
+    return True
@@ -0,0 +1,133 @@
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.venue.models import BookingModel, KhaltiTransaction
+from apps.venue.services.bookings import BookingConflict, confirm_booking
+
+
+class KhaltiStatus:
+    """Payment statuses reported by the Khalti lookup API."""
+    INITIATED = "Initiated"
+    PENDING = "Pending"
+    COMPLETED = "Completed"
+    REFUNDED = "Refunded"
+    PARTIALLY_REFUNDED = "Partially Refunded"
+    EXPIRED = "Expired"
+    USER_CANCELED = "User canceled"
+
+    # Statuses that may still change and need another lookup
+    OPEN = (INITIATED, PENDING)
+
+
+logger = logging.getLogger(__name__)
+
+
+def paisa_to_rupees(amount):
+    return (Decimal(amount) / 100).quantize(Decimal("0.01"))
+
+
+def record_initiation(booking, user, payload, data):
+    """
+    Store the pidx returned by Khalti's initiate call as an INITIATED
+    transaction, so payments abandoned before the redirect back to
+    PaymentSuccessView are still found and settled by reconciliation.
+    """
+    transaction_obj, _ = KhaltiTransaction.objects.update_or_create(
+        pidx=data["pidx"],
+        defaults={
+            "booking": booking,
+            "user": user,
+            "total_amount": paisa_to_rupees(payload["amount"]),
+            "status": KhaltiStatus.INITIATED,
+            "purchase_order_id": booking.id,
+            "purchase_order_name": payload["purchase_order_name"],
+        },
+    )
+    return transaction_obj
+
+
+def apply_lookup(transaction_obj, lookup, now=None):
+    """Copy a lookup API response onto a KhaltiTransaction (without saving it)."""
+    transaction_obj.status = lookup.get("status") or transaction_obj.status
+    transaction_obj.transaction_id = lookup.get("transaction_id") or transaction_obj.transaction_id
+    if lookup.get("total_amount") is not None:
+        transaction_obj.total_amount = paisa_to_rupees(lookup["total_amount"])
+    transaction_obj.verified_at = now or timezone.now()
+    if transaction_obj.status == KhaltiStatus.COMPLETED and transaction_obj.completed_at is None:
+        transaction_obj.completed_at = transaction_obj.verified_at
+    return transaction_obj
+
+
+def paid_amount_matches(lookup, expected_amount):
+    """Whether a lookup response paid exactly ``expected_amount`` rupees (the booking's snapshot)."""
+    if expected_amount is None or lookup.get("total_amount") is None:
+        return False
+    return paisa_to_rupees(lookup["total_amount"]) == expected_amount
+
+
+def record_payment(pidx, lookup, booking_id, user, redirect_params=None):
+    """
+    Upsert the KhaltiTransaction for ``pidx`` when the customer is redirected
+    back from Khalti. The status comes from the lookup API response
+    ``lookup``, never from the redirect's query string; pass ``lookup=None``
+    when the lookup failed and the row is kept unverified for
+    reconciliation. Completed payments mark the booking paid if the amount
+    paid matches the booking's total.
+
+    A pidx that record_initiation never stored only has the redirect's
+    ``booking_id`` to go on, which the customer controls: it is recorded
+    with needs_review set and the booking is left alone, as is a completed
+    payment for the wrong amount.
+
+    Safe to call any number of times for the same pidx: the row is keyed on
+    the unique pidx and confirming a confirmed booking changes nothing.
+    Returns (transaction, booking_conflict) where booking_conflict is True if
+    the payment completed but the hold had expired and the date was taken;
+    transaction is None if ``booking_id`` names no booking.
+    """
+    redirect_params = redirect_params or {}
+    with transaction.atomic():
+        transaction_obj = KhaltiTransaction.objects.select_for_update().filter(pidx=pidx).first()
+        if transaction_obj is None:
+            if not str(booking_id).isdigit() or not BookingModel.objects.filter(pk=booking_id).exists():
+                logger.warning("Ignoring Khalti redirect for unknown pidx %s", pidx, extra={"pidx": pidx})
+                return None, False
+            logger.warning(
+                "Khalti pidx %s was never initiated here; recording it for review", pidx,
+                extra={"pidx": pidx, "booking_id": booking_id},
+            )
+            KhaltiTransaction.objects.get_or_create(pidx=pidx, defaults={
+                "booking_id": booking_id,
+                "user": user,
+                "status": KhaltiStatus.PENDING,
+                "purchase_order_id": booking_id,
+                "purchase_order_name": redirect_params.get("purchase_order_name") or f"Booking-{booking_id}",
+                "total_amount": 0,
+                "needs_review": True,
+            })
+            transaction_obj = KhaltiTransaction.objects.select_for_update().get(pidx=pidx)
+        transaction_obj.tidx = redirect_params.get("tidx") or transaction_obj.tidx
+        transaction_obj.txn_id = redirect_params.get("txnId") or transaction_obj.txn_id
+        if lookup is not None:
+            apply_lookup(transaction_obj, lookup)
+        completed = lookup is not None and transaction_obj.status == KhaltiStatus.COMPLETED
+        if completed and not paid_amount_matches(lookup, transaction_obj.booking.total_amount):
+            logger.error(
+                "Khalti payment %s paid %s but booking %s costs %s; left for review",
+                pidx, lookup.get("total_amount"), transaction_obj.booking_id, transaction_obj.booking.total_amount,
+                extra={"pidx": pidx, "booking_id": transaction_obj.booking_id},
+            )
+            transaction_obj.needs_review = True
+        transaction_obj.save()
+
+    if not completed or transaction_obj.needs_review:
+        return transaction_obj, False
+
+    try:
+        confirm_booking(transaction_obj.booking)
+    except BookingConflict:
+        return transaction_obj, True
+    return transaction_obj, False
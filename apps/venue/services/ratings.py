@@ -0,0 +1,58 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from apps.venue.models import VenueModel, VenueRatingModel
+
+
+def adjust_rating_aggregate(venue_id, rating, sign):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) one rating from the venue's
+    rating_sum/rating_count with an F() update. NULL ratings are not counted,
+    matching the Avg the aggregate replaced.
+    """
+    if venue_id is None or rating is None:
+        return
+    VenueModel.objects.filter(id=venue_id).update(
+        rating_sum=Greatest(F("rating_sum") + sign * rating, 0),
+        rating_count=Greatest(F("rating_count") + sign, 0),
+    )
+
+
+def rate_venue(user, venue_id, rating):
+    """
+    Create or update the user's rating for a venue inside one transaction;
+    the VenueRatingModel signals move the venue's aggregate along with it.
+
+    Returns the VenueRatingModel instance.
+    """
+    with transaction.atomic():
+        existing = VenueRatingModel.objects.select_for_update().filter(user=user, venue_id=venue_id).first()
+
+        if existing is None:
+            try:
+                with transaction.atomic():
+                    return VenueRatingModel.objects.create(user=user, venue_id=venue_id, rating=rating)
+            except IntegrityError:
+                # A concurrent request inserted the same (user, venue) pair first
+                existing = VenueRatingModel.objects.select_for_update().get(user=user, venue_id=venue_id)
+
+        if existing.rating != rating:
+            existing.rating = rating
+            existing.save(update_fields=["rating"])
+        return existing
+
+
+def rebuild_venue_ratings(queryset=None):
+    """
+    Recompute rating_sum/rating_count from VenueRatingModel in a single UPDATE.
+    Returns the number of venues updated.
+    """
+    if queryset is None:
+        queryset = VenueModel.objects.all()
+
+    ratings = VenueRatingModel.objects.filter(venue=OuterRef("pk")).order_by().values("venue")
+    return queryset.update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum("rating")).values("total")), 0),
+        rating_count=Coalesce(Subquery(ratings.annotate(total=Count("rating")).values("total")), 0),
+    )
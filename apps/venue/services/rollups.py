@@ -0,0 +1,137 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.venue.constants import BookingStatus
+from apps.venue.models import BookingModel, KhaltiTransaction, VenueDailyStats, VenueModel
+from apps.venue.services.payments import KhaltiStatus
+
+# Bookings that count towards a venue's bookings, guests and occupancy
+CONFIRMED_STATUSES = (BookingStatus.ONGOING, BookingStatus.COMPLETED)
+
+
+def _booking_totals(venue_ids, dates=None):
+    bookings = BookingModel.objects.filter(venue_id__in=venue_ids, status__in=CONFIRMED_STATUSES)
+    if dates is not None:
+        bookings = bookings.filter(booked_for__in=dates)
+    return {
+        (row["venue_id"], row["booked_for"]): (row["bookings"], row["guests"] or 0)
+        for row in bookings.exclude(booked_for=None).values("venue_id", "booked_for").order_by()
+        .annotate(bookings=Count("id"), guests=Sum("total_people"))
+    }
+
+
+def _revenue_totals(venue_ids, dates=None):
+    payments = KhaltiTransaction.objects.filter(booking__venue_id__in=venue_ids, status=KhaltiStatus.COMPLETED)
+    payments = payments.exclude(completed_at=None).annotate(day=TruncDate("completed_at"))
+    if dates is not None:
+        payments = payments.filter(day__in=dates)
+    return {
+        (row["booking__venue_id"], row["day"]): row["revenue"]
+        for row in payments.values("booking__venue_id", "day").order_by().annotate(revenue=Sum("total_amount"))
+    }
+
+
+def _stats_rows(venue_ids, dates=None):
+    booking_totals = _booking_totals(venue_ids, dates)
+    revenue_totals = _revenue_totals(venue_ids, dates)
+    rows = []
+    for venue_id, day in booking_totals.keys() | revenue_totals.keys():
+        bookings, guests = booking_totals.get((venue_id, day), (0, 0))
+        rows.append(VenueDailyStats(
+            venue_id=venue_id, date=day, bookings=bookings, guests=guests,
+            revenue=revenue_totals.get((venue_id, day), Decimal("0")),
+        ))
+    return rows
+
+
+def refresh_venue_days(cells):
+    """
+    Recompute the rollup rows for the given ``(venue_id, date)`` pairs from
+    the bookings and payments on just those days. Cost depends on how many
+    cells changed, not on the size of the booking history.
+    """
+    by_venue = defaultdict(set)
+    for venue_id, day in cells:
+        if venue_id and day:
+            by_venue[venue_id].add(day)
+
+    for venue_id, days in by_venue.items():
+        rows = _stats_rows([venue_id], days)
+        with transaction.atomic():
+            VenueDailyStats.objects.filter(venue_id=venue_id, date__in=days).delete()
+            VenueDailyStats.objects.bulk_create(rows)
+
+
+def booking_cells(booking_ids):
+    return set(BookingModel.objects.filter(id__in=booking_ids).values_list("venue_id", "booked_for"))
+
+
+def transaction_cells(transactions):
+    """Rollup cells touched by the given KhaltiTransaction instances (revenue is keyed on the day they completed)."""
+    transactions = [t for t in transactions if t.completed_at]
+    if not transactions:
+        return set()
+    venue_ids = dict(
+        BookingModel.objects.filter(id__in={t.booking_id for t in transactions}).values_list("id", "venue_id")
+    )
+    return {(venue_ids.get(t.booking_id), timezone.localdate(t.completed_at)) for t in transactions}
+
+
+def rebuild_venue_stats(venue_ids=None):
+    """
+    Drop and recompute the rollups for ``venue_ids`` (every venue when None)
+    from the full booking and payment history. Returns the rows written.
+    """
+    if venue_ids is None:
+        venue_ids = list(VenueModel.objects.values_list("id", flat=True))
+
+    rows = _stats_rows(venue_ids)
+    with transaction.atomic():
+        VenueDailyStats.objects.filter(venue_id__in=venue_ids).delete()
+        VenueDailyStats.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def vendor_stats(owner, start, end):
+    """
+    Daily bookings, guests and revenue per venue owned by ``owner`` between
+    start and end (inclusive), read only from the rollup table.
+    """
+    days = (end - start).days + 1
+    venues = {
+        venue["id"]: {**venue, "bookings": 0, "guests": 0, "revenue": Decimal("0"), "booked_days": 0, "days": []}
+        for venue in VenueModel.objects.filter(owner=owner).order_by("id").values("id", "name", "capacity")
+    }
+
+    rows = VenueDailyStats.objects.filter(venue_id__in=venues, date__range=(start, end)).order_by("venue_id", "date")
+    for row in rows:
+        venue = venues[row.venue_id]
+        venue["bookings"] += row.bookings
+        venue["guests"] += row.guests
+        venue["revenue"] += row.revenue
+        venue["booked_days"] += 1 if row.bookings else 0
+        venue["days"].append({
+            "date": row.date.isoformat(),
+            "bookings": row.bookings,
+            "guests": row.guests,
+            "revenue": row.revenue,
+        })
+
+    for venue in venues.values():
+        venue["occupancy"] = round(venue["booked_days"] / days, 4)
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "venues": list(venues.values()),
+        "totals": {
+            "bookings": sum(venue["bookings"] for venue in venues.values()),
+            "guests": sum(venue["guests"] for venue in venues.values()),
+            "revenue": sum((venue["revenue"] for venue in venues.values()), Decimal("0")),
+        },
+    }
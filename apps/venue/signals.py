@@ -1,12 +1,193 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
-from apps.venue.constants import BookingStatus
-from apps.venue.models import BookingModel
+from apps.venue.models import BookingModel, City, KhaltiTransaction, Price, VenueImages, VenueModel, VenueRatingModel
+from apps.venue.services.availability import bump_availability_version
+from apps.venue.services.cities import invalidate_city_directory
+from apps.venue.services.fragments import bump_fragment_version, bump_fragment_versions
+from apps.venue.services.images import derivatives_ready, schedule_derivatives
+from apps.venue.services.payments import KhaltiStatus
+from apps.venue.services.ratings import adjust_rating_aggregate
+from apps.venue.services.rollups import CONFIRMED_STATUSES, refresh_venue_days, transaction_cells
+
+
+@receiver(pre_save, sender=VenueRatingModel)
+def remember_previous_rating(sender, instance, update_fields=None, **kwargs):
+    # The (venue, rating) the aggregate currently counts for this row, if the save may change it
+    instance._previous_rating = None
+    if instance.pk and (update_fields is None or {"venue", "rating"} & set(update_fields)):
+        instance._previous_rating = VenueRatingModel.objects.filter(pk=instance.pk).values_list(
+            "venue_id", "rating"
+        ).first()
+
+
+@receiver(post_save, sender=VenueRatingModel)
+def add_rating_to_aggregate(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_rating", None)
+    if not created and (previous is None or previous == (instance.venue_id, instance.rating)):
+        return
+    if previous:
+        adjust_rating_aggregate(*previous, sign=-1)
+    adjust_rating_aggregate(instance.venue_id, instance.rating, sign=1)
+
+
+@receiver(post_delete, sender=VenueRatingModel)
+def remove_rating_from_aggregate(sender, instance, **kwargs):
+    adjust_rating_aggregate(instance.venue_id, instance.rating, sign=-1)
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=VenueModel)
+@receiver(post_delete, sender=VenueModel)
+def refresh_city_directory(sender, instance, **kwargs):
+    # Venue saves may move a venue between cities; city saves change the card itself
+    invalidate_city_directory()
+
+
+@receiver(post_save, sender=BookingModel)
+@receiver(post_delete, sender=BookingModel)
+def refresh_venue_availability(sender, instance, **kwargs):
+    if instance.venue_id:
+        bump_availability_version(instance.venue_id)
+
+
+# Booking fields the vendor rollups are computed from
+ROLLUP_FIELDS = ("venue_id", "booked_for", "status", "total_people")
+
+
+def _rollup_cells(state):
+    venue_id, booked_for, status, _ = state
+    return {(venue_id, booked_for)} if status in CONFIRMED_STATUSES else set()
 
 
 @receiver(pre_save, sender=BookingModel)
-def update_booking_status(sender, instance, **kwargs):
-    if instance.booked_for and instance.booked_for < timezone.now().date():
-        instance.status = BookingStatus.COMPLETED
\ No newline at end of file
+def remember_booking_rollup_state(sender, instance, update_fields=None, **kwargs):
+    # What the rollups counted for this row before the save. Instances loaded from the
+    # database already carry it; only hand-built ones with a pk need the extra SELECT.
+    instance._rollup_previous = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not {"venue", "booked_for", "status", "total_people"} & set(update_fields):
+        instance._rollup_previous = tuple(getattr(instance, field) for field in ROLLUP_FIELDS)
+        return
+    instance._rollup_previous = instance.saved_values(*ROLLUP_FIELDS) or BookingModel.objects.filter(
+        pk=instance.pk
+    ).values_list(*ROLLUP_FIELDS).first()
+
+
+@receiver(post_save, sender=BookingModel)
+def refresh_booking_rollups(sender, instance, **kwargs):
+    current = tuple(getattr(instance, field) for field in ROLLUP_FIELDS)
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous == current:
+        return
+    cells = _rollup_cells(current) | (_rollup_cells(previous) if previous else set())
+    if cells:
+        refresh_venue_days(cells)
+
+
+@receiver(post_delete, sender=BookingModel)
+def remove_booking_from_rollups(sender, instance, **kwargs):
+    state = instance.saved_values(*ROLLUP_FIELDS) or tuple(getattr(instance, field) for field in ROLLUP_FIELDS)
+    cells = _rollup_cells(state)
+    if cells:
+        refresh_venue_days(cells)
+
+
+@receiver(post_save, sender=KhaltiTransaction)
+@receiver(post_delete, sender=KhaltiTransaction)
+def refresh_revenue_rollups(sender, instance, created=False, **kwargs):
+    # New rows only matter once completed; updates may also take revenue away (refunds)
+    if instance.status == KhaltiStatus.COMPLETED or not created:
+        refresh_venue_days(transaction_cells([instance]))
+
+
+@receiver(pre_save, sender=VenueModel)
+def remember_venue_city(sender, instance, update_fields=None, **kwargs):
+    # A venue moving city changes the venue count on the old city's card too
+    instance._previous_city_id = None
+    if instance.pk and (update_fields is None or "city" in update_fields):
+        instance._previous_city_id = VenueModel.objects.filter(pk=instance.pk).values_list("city_id", flat=True).first()
+
+
+@receiver(post_save, sender=VenueModel)
+@receiver(post_delete, sender=VenueModel)
+def refresh_venue_cards(sender, instance, **kwargs):
+    bump_fragment_version(VenueModel, instance.pk)
+    for city_id in {instance.city_id, getattr(instance, "_previous_city_id", None)} - {None}:
+        bump_fragment_version(City, city_id)
+
+
+@receiver(post_save, sender=Price)
+@receiver(post_delete, sender=Price)
+@receiver(post_save, sender=VenueImages)
+@receiver(post_delete, sender=VenueImages)
+@receiver(post_save, sender=VenueRatingModel)
+@receiver(post_delete, sender=VenueRatingModel)
+def refresh_venue_card_parts(sender, instance, **kwargs):
+    bump_fragment_version(VenueModel, instance.venue_id)
+    touch_venue(instance.venue_id)
+
+
+@receiver(post_save, sender=VenueModel)
+@receiver(post_delete, sender=VenueModel)
+def touch_venue_cities(sender, instance, **kwargs):
+    # The city pages list their venues, so a venue change modifies them too
+    city_ids = {instance.city_id, getattr(instance, "_previous_city_id", None)} - {None}
+    if city_ids:
+        City.objects.filter(id__in=city_ids).update(updated_at=timezone.now())
+
+
+def touch_venue(venue_id):
+    """Advance updated_at on a venue and its city after a change to its prices, images or ratings."""
+    if venue_id is None:
+        return
+    now = timezone.now()
+    VenueModel.objects.filter(id=venue_id).update(updated_at=now)
+    City.objects.filter(venues__id=venue_id).update(updated_at=now)
+    # The directory snapshot carries updated_at for the city pages' Last-Modified
+    invalidate_city_directory()
+
+
+@receiver(pre_delete, sender=City)
+def remember_city_venues(sender, instance, **kwargs):
+    # SET_NULL detaches the venues without signals, so find them while they still point here
+    instance._venue_ids = list(instance.venues.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def refresh_city_card(sender, instance, **kwargs):
+    bump_fragment_version(City, instance.pk)
+    # Venue cards show the city's name too
+    venue_ids = getattr(instance, "_venue_ids", None)
+    if venue_ids is None:
+        venue_ids = VenueModel.objects.filter(city_id=instance.pk).values_list("id", flat=True)
+    bump_fragment_versions(VenueModel, venue_ids)
+
+
+@receiver(derivatives_ready, sender=VenueModel)
+@receiver(derivatives_ready, sender=VenueImages)
+def refresh_venue_images(sender, instance, **kwargs):
+    # Cached cards and the detail page's validators predate the srcset
+    venue_id = instance.pk if sender is VenueModel else instance.venue_id
+    bump_fragment_version(VenueModel, venue_id)
+    touch_venue(venue_id)
+
+
+@receiver(derivatives_ready, sender=City)
+def refresh_city_image(sender, instance, **kwargs):
+    bump_fragment_version(City, instance.pk)
+    City.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+    invalidate_city_directory()
+
+
+@receiver(post_save, sender=VenueModel)
+@receiver(post_save, sender=VenueImages)
+@receiver(post_save, sender=City)
+def generate_image_derivatives(sender, instance, **kwargs):
+    # Resized/WebP variants are built off the request thread once the save commits
+    field = {VenueModel: "thumbnail_image", VenueImages: "image", City: "image"}[sender]
+    schedule_derivatives(getattr(instance, field))
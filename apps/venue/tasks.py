@@ -1,15 +1,282 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.utils import timezone
 
 from apps.venue.constants import BookingStatus
-from apps.venue.models import BookingModel
+from apps.venue.models import BookingModel, KhaltiTransaction
+from apps.venue.services.availability import bump_availability_version
+from apps.venue.services.bookings import BookingConflict, confirm_booking
+from apps.venue.services.images import IMAGE_FIELDS, generate_derivatives
+from apps.venue.services.khalti import CircuitBreaker, KhaltiError, get_khalti_client
+from apps.venue.services.payments import KhaltiStatus, apply_lookup, paid_amount_matches
+from apps.venue.services.rollups import booking_cells, refresh_venue_days, transaction_cells
+
+logger = logging.getLogger(__name__)
 
 
-def update_booking_statuses():
+def update_booking_statuses(chunk_size=None):
+    """
+    Mark ONGOING bookings whose date has passed as COMPLETED, in primary-key
+    ordered chunks of ``chunk_size`` rows so no single UPDATE holds locks for
+    long. Each chunk commits on its own; completed rows drop out of the filter,
+    so an interrupted run simply resumes from the first remaining row.
+    """
+    chunk_size = chunk_size or getattr(settings, "BOOKING_SWEEP_CHUNK_SIZE", 500)
+    today = timezone.now().date()
     expired_bookings = BookingModel.objects.filter(
         status=BookingStatus.ONGOING,
-        booked_for__lt=timezone.now().date()
+        booked_for__lt=today
+    )
+
+    started = time.monotonic()
+    updated_count = 0
+    chunks = 0
+    last_pk = 0
+
+    while True:
+        ids = list(
+            expired_bookings.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+
+        with transaction.atomic():
+            updated_count += expired_bookings.filter(pk__in=ids).update(status=BookingStatus.COMPLETED)
+        chunks += 1
+        last_pk = ids[-1]
+
+    duration = time.monotonic() - started
+    logger.info(
+        "Booking status sweep completed %s bookings in %s chunks (%.3fs)",
+        updated_count, chunks, duration,
+        extra={"updated": updated_count, "chunks": chunks, "duration": duration},
+    )
+    return {"updated": updated_count, "chunks": chunks, "duration": duration}
+
+
+def release_expired_holds(chunk_size=None):
+    """
+    Move HOLD bookings whose hold_expires_at has passed to EXPIRED so their
+    dates become bookable again. Walks the partial hold-expiry index in
+    primary-key chunks and bumps the availability version of every venue
+    it touches (queryset.update() does not send signals).
+    """
+    chunk_size = chunk_size or getattr(settings, "BOOKING_SWEEP_CHUNK_SIZE", 500)
+    expired_holds = BookingModel.objects.filter(
+        status=BookingStatus.HOLD,
+        hold_expires_at__lte=timezone.now()
+    )
+
+    started = time.monotonic()
+    released_count = 0
+    venue_ids = set()
+    last_pk = 0
+
+    while True:
+        rows = list(
+            expired_holds.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "venue_id")[:chunk_size]
+        )
+        if not rows:
+            break
+
+        with transaction.atomic():
+            released_count += expired_holds.filter(pk__in=[pk for pk, _ in rows]).update(
+                status=BookingStatus.EXPIRED
+            )
+        venue_ids.update(venue_id for _, venue_id in rows if venue_id)
+        last_pk = rows[-1][0]
+
+    for venue_id in venue_ids:
+        bump_availability_version(venue_id)
+
+    duration = time.monotonic() - started
+    logger.info(
+        "Released %s expired booking holds across %s venues (%.3fs)",
+        released_count, len(venue_ids), duration,
+        extra={"released": released_count, "venues": len(venue_ids), "duration": duration},
+    )
+    return {"released": released_count, "venues": len(venue_ids), "duration": duration}
+
+
+def _settle_completed_bookings(booking_ids):
+    """
+    Mark the bookings behind completed payments paid. Holds (even overdue ones)
+    still own their date, so each becomes ONGOING with a conditional UPDATE.
+    Bookings whose hold was released meanwhile, here or earlier, go through
+    confirm_booking because their date may have been taken since. Returns
+    (venue_ids, conflicted booking ids); nothing is raised for a lost date.
+    """
+    rows = list(BookingModel.objects.filter(id__in=booking_ids).values_list("id", "status", "venue_id"))
+    released = [pk for pk, status, _ in rows if status == BookingStatus.EXPIRED]
+
+    for pk, status, _ in rows:
+        if status == BookingStatus.EXPIRED:
+            continue
+        values = {"is_paid": True}
+        if status == BookingStatus.HOLD:
+            values.update(status=BookingStatus.ONGOING, hold_expires_at=None)
+        try:
+            with transaction.atomic():
+                # Only while still held: a sweep may expire it and the date be re-booked meanwhile
+                updated = BookingModel.objects.filter(pk=pk, status=status).update(**values)
+        except IntegrityError:
+            updated = 0
+        if not updated:
+            released.append(pk)
+
+    conflicted = []
+    for booking in BookingModel.objects.filter(id__in=released):
+        try:
+            confirm_booking(booking)
+        except BookingConflict:
+            conflicted.append(booking.id)
+            logger.warning(
+                "Paid booking %s lost its date after the hold expired", booking.id, extra={"booking_id": booking.id}
+            )
+
+    return {venue_id for _, _, venue_id in rows if venue_id}, conflicted
+
+
+def reconcile_payments(chunk_size=None, concurrency=None, client=None):
+    """
+    Verify Khalti transactions whose outcome is not settled yet: payments
+    still Initiated/Pending and rows never confirmed with the lookup API.
+    Walks them in primary-key chunks, looks each chunk up with at most
+    ``concurrency`` requests in flight, writes the results back with one
+    bulk_update and marks the bookings of completed payments paid. Payments
+    whose amount differs from the booking's total are flagged needs_review
+    instead; flagged rows are left to a person and not revisited.
+    Re-running is harmless: verified final statuses drop out of the filter.
+    """
+    chunk_size = chunk_size or getattr(settings, "KHALTI_RECONCILE_CHUNK_SIZE", 100)
+    concurrency = concurrency or getattr(settings, "KHALTI_RECONCILE_CONCURRENCY", 8)
+    client = client or get_khalti_client()
+    unsettled = KhaltiTransaction.objects.filter(
+        Q(status__in=KhaltiStatus.OPEN) | Q(verified_at__isnull=True), needs_review=False
+    )
+
+    def lookup(transaction_obj):
+        try:
+            return transaction_obj, client.lookup(transaction_obj.pidx)
+        except KhaltiError as e:
+            logger.warning("Khalti lookup failed for %s: %s", transaction_obj.pidx, e)
+            return transaction_obj, None
+
+    started = time.monotonic()
+    stats = {"checked": 0, "verified": 0, "completed": 0, "errors": 0, "conflicts": 0, "flagged": 0}
+    venue_ids = set()
+    last_pk = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            chunk = list(unsettled.filter(pk__gt=last_pk).order_by("pk")[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            now = timezone.now()
+            verified = []
+            lookups = {}
+            for transaction_obj, result in pool.map(lookup, chunk):
+                if result is None:
+                    stats["errors"] += 1
+                else:
+                    verified.append(apply_lookup(transaction_obj, result, now))
+                    lookups[transaction_obj.pk] = result
+
+            completed = [t for t in verified if t.status == KhaltiStatus.COMPLETED]
+            totals = dict(BookingModel.objects.filter(id__in=[t.booking_id for t in completed]).values_list("id", "total_amount"))
+            for transaction_obj in completed:
+                if not paid_amount_matches(lookups[transaction_obj.pk], totals.get(transaction_obj.booking_id)):
+                    transaction_obj.needs_review = True
+                    stats["flagged"] += 1
+                    logger.error(
+                        "Khalti payment %s does not match the total of booking %s; left for review",
+                        transaction_obj.pidx, transaction_obj.booking_id,
+                        extra={"pidx": transaction_obj.pidx, "booking_id": transaction_obj.booking_id},
+                    )
+            settle = [t for t in completed if not t.needs_review]
+            completed = [t.booking_id for t in settle]
+
+            if completed:
+                touched, conflicted = _settle_completed_bookings(completed)
+                venue_ids |= touched
+                stats["conflicts"] += len(conflicted)
+                # Paid, but the date went to someone else: left to a person to refund or move
+                for transaction_obj in settle:
+                    if transaction_obj.booking_id in conflicted:
+                        transaction_obj.needs_review = True
+            KhaltiTransaction.objects.bulk_update(
+                verified, ["status", "transaction_id", "total_amount", "verified_at", "completed_at", "needs_review"]
+            )
+            # bulk_update()/update() skip the rollup signals
+            refresh_venue_days(transaction_cells(verified) | booking_cells(completed))
+
+            stats["checked"] += len(chunk)
+            stats["verified"] += len(verified)
+            stats["completed"] += len(completed)
+
+            if client.breaker.state == CircuitBreaker.OPEN:
+                logger.warning("Khalti circuit breaker is open; stopping payment reconciliation early")
+                break
+
+    for venue_id in venue_ids:
+        bump_availability_version(venue_id)
+
+    stats["duration"] = time.monotonic() - started
+    logger.info(
+        "Reconciled %s Khalti transactions: %s verified, %s completed, %s errors (%.3fs)",
+        stats["checked"], stats["verified"], stats["completed"], stats["errors"], stats["duration"],
+        extra=stats,
     )
+    return stats
 
-    updated_count = expired_bookings.update(status=BookingStatus.COMPLETED)
 
-    return f"Updated {updated_count} bookings to COMPLETED status"
\ No newline at end of file
+def backfill_image_derivatives(chunk_size=None, workers=None, force=False):
+    """
+    Generate resized and WebP derivatives for every uploaded image in
+    IMAGE_FIELDS, walking each table in primary-key chunks and resizing a
+    chunk's images on a pool of ``workers`` threads. Images whose
+    derivatives already exist are skipped unless ``force``.
+    """
+    chunk_size = chunk_size or getattr(settings, "BOOKING_SWEEP_CHUNK_SIZE", 500)
+    workers = workers or getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2)
+
+    started = time.monotonic()
+    processed = errors = 0
+
+    def generate(field_file):
+        try:
+            generate_derivatives(field_file, force=force)
+            return True
+        except Exception:
+            logger.exception("Could not generate image derivatives", extra={"image": field_file.name})
+            return False
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for label, field in IMAGE_FIELDS:
+            model = apps.get_model(label)
+            images = model.objects.exclude(**{field: ""}).exclude(**{field: None}).only("pk", field)
+            last_pk = 0
+            while True:
+                rows = list(images.filter(pk__gt=last_pk).order_by("pk")[:chunk_size])
+                if not rows:
+                    break
+                for ok in pool.map(generate, [getattr(row, field) for row in rows]):
+                    processed += ok
+                    errors += not ok
+                last_pk = rows[-1].pk
+
+    duration = time.monotonic() - started
+    logger.info(
+        "Image derivative backfill processed %s images, %s errors (%.3fs)",
+        processed, errors, duration,
+        extra={"processed": processed, "errors": errors, "duration": duration},
+    )
+    return {"processed": processed, "errors": errors, "duration": duration}
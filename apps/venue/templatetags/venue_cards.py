@@ -0,0 +1,15 @@
+from django import template
+
+from apps.venue.services.fragments import render_cached
+
+register = template.Library()
+
+
+@register.simple_tag
+def cached_cards(template_name, objs):
+    """
+    ``{% cached_cards 'venue/includes/venue_card.html' venues as cards %}``
+    renders one card per object through the fragment cache; loop over
+    ``cards`` and output each one as it is.
+    """
+    return render_cached(template_name, objs)
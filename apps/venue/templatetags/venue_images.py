@@ -0,0 +1,44 @@
+from django import template
+
+from apps.venue.services.images import derivative_name, get_derivatives, schedule_derivatives
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_srcset(field_file, extension=None):
+    """
+    ``srcset`` value listing the resized variants of an uploaded image plus
+    the original, e.g. ``{% image_srcset venue.thumbnail_image "webp" %}``.
+    Empty (and derivatives are scheduled) until the image has been processed.
+    """
+    manifest = get_derivatives(field_file)
+    if manifest is None:
+        schedule_derivatives(field_file)
+        return ""
+    if not manifest["widths"]:
+        return ""
+
+    storage = field_file.storage
+    extension = extension or manifest["extension"]
+    candidates = [
+        f"{storage.url(derivative_name(field_file.name, width, extension))} {width}w"
+        for width in manifest["widths"]
+    ]
+    if extension == manifest["extension"]:
+        candidates.append(f"{field_file.url} {manifest['width']}w")
+    return ", ".join(candidates)
+
+
+@register.inclusion_tag("venue/includes/responsive_image.html")
+def responsive_image(field_file, alt="", css_class="", sizes="100vw", loading="lazy"):
+    """An ``<img>`` (wrapped in ``<picture>`` with a WebP source once derivatives exist)."""
+    return {
+        "image": field_file,
+        "srcset": image_srcset(field_file),
+        "webp_srcset": image_srcset(field_file, "webp"),
+        "alt": alt,
+        "css_class": css_class,
+        "sizes": sizes,
+        "loading": loading,
+    }
@@ -1,3 +1,1240 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from apps.venue.constants import BookingStatus, FoodType
+from apps.venue.models import BookingModel, City, KhaltiTransaction, Price, VenueDailyStats, VenueImages, VenueModel, \
+    VenueRatingModel
+from apps.venue.services import khalti
+from apps.venue.services.availability import parse_availability_range
+from apps.venue.services.cities import get_city_directory_version
+from apps.venue.services.khalti import KhaltiClient, KhaltiError, KhaltiUnavailable
+from apps.venue.services.payments import KhaltiStatus, apply_lookup
+from apps.venue.services.ratings import rate_venue, rebuild_venue_ratings
+from apps.venue.services import fragments
+from apps.venue.services.images import schedule_derivatives
+from apps.venue.services.rollups import rebuild_venue_stats
+from apps.venue.tasks import reconcile_payments, release_expired_holds, update_booking_statuses
+
+User = get_user_model()
+
 
 # Create your tests here.
+class ConcurrentBookingTest(TransactionTestCase):
+    """
+    Many clients race for the same venue and dates through BookingView; the
+    partial unique constraint must leave exactly one ongoing or held booking per date.
+    """
+    clients_count = 8
+    dates_count = 5
+
+    def setUp(self):
+        self.venue = VenueModel.objects.create(name="Stress Hall", capacity=500, lat=27.7, lng=85.3)
+        Price.objects.create(venue=self.venue, price=1000, type=FoodType.VEG.value)
+        self.users = [
+            User.objects.create_user(username=f"stress{i}", email=f"stress{i}@example.com", password="pass")
+            for i in range(self.clients_count)
+        ]
+
+    def test_concurrent_bookings_never_double_book(self):
+        url = reverse("venue:booking", args=[self.venue.id])
+        today = timezone.now().date()
+        dates = [today + timedelta(days=offset) for offset in range(1, self.dates_count + 1)]
+        barrier = threading.Barrier(self.clients_count, timeout=30)
+        statuses = []
+        lock = threading.Lock()
+
+        # Log in up front so the threads only race on the bookings themselves
+        clients = []
+        for user in self.users:
+            client = Client()
+            client.force_login(user)
+            clients.append((client, user))
+
+        def book_all_dates(client, user):
+            try:
+                barrier.wait()
+                for booked_for in dates:
+                    response = client.post(url, data=json.dumps({
+                        "venue": self.venue.id,
+                        "user": user.id,
+                        "total_people": 100,
+                        "meal_type": FoodType.VEG.value,
+                        "booked_for": booked_for.isoformat(),
+                    }), content_type="application/json")
+                    with lock:
+                        statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book_all_dates, args=args) for args in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+            self.assertFalse(thread.is_alive(), "booking thread did not finish")
+
+        self.assertEqual(len(statuses), self.clients_count * self.dates_count)
+        self.assertTrue(set(statuses) <= {201, 400, 409}, statuses)
+        self.assertEqual(statuses.count(201), self.dates_count)
+        for booked_for in dates:
+            blocking = BookingModel.objects.filter(
+                venue=self.venue, booked_for=booked_for, status__in=[BookingStatus.ONGOING, BookingStatus.HOLD]
+            ).count()
+            self.assertEqual(blocking, 1, f"{blocking} blocking bookings for {booked_for}")
+
+
+class BookingHoldTest(TestCase):
+    def setUp(self):
+        self.venue = VenueModel.objects.create(name="Hold Hall", capacity=100, lat=27.7, lng=85.3)
+        Price.objects.create(venue=self.venue, price=500, type=FoodType.VEG.value)
+        self.user = User.objects.create_user(username="holder", email="holder@example.com", password="pass")
+        self.client.force_login(self.user)
+        self.url = reverse("venue:booking", args=[self.venue.id])
+        self.booked_for = timezone.now().date() + timedelta(days=10)
+
+    def book(self):
+        return self.client.post(self.url, data=json.dumps({
+            "venue": self.venue.id,
+            "user": self.user.id,
+            "total_people": 10,
+            "meal_type": FoodType.VEG.value,
+            "booked_for": self.booked_for.isoformat(),
+        }), content_type="application/json")
+
+    def test_client_cannot_set_owner_status_or_payment(self):
+        other = User.objects.create_user(username="victim", email="victim@example.com", password="pass")
+        response = self.client.post(self.url, data=json.dumps({
+            "venue": self.venue.id,
+            "user": other.id,
+            "total_people": 10,
+            "meal_type": FoodType.VEG.value,
+            "booked_for": self.booked_for.isoformat(),
+            "is_paid": "on",
+            "status": BookingStatus.ONGOING,
+            "total_amount": "1",
+        }), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+        booking = BookingModel.objects.get()
+        self.assertEqual((booking.user, booking.status, booking.is_paid), (self.user, BookingStatus.HOLD, False))
+        self.assertEqual(booking.total_amount, 10 * 500)
+
+    def test_active_hold_blocks_date(self):
+        self.assertEqual(self.book().status_code, 201)
+        self.assertEqual(BookingModel.objects.get().status, BookingStatus.HOLD)
+        self.assertEqual(self.book().status_code, 400)
+
+    def test_expired_hold_frees_date(self):
+        self.assertEqual(self.book().status_code, 201)
+        BookingModel.objects.update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(self.book().status_code, 201)
+        statuses = sorted(BookingModel.objects.values_list("status", flat=True))
+        self.assertEqual(statuses, [BookingStatus.EXPIRED, BookingStatus.HOLD])
+
+    def test_release_expired_holds(self):
+        self.book()
+        BookingModel.objects.update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+
+        result = release_expired_holds()
+        self.assertEqual(result["released"], 1)
+        self.assertEqual(BookingModel.objects.get().status, BookingStatus.EXPIRED)
+
+
+class BookingPriceSnapshotTest(TestCase):
+    def setUp(self):
+        self.venue = VenueModel.objects.create(name="Snapshot Hall", capacity=100, lat=27.7, lng=85.3)
+        self.veg = Price.objects.create(venue=self.venue, price=500, type=FoodType.VEG.value)
+        Price.objects.create(venue=self.venue, price=800, type=FoodType.NON_VEG.value)
+        self.user = User.objects.create_user(username="snapper", email="snapper@example.com", password="pass")
+        self.booking = BookingModel.objects.create(
+            venue=self.venue, user=self.user, total_people=4, meal_type=FoodType.VEG.value,
+            booked_for=timezone.now().date() + timedelta(days=5),
+        )
+
+    def test_snapshot_follows_unpaid_changes_but_not_price_edits(self):
+        self.assertEqual((self.booking.unit_price, self.booking.total_amount), (500, 2000))
+
+        self.veg.price = 650
+        self.veg.save()
+        booking = BookingModel.objects.get(pk=self.booking.pk)
+        booking.total_people = 6
+        booking.save()
+        self.assertEqual((booking.unit_price, booking.total_amount), (500, 3000))
+
+        booking.meal_type = FoodType.NON_VEG.value
+        booking.save()
+        booking.refresh_from_db()
+        self.assertEqual((booking.unit_price, booking.total_amount), (800, 4800))
+
+    def test_paid_bookings_keep_their_total(self):
+        booking = BookingModel.objects.get(pk=self.booking.pk)
+        booking.is_paid = True
+        booking.save()
+        booking.total_people = 10
+        booking.meal_type = FoodType.NON_VEG.value
+        booking.save()
+        booking.refresh_from_db()
+        self.assertEqual((booking.unit_price, booking.total_amount), (500, 2000))
+
+    def test_payment_is_initiated_for_the_current_total_in_paisa(self):
+        booking = BookingModel.objects.get(pk=self.booking.pk)
+        booking.total_people = 5
+        booking.save()
+        self.client.force_login(self.user)
+
+        for name in ("_client", "_breaker", "_stats"):
+            self.addCleanup(setattr, khalti, name, None)
+        with KhaltiStub() as stub, override_settings(KHALTI_BASE_URL=stub.url):
+            response = self.client.get(reverse("venue:pay-booking", args=[booking.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stub.requests[0]["body"]["amount"], str(5 * 500 * 100))
+
+
+class BookingStatusSweepTest(TestCase):
+    def setUp(self):
+        self.venue = VenueModel.objects.create(name="Sweep Hall", capacity=100, lat=27.7, lng=85.3)
+        self.user = User.objects.create_user(username="sweeper", email="sweeper@example.com", password="pass")
+        today = timezone.now().date()
+        # bulk_create skips BookingModel.save(), which would complete past dates itself
+        self.past = BookingModel.objects.bulk_create([
+            BookingModel(venue=self.venue, user=self.user, booked_for=today - timedelta(days=offset),
+                         status=BookingStatus.ONGOING)
+            for offset in range(1, 8)
+        ])
+        self.others = BookingModel.objects.bulk_create([
+            BookingModel(venue=self.venue, user=self.user, booked_for=today, status=BookingStatus.ONGOING),
+            BookingModel(venue=self.venue, user=self.user, booked_for=today + timedelta(days=5),
+                         status=BookingStatus.ONGOING),
+            BookingModel(venue=self.venue, user=self.user, booked_for=today - timedelta(days=2),
+                         status=BookingStatus.CANCELLED),
+        ])
+
+    def test_sweep_completes_every_past_booking_in_chunks(self):
+        result = update_booking_statuses(chunk_size=3)
+
+        self.assertEqual((result["updated"], result["chunks"]), (7, 3))
+        statuses = dict(BookingModel.objects.values_list("id", "status"))
+        self.assertEqual({statuses[booking.id] for booking in self.past}, {BookingStatus.COMPLETED})
+        self.assertEqual(
+            [statuses[booking.id] for booking in self.others],
+            [BookingStatus.ONGOING, BookingStatus.ONGOING, BookingStatus.CANCELLED],
+        )
+        self.assertEqual(update_booking_statuses(chunk_size=3)["updated"], 0)
+
+
+class BulkBookingTest(TestCase):
+    def setUp(self):
+        self.venue = VenueModel.objects.create(name="Corporate Hall", capacity=200, lat=27.7, lng=85.3)
+        Price.objects.create(venue=self.venue, price=800, type=FoodType.VEG.value)
+        self.user = User.objects.create_user(username="corp", email="corp@example.com", password="pass")
+        self.client.force_login(self.user)
+        self.url = reverse("venue:bulk-booking", args=[self.venue.id])
+        self.start = timezone.now().date() + timedelta(days=20)
+        BookingModel.objects.create(
+            venue=self.venue, user=self.user, total_people=10, booked_for=self.start + timedelta(days=1)
+        )
+
+    def book(self, **payload):
+        payload = {"total_people": 50, "meal_type": FoodType.VEG.value, **payload}
+        return self.client.post(self.url, data=json.dumps(payload), content_type="application/json")
+
+    def test_all_or_nothing_rejects_when_any_date_taken(self):
+        response = self.book(start=self.start.isoformat(), end=(self.start + timedelta(days=2)).isoformat())
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(BookingModel.objects.count(), 1)
+
+    def test_partial_books_free_dates(self):
+        dates = [(self.start + timedelta(days=offset)).isoformat() for offset in range(3)]
+        response = self.book(dates=dates, partial=True)
+        self.assertEqual(response.status_code, 201)
+
+        results = {result["date"]: result for result in response.json()["results"]}
+        self.assertEqual(results[dates[0]]["status"], "created")
+        self.assertEqual(results[dates[1]]["status"], "booked")
+        self.assertEqual(results[dates[2]]["status"], "created")
+
+        booking = BookingModel.objects.get(id=results[dates[0]]["booking_id"])
+        self.assertEqual(booking.status, BookingStatus.HOLD)
+        self.assertEqual(booking.total_amount, 50 * 800)
+
+    def test_capacity_is_validated(self):
+        response = self.book(dates=[self.start.isoformat()], total_people=500)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("total_people", response.json()["errors"])
+
+
+class SlugTest(TestCase):
+    def test_next_free_suffix_is_used(self):
+        self.assertEqual(City.objects.create(name="Pokhara").slug, "pokhara")
+        self.assertEqual(City.objects.create(name="Pokhara").slug, "pokhara-1")
+        City.objects.create(name="Pokhara Lakeside")
+        City.objects.create(name="Pokhara 7")
+        self.assertEqual(City.objects.create(name="Pokhara").slug, "pokhara-8")
+
+    def stale_first_lookup(self):
+        # The first lookup misses the rows another worker just inserted
+        real = City.next_free_suffixes
+        calls = []
+
+        def lookup(base_slugs):
+            base_slugs = list(base_slugs)
+            calls.append(base_slugs)
+            return {base: 0 for base in base_slugs} if len(calls) == 1 else real(base_slugs)
+
+        return mock.patch.object(City, "next_free_suffixes", side_effect=lookup), calls
+
+    def test_save_retries_when_the_slug_is_taken_concurrently(self):
+        City.objects.create(name="Biratnagar")
+        patch, calls = self.stale_first_lookup()
+        with patch:
+            city = City.objects.create(name="Biratnagar")
+        self.assertEqual(city.slug, "biratnagar-1")
+        self.assertEqual(len(calls), 2)
+
+    def test_bulk_create_allocates_the_batch_in_one_query(self):
+        City.objects.create(name="Dhulikhel")
+        batch = [City(name="Dhulikhel"), City(name="Dhulikhel"), City(name="Banepa"), City(name="Own", slug="own-slug")]
+        # slug lookup, savepoint, INSERT, release
+        with self.assertNumQueries(4):
+            City.bulk_create_with_slugs(batch)
+        self.assertEqual([city.slug for city in batch], ["dhulikhel-1", "dhulikhel-2", "banepa", "own-slug"])
+
+    def test_bulk_create_retries_when_a_slug_is_taken_concurrently(self):
+        City.objects.create(name="Janakpur")
+        patch, calls = self.stale_first_lookup()
+        with patch:
+            batch = City.bulk_create_with_slugs([City(name="Janakpur"), City(name="Janakpur")])
+        self.assertEqual([city.slug for city in batch], ["janakpur-1", "janakpur-2"])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(City.objects.filter(slug__startswith="janakpur").count(), 3)
+
+
+class VenueAvailabilityTest(TestCase):
+    def setUp(self):
+        # Version and payload keys from earlier tests would otherwise answer for this venue id
+        cache.clear()
+        self.venue = VenueModel.objects.create(name="Calendar Hall", capacity=100, lat=27.7, lng=85.3)
+        Price.objects.create(venue=self.venue, price=500, type=FoodType.VEG.value)
+        self.user = User.objects.create_user(username="planner", email="planner@example.com", password="pass")
+        self.url = reverse("venue:venue-availability", args=[self.venue.id])
+        self.booked_for = timezone.now().date() + timedelta(days=3)
+        self.params = {"start": self.booked_for.isoformat(), "end": (self.booked_for + timedelta(days=1)).isoformat()}
+
+    def statuses(self, response):
+        return [day["status"] for day in response.json()["days"]]
+
+    def test_range_parsing(self):
+        today = date(2024, 2, 10)
+        self.assertEqual(parse_availability_range({}, today=today), (date(2024, 2, 1), date(2024, 2, 29)))
+        self.assertEqual(
+            parse_availability_range({"start": "2024-03-01", "end": "2024-03-05"}, today=today),
+            (date(2024, 3, 1), date(2024, 3, 5)),
+        )
+        for params in ({"start": "2024-03-01"}, {"start": "2024-13-01", "end": "2024-13-02"},
+                       {"start": "2024-03-05", "end": "2024-03-01"}, {"month": "March"}):
+            with self.assertRaises(ValueError):
+                parse_availability_range(params, today=today)
+        with self.assertRaisesMessage(ValueError, "7 days"):
+            parse_availability_range({"start": "2024-03-01", "end": "2024-03-08"}, today=today, max_days=7)
+
+        response = self.client.get(self.url, {"start": "2024-03-01", "end": "not-a-date"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_availability_answers_304(self):
+        first = self.client.get(self.url, self.params)
+        self.assertEqual(self.statuses(first), ["available", "available"])
+
+        second = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 304)
+
+    def test_booking_changes_the_version_after_commit(self):
+        first = self.client.get(self.url, self.params)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                BookingModel.objects.create(
+                    venue=self.venue, user=self.user, total_people=10, booked_for=self.booked_for
+                )
+                pending = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=first["ETag"])
+                self.assertEqual(pending.status_code, 304)
+
+        second = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(self.statuses(second), ["booked", "available"])
+
+
+class KhaltiStub:
+    """
+    Local HTTP server standing in for the Khalti ePayment API. ``responses``
+    is a list of (status, body) popped per request (the last one repeats),
+    unless ``responder`` is given, which maps a request body to (status, body);
+    ``delay`` sleeps before answering.
+    """
+
+    def __init__(self, responses=None, delay=0, responder=None):
+        self.responses = list(responses or [(200, {"pidx": "stub-pidx", "payment_url": "https://pay.example/stub"})])
+        self.delay = delay
+        self.responder = responder
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request_body = json.loads(self.rfile.read(length) or b"{}")
+                stub.requests.append({
+                    "path": self.path,
+                    "client_port": self.client_address[1],
+                    "body": request_body,
+                })
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if stub.responder:
+                    status, body = stub.responder(request_body)
+                else:
+                    status, body = stub.responses.pop(0) if len(stub.responses) > 1 else stub.responses[0]
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/v2/"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class KhaltiClientTest(TestCase):
+    def make_client(self, stub, **kwargs):
+        options = {"read_timeout": 1, "backoff_factor": 0, "failure_threshold": 2, "reset_timeout": 60, **kwargs}
+        return KhaltiClient(stub.url, "test-key", **options)
+
+    def test_initiate_reuses_pooled_connection(self):
+        with KhaltiStub() as stub:
+            client = self.make_client(stub)
+            self.assertEqual(client.initiate({"amount": 1000})["pidx"], "stub-pidx")
+            client.initiate({"amount": 1000})
+
+        self.assertEqual(stub.requests[0]["path"], "/api/v2/epayment/initiate/")
+        self.assertEqual(stub.requests[0]["client_port"], stub.requests[1]["client_port"])
+        self.assertEqual(client.stats.snapshot()["epayment/initiate/"]["calls"], 2)
+
+    def test_retries_gateway_errors(self):
+        with KhaltiStub(responses=[(503, {}), (200, {"pidx": "after-retry"})]) as stub:
+            client = self.make_client(stub)
+            self.assertEqual(client.lookup("abc")["pidx"], "after-retry")
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_initiate_is_not_resent_on_gateway_errors(self):
+        # A 503 may still have created the payment; resending would make a second pidx
+        with KhaltiStub(responses=[(503, {}), (200, {"pidx": "duplicate"})]) as stub:
+            client = self.make_client(stub)
+            with self.assertRaises(KhaltiError):
+                client.initiate({"amount": 1000})
+        self.assertEqual(len(stub.requests), 1)
+
+    async def test_async_initiate_is_not_resent_on_gateway_errors(self):
+        with KhaltiStub(responses=[(503, {}), (200, {"pidx": "duplicate"})]) as stub:
+            client = khalti.AsyncKhaltiClient(stub.url, "test-key", backoff_factor=0, failure_threshold=2)
+            try:
+                with self.assertRaises(KhaltiError):
+                    await client.initiate({"amount": 1000})
+                self.assertEqual((await client.lookup("abc"))["pidx"], "duplicate")
+            finally:
+                await client.aclose()
+        self.assertEqual([request["path"] for request in stub.requests], [
+            "/api/v2/epayment/initiate/", "/api/v2/epayment/lookup/",
+        ])
+
+    def half_open_breaker(self):
+        breaker = khalti.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, khalti.CircuitBreaker.HALF_OPEN)
+        return breaker
+
+    async def test_cancelled_trial_frees_the_half_open_slot(self):
+        breaker = self.half_open_breaker()
+        with KhaltiStub(delay=1) as stub:
+            client = khalti.AsyncKhaltiClient(stub.url, "test-key", breaker=breaker)
+            try:
+                # A client disconnect cancels the view's task mid-call
+                task = asyncio.ensure_future(client.lookup("abc"))
+                while not stub.requests:
+                    await asyncio.sleep(0.01)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+            finally:
+                await client.aclose()
+        self.assertTrue(breaker.allow())
+
+    def test_unexpected_error_frees_the_half_open_slot(self):
+        breaker = self.half_open_breaker()
+        client = KhaltiClient("http://127.0.0.1:1/", "test-key", breaker=breaker)
+        with mock.patch.object(client.session, "post", side_effect=RuntimeError("bug")):
+            with self.assertRaises(RuntimeError):
+                client.lookup("abc")
+        self.assertTrue(breaker.allow())
+
+    def test_read_timeout_is_bounded(self):
+        with KhaltiStub(delay=1.5) as stub:
+            client = self.make_client(stub, read_timeout=0.2)
+            started = time.perf_counter()
+            with self.assertRaises(KhaltiError):
+                client.initiate({})
+            self.assertLess(time.perf_counter() - started, 1.0)
+
+    def test_circuit_breaker_opens_after_failures(self):
+        with KhaltiStub(responses=[(500, {})]) as stub:
+            client = self.make_client(stub, max_retries=0)
+            for _ in range(2):
+                with self.assertRaises(KhaltiError):
+                    client.initiate({})
+            with self.assertRaises(KhaltiUnavailable):
+                client.initiate({})
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_pay_booking_view_uses_client(self):
+        venue = VenueModel.objects.create(name="Pay Hall", capacity=100, lat=27.7, lng=85.3)
+        Price.objects.create(venue=venue, price=500, type=FoodType.VEG.value)
+        user = User.objects.create_user(username="payer", email="payer@example.com", password="pass")
+        booking = BookingModel.objects.create(
+            venue=venue, user=user, total_people=4, meal_type=FoodType.VEG.value,
+            booked_for=timezone.now().date() + timedelta(days=5)
+        )
+        self.client.force_login(user)
+
+        with KhaltiStub() as stub:
+            khalti._client = self.make_client(stub)
+            try:
+                response = self.client.get(reverse("venue:pay-booking", args=[booking.id]))
+            finally:
+                khalti._client = None
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["payment_url"], "https://pay.example/stub")
+        self.assertEqual(stub.requests[0]["body"]["amount"], "200000")
+
+        # Initiating a payment records it but does not mark the booking paid
+        booking.refresh_from_db()
+        self.assertFalse(booking.is_paid)
+        self.assertEqual(KhaltiTransaction.objects.get(pidx="stub-pidx").status, KhaltiStatus.INITIATED)
+
+
+class AsyncPaymentViewTest(TestCase):
+    """
+    Concurrent payment initiations against a slow Khalti stub: the async view
+    should overlap the outbound calls instead of serialising them.
+    """
+    concurrency = 20
+    delay = 0.3
+
+    def setUp(self):
+        self.venue = VenueModel.objects.create(name="Async Hall", capacity=100, lat=27.7, lng=85.3)
+        Price.objects.create(venue=self.venue, price=500, type=FoodType.VEG.value)
+        self.user = User.objects.create_user(username="asyncpayer", email="asyncpayer@example.com", password="pass")
+        today = timezone.now().date()
+        self.bookings = [
+            BookingModel.objects.create(
+                venue=self.venue, user=self.user, total_people=4, meal_type=FoodType.VEG.value,
+                booked_for=today + timedelta(days=offset)
+            )
+            for offset in range(1, self.concurrency + 1)
+        ]
+        # The breaker and stats are process-wide; start every test with fresh ones
+        for name in ("_client", "_breaker", "_stats"):
+            self.addCleanup(setattr, khalti, name, None)
+
+    async def test_concurrent_initiations_overlap(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+
+        with KhaltiStub(delay=self.delay) as stub, override_settings(KHALTI_BASE_URL=stub.url):
+            khalti._async_clients.clear()
+            try:
+                started = time.perf_counter()
+                responses = await asyncio.gather(*(
+                    client.get(reverse("venue:pay-booking-async", args=[booking.id])) for booking in self.bookings
+                ))
+                elapsed = time.perf_counter() - started
+            finally:
+                await khalti.get_async_khalti_client().aclose()
+                khalti._async_clients.clear()
+
+        self.assertEqual([response.status_code for response in responses], [200] * self.concurrency)
+        self.assertEqual(len(stub.requests), self.concurrency)
+        serial = self.concurrency * self.delay
+        self.assertLess(elapsed, serial / 2)
+
+    async def test_success_view_verifies_with_lookup(self):
+        booking = self.bookings[0]
+        await KhaltiTransaction.objects.acreate(
+            booking=booking, user=self.user, pidx="p-1", status=KhaltiStatus.INITIATED,
+            total_amount=booking.total_amount, purchase_order_id=booking.id, purchase_order_name=f"Booking-{booking.id}",
+        )
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        lookup = {"pidx": "p-1", "status": "Completed", "transaction_id": "t-1", "total_amount": 200000}
+
+        with KhaltiStub(responses=[(200, lookup)]) as stub, override_settings(KHALTI_BASE_URL=stub.url):
+            khalti._async_clients.clear()
+            try:
+                # The query string claims nothing; the lookup response decides
+                response = await client.get(reverse("venue:payment-success-async"), {
+                    "pidx": "p-1", "purchase_order_id": booking.id, "status": "User canceled",
+                })
+            finally:
+                await khalti.get_async_khalti_client().aclose()
+                khalti._async_clients.clear()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stub.requests[0]["path"], "/api/v2/epayment/lookup/")
+        await booking.arefresh_from_db()
+        self.assertEqual(booking.status, BookingStatus.ONGOING)
+        self.assertTrue(booking.is_paid)
+
+
+    def test_wsgi_requests_close_their_client(self):
+        created = []
+
+        class RecordingClient(khalti.AsyncKhaltiClient):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                created.append(self)
+
+        self.client.force_login(self.user)
+        with KhaltiStub() as stub, override_settings(KHALTI_BASE_URL=stub.url), \
+                mock.patch.object(khalti, "AsyncKhaltiClient", RecordingClient):
+            khalti._async_clients.clear()
+            for booking in self.bookings[:2]:
+                response = self.client.get(reverse("venue:pay-booking-async", args=[booking.id]))
+                self.assertEqual(response.status_code, 200)
+
+        # Each WSGI request ran on its own loop: its client was closed, not cached
+        self.assertEqual(len(created), 2)
+        self.assertTrue(all(client.session.is_closed for client in created))
+        self.assertEqual(len(khalti._async_clients), 0)
+        self.assertIs(created[0].breaker, created[1].breaker)
+        self.assertIs(created[0].stats, khalti.get_khalti_client().stats)
+        self.assertEqual(khalti.get_khalti_client().stats.snapshot()["epayment/initiate/"]["calls"], 2)
+
+    def test_breaker_is_shared_with_sync_client(self):
+        breaker = khalti.get_khalti_client().breaker
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        self.client.force_login(self.user)
+        with KhaltiStub() as stub, override_settings(KHALTI_BASE_URL=stub.url):
+            response = self.client.get(reverse("venue:pay-booking-async", args=[self.bookings[0].id]))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(stub.requests, [])
+
+
+class PaymentReconciliationTest(TestCase):
+    def setUp(self):
+        self.venue = VenueModel.objects.create(name="Ledger Hall", capacity=100, lat=27.7, lng=85.3)
+        Price.objects.create(venue=self.venue, price=500, type=FoodType.VEG.value)
+        self.user = User.objects.create_user(username="ledger", email="ledger@example.com", password="pass")
+        today = timezone.now().date()
+        self.outcomes = {}
+        for offset, outcome in enumerate(["Completed", "Completed", "Pending", "User canceled", "Expired"], start=1):
+            booking = BookingModel.objects.create(
+                venue=self.venue, user=self.user, total_people=4, meal_type=FoodType.VEG.value,
+                booked_for=today + timedelta(days=offset), status=BookingStatus.HOLD,
+                hold_expires_at=timezone.now() + timedelta(minutes=5),
+            )
+            KhaltiTransaction.objects.create(
+                booking=booking, user=self.user, pidx=f"pidx-{offset}", status=KhaltiStatus.INITIATED,
+                total_amount=booking.total_amount, purchase_order_id=booking.id, purchase_order_name=f"Booking-{booking.id}",
+            )
+            self.outcomes[f"pidx-{offset}"] = outcome
+
+    def respond(self, body):
+        pidx = body["pidx"]
+        if pidx not in self.outcomes:
+            return 404, {"detail": "Not found."}
+        return 200, {"pidx": pidx, "status": self.outcomes[pidx], "transaction_id": f"txn-{pidx}", "total_amount": 200000}
+
+    def reconcile(self, stub, **kwargs):
+        client = KhaltiClient(stub.url, "test-key", read_timeout=2, backoff_factor=0, failure_threshold=100)
+        return reconcile_payments(client=client, **kwargs)
+
+    def test_reconciles_in_chunks_with_bounded_concurrency(self):
+        with KhaltiStub(responder=self.respond, delay=0.2) as stub:
+            started = time.perf_counter()
+            result = self.reconcile(stub, chunk_size=2, concurrency=2)
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(result["checked"], 5)
+        self.assertEqual(result["verified"], 5)
+        self.assertEqual(result["completed"], 2)
+        # Three chunks of at most two parallel lookups: three rounds, not five
+        self.assertLess(elapsed, 5 * 0.2)
+
+        statuses = dict(KhaltiTransaction.objects.values_list("pidx", "status"))
+        self.assertEqual(statuses, self.outcomes)
+        paid = BookingModel.objects.filter(is_paid=True)
+        self.assertEqual(paid.count(), 2)
+        self.assertTrue(all(booking.status == BookingStatus.ONGOING for booking in paid))
+        self.assertFalse(KhaltiTransaction.objects.filter(verified_at__isnull=True).exists())
+
+    def test_rerun_only_revisits_open_payments(self):
+        with KhaltiStub(responder=self.respond) as stub:
+            self.reconcile(stub)
+            self.outcomes["pidx-3"] = "Completed"
+            result = self.reconcile(stub)
+
+        self.assertEqual(result["checked"], 1)
+        self.assertEqual(result["completed"], 1)
+        self.assertEqual(BookingModel.objects.filter(is_paid=True).count(), 3)
+
+    def test_hold_lost_during_reconciliation_is_flagged(self):
+        lost = KhaltiTransaction.objects.get(pidx="pidx-1").booking
+        other = User.objects.create_user(username="rebooker", email="rebooker@example.com", password="pass")
+        real_atomic = transaction.atomic
+        raced = []
+
+        def racing_atomic(*args, **kwargs):
+            # Right after the bookings were read: the hold is swept and its date booked by someone else
+            if not raced:
+                raced.append(True)
+                BookingModel.objects.filter(pk=lost.pk).update(status=BookingStatus.EXPIRED)
+                BookingModel.objects.create(
+                    venue=self.venue, user=other, total_people=4, meal_type=FoodType.VEG.value,
+                    booked_for=lost.booked_for, status=BookingStatus.ONGOING,
+                )
+            return real_atomic(*args, **kwargs)
+
+        with KhaltiStub(responder=self.respond) as stub:
+            with mock.patch.object(transaction, "atomic", side_effect=racing_atomic):
+                result = self.reconcile(stub)
+
+        self.assertEqual((result["completed"], result["conflicts"]), (2, 1))
+        flagged = KhaltiTransaction.objects.get(pidx="pidx-1")
+        self.assertTrue(flagged.needs_review)
+        self.assertEqual(flagged.status, KhaltiStatus.COMPLETED)
+        lost.refresh_from_db()
+        self.assertEqual((lost.status, lost.is_paid), (BookingStatus.EXPIRED, True))
+        settled = KhaltiTransaction.objects.get(pidx="pidx-2")
+        self.assertFalse(settled.needs_review)
+        self.assertEqual(settled.booking.status, BookingStatus.ONGOING)
+
+    def test_lookup_errors_leave_transaction_unverified(self):
+        del self.outcomes["pidx-5"]
+        with KhaltiStub(responder=self.respond) as stub:
+            result = self.reconcile(stub)
+
+        self.assertEqual(result["errors"], 1)
+        self.assertEqual(KhaltiTransaction.objects.get(pidx="pidx-5").status, KhaltiStatus.INITIATED)
+
+    def test_success_redirect_is_verified_and_idempotent(self):
+        booking = KhaltiTransaction.objects.get(pidx="pidx-4").booking
+        self.client.force_login(self.user)
+        params = {"pidx": "pidx-4", "purchase_order_id": booking.id, "status": "Completed", "transaction_id": "forged"}
+
+        with KhaltiStub(responder=self.respond) as stub, override_settings(KHALTI_BASE_URL=stub.url):
+            khalti._client = None
+            try:
+                for _ in range(2):
+                    self.assertEqual(self.client.get(reverse("venue:payment-success"), params).status_code, 200)
+            finally:
+                khalti._client = None
+
+        transaction = KhaltiTransaction.objects.get(pidx="pidx-4")
+        self.assertEqual(transaction.status, "User canceled")
+        self.assertEqual(transaction.transaction_id, "txn-pidx-4")
+        booking.refresh_from_db()
+        self.assertFalse(booking.is_paid)
+        self.assertEqual(KhaltiTransaction.objects.filter(booking=booking).count(), 1)
+
+    def success_redirect(self, params):
+        self.client.force_login(self.user)
+        with KhaltiStub(responder=self.respond) as stub, override_settings(KHALTI_BASE_URL=stub.url):
+            khalti._client = None
+            try:
+                self.assertEqual(self.client.get(reverse("venue:payment-success"), params).status_code, 200)
+            finally:
+                khalti._client = None
+
+    def test_completed_payment_for_the_wrong_amount_is_flagged(self):
+        transaction = KhaltiTransaction.objects.get(pidx="pidx-1")
+        BookingModel.objects.filter(pk=transaction.booking_id).update(total_amount=5000)
+
+        with self.assertLogs("apps.venue.services.payments", "ERROR"):
+            self.success_redirect({"pidx": "pidx-1", "purchase_order_id": transaction.booking_id})
+
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, KhaltiStatus.COMPLETED)
+        self.assertTrue(transaction.needs_review)
+        self.assertFalse(transaction.booking.is_paid)
+        self.assertEqual(transaction.booking.status, BookingStatus.HOLD)
+
+        # Reconciliation leaves flagged rows alone
+        with KhaltiStub(responder=self.respond) as stub:
+            result = self.reconcile(stub)
+        self.assertNotIn("pidx-1", [request["body"]["pidx"] for request in stub.requests])
+        self.assertEqual(result["completed"], 1)
+        self.assertFalse(BookingModel.objects.get(pk=transaction.booking_id).is_paid)
+
+    def test_reconciliation_flags_wrong_amounts(self):
+        transaction = KhaltiTransaction.objects.get(pidx="pidx-2")
+        BookingModel.objects.filter(pk=transaction.booking_id).update(total_amount=5000)
+        with KhaltiStub(responder=self.respond) as stub, self.assertLogs("apps.venue.tasks", "ERROR"):
+            result = self.reconcile(stub)
+
+        self.assertEqual((result["completed"], result["flagged"]), (1, 1))
+        transaction.refresh_from_db()
+        self.assertTrue(transaction.needs_review)
+        self.assertFalse(transaction.booking.is_paid)
+
+    def test_unknown_pidx_does_not_trust_the_redirect_booking(self):
+        # Someone else's booking, named only in the query string
+        other = BookingModel.objects.filter(status=BookingStatus.HOLD).last()
+        self.outcomes["pidx-unknown"] = "Completed"
+
+        with self.assertLogs("apps.venue.services.payments", "WARNING"):
+            self.success_redirect({"pidx": "pidx-unknown", "purchase_order_id": other.id})
+
+        transaction = KhaltiTransaction.objects.get(pidx="pidx-unknown")
+        self.assertTrue(transaction.needs_review)
+        other.refresh_from_db()
+        self.assertFalse(other.is_paid)
+        self.assertEqual(other.status, BookingStatus.HOLD)
+
+        # A booking id that doesn't exist records nothing
+        self.success_redirect({"pidx": "pidx-other", "purchase_order_id": 999999})
+        self.assertFalse(KhaltiTransaction.objects.filter(pidx="pidx-other").exists())
+
+
+class VendorStatsTest(TestCase):
+    def setUp(self):
+        self.vendor = User.objects.create_user(username="vendor", email="vendor@example.com", password="pass")
+        self.vendor.groups.add(Group.objects.create(name="Vendors"))
+        self.customer = User.objects.create_user(username="guest", email="guest@example.com", password="pass")
+        self.venue = VenueModel.objects.create(name="Rollup Hall", capacity=100, lat=27.7, lng=85.3, owner=self.vendor)
+        Price.objects.create(venue=self.venue, price=500, type=FoodType.VEG.value)
+        self.day = timezone.now().date() + timedelta(days=3)
+        self.client.force_login(self.vendor)
+
+    def book(self, day, **kwargs):
+        return BookingModel.objects.create(
+            venue=self.venue, user=self.customer, total_people=40, meal_type=FoodType.VEG.value,
+            booked_for=day, **kwargs
+        )
+
+    def stats(self, **params):
+        params.setdefault("month", self.day.strftime("%Y-%m"))
+        return self.client.get(reverse("venue:vendor-stats"), params).json()["data"]
+
+    def test_rollups_follow_booking_and_payment_changes(self):
+        booking = self.book(self.day, status=BookingStatus.HOLD, hold_expires_at=timezone.now() + timedelta(minutes=5))
+        self.assertFalse(VenueDailyStats.objects.exists())
+
+        payment = KhaltiTransaction.objects.create(
+            booking=booking, user=self.customer, pidx="roll-1", status=KhaltiStatus.INITIATED,
+            total_amount=booking.total_amount, purchase_order_id=booking.id, purchase_order_name="Booking",
+        )
+        # Revenue counts on the day the payment completed, not the day it was started
+        started = timezone.now() - timedelta(days=2)
+        KhaltiTransaction.objects.filter(pk=payment.pk).update(created_at=started)
+        payment.refresh_from_db()
+        apply_lookup(payment, {"status": KhaltiStatus.COMPLETED, "total_amount": 2000000}).save()
+        confirm = BookingModel.objects.get(pk=booking.pk)
+        confirm.status = BookingStatus.ONGOING
+        confirm.save()
+
+        row = VenueDailyStats.objects.get(venue=self.venue, date=self.day)
+        self.assertEqual((row.bookings, row.guests), (1, 40))
+        revenue_day = VenueDailyStats.objects.get(venue=self.venue, date=timezone.localdate())
+        self.assertEqual(revenue_day.revenue, 40 * 500)
+        self.assertFalse(VenueDailyStats.objects.filter(date=timezone.localdate(started)).exists())
+        rebuild_venue_stats()
+        self.assertEqual(VenueDailyStats.objects.get(date=timezone.localdate()).revenue, 40 * 500)
+
+        confirm.status = BookingStatus.CANCELLED
+        confirm.save()
+        self.assertFalse(VenueDailyStats.objects.filter(date=self.day).exists())
+
+    def test_saves_only_refresh_rollups_they_change(self):
+        booking = BookingModel.objects.get(pk=self.book(self.day).pk)
+        # The previous cell comes from the loaded instance: just the UPDATE
+        booking.is_paid = True
+        with self.assertNumQueries(1):
+            booking.save()
+
+        booking.total_people = 60
+        booking.save()
+        self.assertEqual(VenueDailyStats.objects.get(date=self.day).guests, 60)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        for offset in range(5):
+            self.book(self.day + timedelta(days=offset))
+        incremental = sorted(VenueDailyStats.objects.values_list("date", "bookings", "guests", "revenue"))
+
+        self.assertEqual(rebuild_venue_stats(), 5)
+        self.assertEqual(sorted(VenueDailyStats.objects.values_list("date", "bookings", "guests", "revenue")), incremental)
+
+    def test_endpoint_reads_rollups_in_constant_queries(self):
+        self.book(self.day)
+        start = self.day.replace(day=1)
+        # session, user, groups, venues, rollup rows
+        with self.assertNumQueries(5) as small:
+            data = self.stats()
+        self.assertEqual(data["venues"][0]["bookings"], 1)
+        self.assertEqual(data["venues"][0]["booked_days"], 1)
+
+        # Years of history outside the requested month must not change the work done
+        past = self.day - timedelta(days=400)
+        BookingModel.objects.bulk_create([
+            BookingModel(venue=self.venue, user=self.customer, total_people=10, booked_for=past + timedelta(days=i),
+                         status=BookingStatus.COMPLETED, meal_type=FoodType.VEG.value)
+            for i in range(300)
+        ])
+        rebuild_venue_stats()
+        with self.assertNumQueries(len(small.captured_queries)):
+            data = self.stats()
+        self.assertEqual(data["venues"][0]["bookings"], 1)
+        self.assertEqual(data["start"], start.isoformat())
+
+    def test_non_vendors_are_refused(self):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse("venue:vendor-stats"))
+        self.assertEqual(response.status_code, 302)
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        fragments.fragment_cache().clear()
+        fragments.stats.reset()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city = City.objects.create(name="Chitwan")
+            self.venues = [
+                VenueModel.objects.create(name=f"Card Hall {i}", capacity=100, lat=27.7, lng=85.3, city=self.city)
+                for i in range(4)
+            ]
+            for venue in self.venues:
+                Price.objects.create(venue=venue, price=700, type=FoodType.VEG.value)
+
+    def test_list_pages_reuse_cached_cards(self):
+        self.client.get(reverse("home:index"))
+        self.assertEqual(fragments.stats.snapshot()["hits"], 0)
+
+        response = self.client.get(reverse("home:index"))
+        self.assertContains(response, "Card Hall 3")
+        self.assertEqual(fragments.stats.snapshot()["hits"], 5)
+        self.assertEqual(fragments.stats.snapshot()["hit_rate"], 0.5)
+
+    def test_price_change_rerenders_only_that_card(self):
+        url = reverse("home:search")
+        self.client.get(url)
+        Price.objects.filter(venue=self.venues[0]).update(price=900)
+        with self.captureOnCommitCallbacks(execute=True):
+            Price.objects.get(venue=self.venues[0]).save()
+        fragments.stats.reset()
+
+        response = self.client.get(url)
+        self.assertContains(response, "Rs. 900")
+        self.assertEqual(fragments.stats.snapshot(), {"hits": 3, "misses": 1, "hit_rate": 0.75})
+
+    def test_moving_a_venue_refreshes_both_city_cards(self):
+        other = City.objects.create(name="Butwal")
+        fragments.render_cached("venue/includes/city_card.html", [self.city, other])
+        venue = self.venues[0]
+        venue.city = other
+        with self.captureOnCommitCallbacks(execute=True):
+            venue.save()
+        fragments.stats.reset()
+
+        fragments.render_cached("venue/includes/city_card.html", [self.city, other])
+        self.assertEqual(fragments.stats.snapshot()["misses"], 2)
+
+    def test_renaming_a_city_refreshes_its_venue_cards(self):
+        url = reverse("home:search")
+        self.client.get(url)
+        self.city.name = "Bharatpur"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.save()
+        fragments.stats.reset()
+
+        response = self.client.get(url)
+        self.assertNotContains(response, "Chitwan")
+        self.assertEqual(fragments.stats.snapshot()["misses"], 4)
+
+    def test_card_is_kept_until_the_change_commits(self):
+        url = reverse("home:search")
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Price.objects.filter(venue=self.venues[0]).update(price=900)
+                Price.objects.get(venue=self.venues[0]).save()
+                fragments.stats.reset()
+                self.client.get(url)
+                self.assertEqual(fragments.stats.snapshot()["misses"], 0)
+
+        fragments.stats.reset()
+        self.assertContains(self.client.get(url), "Rs. 900")
+        self.assertEqual(fragments.stats.snapshot()["misses"], 1)
+
+
+class ConditionalPageTest(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city = City.objects.create(name="Dharan")
+            self.venue = VenueModel.objects.create(name="Etag Hall", capacity=100, lat=26.8, lng=87.3, city=self.city)
+            Price.objects.create(venue=self.venue, price=600, type=FoodType.VEG.value)
+        self.url = reverse("venue:venue-detail", args=[self.venue.slug])
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_venue_answers_304_without_recommendations(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("Last-Modified", first)
+
+        with mock.patch("apps.venue.views.get_location_based_recommendations") as recommend:
+            second = self.revalidate(self.url, first)
+        self.assertEqual(second.status_code, 304)
+        recommend.assert_not_called()
+
+    def test_price_change_modifies_venue_and_city_pages(self):
+        venue_page = self.client.get(self.url)
+        city_url = reverse("venue:city-detail", args=[self.city.slug])
+        city_page = self.client.get(city_url)
+        self.assertEqual(self.revalidate(city_url, city_page).status_code, 304)
+
+        # Timestamps have one-second resolution in Last-Modified; the ETag does not
+        price = Price.objects.get(venue=self.venue)
+        price.price = 650
+        with self.captureOnCommitCallbacks(execute=True):
+            price.save()
+
+        self.assertEqual(self.revalidate(self.url, venue_page).status_code, 200)
+        self.assertEqual(self.revalidate(city_url, city_page).status_code, 200)
+
+    def test_city_page_ignores_venue_changes_in_other_cities(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            other = City.objects.create(name="Itahari")
+            venue = VenueModel.objects.create(name="Elsewhere Hall", capacity=50, lat=26.6, lng=87.2, city=other)
+        url = reverse("venue:city-detail", args=[self.city.slug])
+        first = self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Price.objects.create(venue=venue, price=700, type=FoodType.VEG.value)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        # The sidebar shows the other cities' names
+        other.name = "Itahari Sub-Metropolis"
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_cities_page_changes_with_any_venue(self):
+        url = reverse("venue:cities")
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            VenueModel.objects.create(name="New Hall", capacity=50, lat=26.8, lng=87.3, city=self.city)
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_city_directory_moves_on_only_after_commit(self):
+        version = get_city_directory_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                VenueModel.objects.create(name="Pending Hall", capacity=50, lat=26.8, lng=87.3, city=self.city)
+                self.assertEqual(get_city_directory_version(), version)
+        self.assertNotEqual(get_city_directory_version(), version)
+
+    def test_etag_is_per_viewer(self):
+        first = self.client.get(self.url)
+        user = User.objects.create_user(username="viewer", email="viewer@example.com", password="pass")
+        self.client.force_login(user)
+        self.assertEqual(self.revalidate(self.url, first).status_code, 200)
+
+
+class LocationCookieTest(TestCase):
+    url = "/api/store-location/"
+
+    def store(self, lat, lng):
+        return self.client.post(self.url, data=json.dumps({"lat": lat, "lng": lng}), content_type="application/json")
+
+    def test_anonymous_location_never_creates_a_session(self):
+        from django.contrib.sessions.models import Session
+
+        response = self.store(27.7172, 85.3240)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("user_location", response.cookies)
+        self.assertEqual(Session.objects.count(), 0)
+
+        # Within the tolerance: nothing is rewritten
+        response = self.store(27.7175, 85.3238)
+        self.assertNotIn("user_location", response.cookies)
+
+        response = self.store(27.80, 85.40)
+        self.assertIn("user_location", response.cookies)
+        self.assertEqual(Session.objects.count(), 0)
+
+    def test_venue_page_reads_location_from_cookie(self):
+        city = City.objects.create(name="Lalitpur")
+        venue = VenueModel.objects.create(name="Nearby Hall", capacity=100, lat=27.7, lng=85.3, city=city)
+        url = reverse("venue:venue-detail", args=[venue.slug])
+
+        response = self.client.get(url, {"lat": "27.7", "lng": "85.3"})
+        self.assertIn("user_location", response.cookies)
+        response = self.client.get(url)
+        self.assertTrue(response.context["user_has_location"])
+
+    def test_tampered_cookie_is_ignored(self):
+        city = City.objects.create(name="Bhaktapur")
+        venue = VenueModel.objects.create(name="Far Hall", capacity=100, lat=27.7, lng=85.3, city=city)
+        self.client.cookies["user_location"] = "27.7,85.3"
+        response = self.client.get(reverse("venue:venue-detail", args=[venue.slug]))
+        self.assertFalse(response.context["user_has_location"])
+
+
+class ImageDerivativeTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVES_ASYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+
+    def upload(self, width=1600, height=900):
+        buffer = BytesIO()
+        Image.new("RGB", (width, height), "teal").save(buffer, "JPEG")
+        return SimpleUploadedFile("hall.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+    def render(self, venue):
+        return Template("{% load venue_images %}{% responsive_image venue.thumbnail_image alt='Hall' %}").render(
+            Context({"venue": venue})
+        )
+
+    def test_upload_generates_resized_and_webp_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            venue = VenueModel.objects.create(name="Photo Hall", capacity=100, lat=27.7, lng=85.3, thumbnail_image=self.upload())
+
+        stem = os.path.splitext(venue.thumbnail_image.path)[0]
+        for width in (320, 640, 1024):
+            for extension in ("jpg", "webp"):
+                self.assertTrue(os.path.exists(f"{stem}-{width}w.{extension}"))
+        with Image.open(f"{stem}-640w.webp") as derivative:
+            self.assertEqual(derivative.size, (640, 360))
+
+        html = self.render(venue)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn("-320w.webp 320w", html)
+        self.assertIn(f"{venue.thumbnail_image.url} 1600w", html)
+
+    def test_small_images_are_not_upscaled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            venue = VenueModel.objects.create(name="Tiny Hall", capacity=100, lat=27.7, lng=85.3, thumbnail_image=self.upload(500, 300))
+
+        stem = os.path.splitext(venue.thumbnail_image.path)[0]
+        self.assertTrue(os.path.exists(f"{stem}-320w.webp"))
+        self.assertFalse(os.path.exists(f"{stem}-640w.jpg"))
+
+    def test_backfill_processes_existing_media(self):
+        venue = VenueModel.objects.create(name="Old Hall", capacity=100, lat=27.7, lng=85.3, thumbnail_image=self.upload())
+        self.assertEqual(self.render(venue).count("srcset"), 0)
+
+        call_command("generate_image_derivatives", workers=2, stdout=StringIO())
+
+        self.assertTrue(os.path.exists(os.path.splitext(venue.thumbnail_image.path)[0] + "-1024w.webp"))
+        self.assertIn("srcset", self.render(venue))
+
+    def test_finished_derivatives_refresh_the_owning_venue(self):
+        city = City.objects.create(name="Pokhara")
+        venue = VenueModel.objects.create(name="Gallery Hall", capacity=100, lat=27.7, lng=85.3, city=city)
+        image = VenueImages.objects.create(venue=venue, image=self.upload())
+        venue_updated = VenueModel.objects.get(pk=venue.pk).updated_at
+        city_updated = City.objects.get(pk=city.pk).updated_at
+        version = fragments.get_fragment_versions([venue])[venue.pk]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_derivatives(image.image)
+
+        # The card and the detail/city pages' validators must change so the srcset gets served
+        self.assertNotEqual(fragments.get_fragment_versions([venue])[venue.pk], version)
+        self.assertGreater(VenueModel.objects.get(pk=venue.pk).updated_at, venue_updated)
+        self.assertGreater(City.objects.get(pk=city.pk).updated_at, city_updated)
+
+
+class VenueRatingAggregateTest(TestCase):
+    def setUp(self):
+        self.venue = VenueModel.objects.create(name="Rated Hall", capacity=100, lat=27.7, lng=85.3)
+        self.users = [
+            User.objects.create_user(username=f"rater{i}", email=f"rater{i}@example.com", password="pass")
+            for i in range(3)
+        ]
+
+    def aggregate(self):
+        self.venue.refresh_from_db()
+        return self.venue.rating_sum, self.venue.rating_count
+
+    def test_rate_rerate_and_delete(self):
+        rate_venue(self.users[0], self.venue.id, 4)
+        rate_venue(self.users[1], self.venue.id, 2)
+        self.assertEqual(self.aggregate(), (6, 2))
+        self.assertEqual(self.venue.get_rating, 3)
+
+        rate_venue(self.users[0], self.venue.id, 5)
+        self.assertEqual(self.aggregate(), (7, 2))
+
+        VenueRatingModel.objects.get(user=self.users[1]).delete()
+        self.assertEqual(self.aggregate(), (5, 1))
+
+    def test_orm_writes_and_null_ratings(self):
+        # Ratings written outside rate_venue (admin, shell) keep the aggregate too
+        rating = VenueRatingModel.objects.create(user=self.users[0], venue=self.venue, rating=3)
+        VenueRatingModel.objects.create(user=self.users[1], venue=self.venue, rating=None)
+        self.assertEqual(self.aggregate(), (3, 1))
+
+        rating.rating = 1
+        rating.save()
+        self.assertEqual(self.aggregate(), (1, 1))
+
+        rating.rating = None
+        rating.save()
+        self.assertEqual(self.aggregate(), (0, 0))
+        self.assertEqual(self.venue.get_rating, 0)
+
+        self.assertEqual(rebuild_venue_ratings(), 1)
+        self.assertEqual(self.aggregate(), (0, 0))
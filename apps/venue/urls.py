@@ -1,13 +1,19 @@
 from django.urls import path
-from .views import CityDetail, VenueDetail, CityView, BookingView, CancelBookingView, PayBookingView, PaymentSuccessView, store_user_location
+from .views import CityDetail, VenueDetail, CityView, BookingView, BulkBookingView, CancelBookingView, PayBookingView, PaymentSuccessView, store_user_location, \
+    venue_availability, pay_booking_async, payment_success_async, VendorStatsView
 
 app_name = "venue"
 urlpatterns = [
     path('city/<slug:slug>/', CityDetail.as_view(), name='city-detail'),
     path('cities/', CityView.as_view(), name='cities'),
+    path('vendor/stats/', VendorStatsView.as_view(), name='vendor-stats'),
+    path('<int:venue_id>/availability/', venue_availability, name='venue-availability'),
     path('<slug:slug>/', VenueDetail.as_view(), name='venue-detail'),
     path('booking/<int:venue_id>/', BookingView.as_view(), name='booking'),
+    path('booking/<int:venue_id>/bulk/', BulkBookingView.as_view(), name='bulk-booking'),
     path('cancel-booking', CancelBookingView.as_view(), name='cancel-booking'),
     path('pay-booking/<int:id>/', PayBookingView.as_view(), name='pay-booking'),
     path('payment/sucess/', PaymentSuccessView.as_view(), name='payment-success'),
+    path('pay-booking/<int:id>/async/', pay_booking_async, name='pay-booking-async'),
+    path('payment/success/async/', payment_success_async, name='payment-success-async'),
 ]
\ No newline at end of file
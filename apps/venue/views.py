@@ -1,25 +1,80 @@
-import os
-
-import requests
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.handlers.asgi import ASGIRequest
 from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, quote_etag
+from django.utils.http import http_date
 from django.views import View
 from django.views.generic import DetailView, TemplateView
 from apps.venue.services.recommendation import recommend_venues
+from apps.venue.services.availability import availability_etag, bump_availability_version, get_venue_availability, \
+    parse_availability_range
+from apps.venue.services.bookings import BookingConflict, BulkBookingResult, create_booking, create_bulk_bookings
+from apps.venue.services.cities import get_city_directory, get_city_directory_version
+from apps.venue.services.location import get_user_location, remember_user_location
+from apps.venue.services.payments import record_initiation, record_payment
+from apps.venue.services.rollups import vendor_stats
+from apps.users.mixins import VendorPermissionMixin
+from apps.venue.services.khalti import KhaltiError, KhaltiUnavailable, async_khalti_client, \
+    get_khalti_client
 
 from apps.venue.constants import VenueBookingStatus, BookingStatus
-from apps.venue.forms import BookingForm
-from apps.venue.models import City, VenueModel, BookingModel, KhaltiTransaction
+from apps.venue.forms import BookingForm, BulkBookingForm
+from apps.venue.models import City, VenueModel, BookingModel
+import hashlib
 import json
 import logging
+import time
 from .utils import get_location_based_recommendations
+from core import metrics
 
 logger = logging.getLogger(__name__)
 
 # Create your views here.
-class CityDetail(DetailView):
+class ConditionalPageMixin:
+    """
+    Answers conditional GETs for an HTML page with 304 before any context is
+    built. ``page_state()`` returns ``(version_parts, last_modified)`` from a
+    cheap lookup, or None to always render. The ETag also covers who is
+    looking (user, stored location) and the release, since the page shows them.
+    """
+
+    def page_state(self):
+        return None
+
+    def page_etag(self, parts):
+        viewer = (self.request.user.pk, *get_user_location(self.request))
+        raw = "|".join(str(part) for part in (settings.RELEASE_VERSION, *parts, *viewer))
+        return quote_etag(hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest())
+
+    def dispatch(self, request, *args, **kwargs):
+        state = self.page_state() if request.method in ('GET', 'HEAD') else None
+        if state is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        parts, last_modified = state
+        etag = self.page_etag(parts)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.headers['ETag'] = etag
+            if last_modified:
+                response.headers['Last-Modified'] = http_date(last_modified)
+
+        # Always revalidate; the ETag makes that a cheap 304
+        patch_cache_control(response, no_cache=True, private=request.user.is_authenticated)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+
+class CityDetail(ConditionalPageMixin, DetailView):
     model = City
     context_object_name = 'city'
     template_name = 'venue/city_detail.html'
@@ -29,7 +84,7 @@ class CityDetail(DetailView):
 
         slug = self.kwargs.get('slug')
         city = get_object_or_404(City.objects.prefetch_related("venues"), slug=slug)
-        other_cities = City.objects.exclude(slug=slug)
+        other_cities = get_city_directory().exclude(slug)
         context.update({
             'city': city,
             'other_cities': other_cities,
@@ -37,8 +92,19 @@ class CityDetail(DetailView):
 
         return context
 
+    def page_state(self):
+        # updated_at moves with the city's venues (and their prices, images, ratings);
+        # the sidebar only shows the other cities' names and images, so edits elsewhere
+        # leave this page's validators alone
+        directory = get_city_directory()
+        city = directory.get(self.kwargs.get('slug'))
+        if city is None:
+            return None
+        other_cities = tuple((other.slug, other.name, other.image.name) for other in directory.exclude(city.slug))
+        return (city.id, city.updated_at.timestamp(), city.venue_count, other_cities), city.updated_at
 
-class VenueDetail(DetailView):
+
+class VenueDetail(ConditionalPageMixin, DetailView):
     model = VenueModel
     context_object_name = 'venue'
     template_name = 'venue/venue_detail.html'
@@ -48,9 +114,8 @@ class VenueDetail(DetailView):
         slug = self.kwargs.get('slug')
         venue = get_object_or_404(VenueModel.objects.prefetch_related("images", "prices"), slug=slug)
 
-        # Get user location from session or cookies (if stored from frontend)
-        user_lat = self.request.session.get('user_lat')
-        user_lng = self.request.session.get('user_lng')
+        # Get user location from the location cookie (set by store_user_location)
+        user_lat, user_lng = get_user_location(self.request)
         
         # Alternative: get from request parameters (if passed from frontend)
         if not user_lat or not user_lng:
@@ -61,13 +126,13 @@ class VenueDetail(DetailView):
                 try:
                     user_lat = float(user_lat)
                     user_lng = float(user_lng)
-                    # Store in session for future requests
-                    self.request.session['user_lat'] = user_lat
-                    self.request.session['user_lng'] = user_lng
+                    # Remembered in the location cookie by render_to_response
+                    self.query_location = (user_lat, user_lng)
                 except (ValueError, TypeError):
                     user_lat = None
                     user_lng = None
 
+        started = time.perf_counter()
         try:
             # Get location-based recommendations
             recommendations = get_location_based_recommendations(
@@ -77,16 +142,21 @@ class VenueDetail(DetailView):
                 n_recommendations=5,
                 max_distance_km=15
             )
-            print("Recommended")
+            metrics.RECOMMENDATION_LATENCY.labels("knn").observe(time.perf_counter() - started)
+            logger.debug("KNN recommendations for %s", venue.slug, extra={"venue": venue.id})
         except Exception as e:
-            logger.error(f"KNN recommendation error: {e}")
+            metrics.RECOMMENDATION_LATENCY.labels("fallback").observe(time.perf_counter() - started)
+            metrics.RECOMMENDATION_FALLBACKS.labels(type(e).__name__).inc()
+            logger.warning(
+                "KNN recommendation failed for %s, using same-city venues: %s", venue.slug, e,
+                extra={"venue": venue.id, "reason": type(e).__name__},
+            )
             # Fallback: just same city venues
             recommendations = {
                 "similar": VenueModel.objects.filter(city=venue.city).exclude(slug=slug)[:5],
                 "same_location": VenueModel.objects.filter(city=venue.city).exclude(slug=slug)[:5],
                 "price_match": VenueModel.objects.filter(city=venue.city).exclude(slug=slug)[:5],
             }
-            print("Default")
 
         context.update({
             'venue': venue,
@@ -97,12 +167,38 @@ class VenueDetail(DetailView):
         })
         return context
 
-class CityView(TemplateView):
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        location = getattr(self, 'query_location', None)
+        if location:
+            remember_user_location(self.request, response, *location)
+        return response
+
+    def page_state(self):
+        # A location passed in the query string gets stored in the location cookie by get_context_data
+        if self.request.GET.get('lat') and self.request.GET.get('lng'):
+            return None
+        row = VenueModel.objects.filter(slug=self.kwargs.get('slug')).values_list(
+            'id', 'updated_at', 'city__updated_at'
+        ).first()
+        if row is None:
+            return None
+        venue_id, updated_at, city_updated_at = row
+        # Similar venues come from the same city, whose updated_at moves with them
+        last_modified = max(filter(None, (updated_at, city_updated_at)))
+        return (venue_id, last_modified.timestamp(), get_city_directory_version()), last_modified
+
+class CityView(ConditionalPageMixin, TemplateView):
     template_name = 'venue/cities.html'
 
+    def page_state(self):
+        directory = get_city_directory()
+        last_modified = max((city.updated_at for city in directory), default=None)
+        return (directory.version, last_modified and last_modified.timestamp()), last_modified
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        cities = City.objects.all()
+        cities = get_city_directory().cities
         context.update({
             'cities': cities,
         })
@@ -124,14 +220,23 @@ class BookingView(LoginRequiredMixin, View):
 
     def post(self, request, *args, **kwargs):
         data = json.loads(request.body) if request.body else {}
-        booking_form = BookingForm(data)
+        # Who booked and whether it is paid never come from the request; create_booking() starts it as a hold
+        booking = BookingModel(user=request.user, is_paid=False, status=BookingStatus.HOLD)
+        booking_form = BookingForm(data, instance=booking)
 
         if booking_form.is_valid():
-            booking = booking_form.save()
+            try:
+                booking = create_booking(booking_form)
+            except BookingConflict as e:
+                return JsonResponse({
+                    'success': False,
+                    'errors': {'booked_for': [str(e)]}
+                }, status=409)
 
             return JsonResponse({
                 'success': True,
                 'booking_id': booking.id,
+                'hold_expires_at': booking.hold_expires_at,
                 'message': 'Booking created successfully'
             }, status=201)
         else:
@@ -144,6 +249,47 @@ class BookingView(LoginRequiredMixin, View):
             }, status=400)
 
 
+class BulkBookingView(BookingView):
+    """
+    Book one venue for several dates in a single transaction. ``partial``
+    selects whether free dates are booked when others are taken, or the
+    whole request is rejected.
+    """
+
+    def post(self, request, *args, **kwargs):
+        venue = get_object_or_404(VenueModel, id=kwargs.get('venue_id'))
+        try:
+            data = json.loads(request.body) if request.body else {}
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'errors': {'__all__': ['Invalid JSON data']}}, status=400)
+
+        form = BulkBookingForm(data, venue=venue)
+        if not form.is_valid():
+            return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+
+        try:
+            results = create_bulk_bookings(
+                venue,
+                request.user,
+                form.cleaned_data['booking_dates'],
+                form.cleaned_data['total_people'],
+                form.cleaned_data['meal_type'],
+                partial=form.cleaned_data['partial'],
+            )
+        except BookingConflict as e:
+            return JsonResponse({'success': False, 'errors': {'dates': [str(e)]}}, status=409)
+
+        created = [result for result in results if result['status'] == BulkBookingResult.CREATED]
+        if created:
+            bump_availability_version(venue.id)
+
+        return JsonResponse({
+            'success': bool(created),
+            'created': len(created),
+            'results': results,
+        }, status=201 if created else 409)
+
+
 class CancelBookingView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
         booking_id = request.GET.get('id')
@@ -160,6 +306,22 @@ class CancelBookingView(LoginRequiredMixin, View):
             return JsonResponse({'success': False, 'message': 'Booking not found'}, status=404)
 
 
+def khalti_initiate_payload(request, user, booking, return_url_name):
+    return {
+        "return_url": request.build_absolute_uri(reverse(return_url_name)),
+        "website_url": request.build_absolute_uri('/'),
+        # Khalti expects the amount in paisa
+        "amount": f"{int(booking.total_amount * 100)}",
+        "purchase_order_id": f"{booking.id}",
+        "purchase_order_name": f"Booking-{booking.id}",
+        "customer_info": {
+            "name": user.username or "Ram Bahaadur",
+            "email": user.email or "test@khalti.com",
+            "phone": user.phone or "9800000001"
+        }
+    }
+
+
 class PayBookingView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
         booking_id = kwargs.get('id')
@@ -169,32 +331,23 @@ class PayBookingView(LoginRequiredMixin, View):
 
         try:
             booking = BookingModel.objects.get(id=booking_id)
-            booking.is_paid = True
-            booking.save()
-
-            url = "https://dev.khalti.com/api/v2/epayment/initiate/"
-
-            payload = json.dumps({
-                "return_url": f"http://localhost:8000{reverse('venue:payment-success')}",
-                "website_url": "http://localhost:8000/",
-                "amount": "1000",
-                "purchase_order_id": f"{booking.id}",
-                "purchase_order_name": f"Booking-{booking.id}",
-                "customer_info": {
-                    "name": request.user.username or "Ram Bahaadur",
-                    "email": request.user.email or "test@khalti.com",
-                    "phone": request.user.phone or "9800000001"
-                }
-            })
-
-            headers = {
-                'Authorization': f'key {os.getenv("KHALTI_LIVE_SECRET_KEY")}',
-                'Content-Type': 'application/json',
-            }
-
-            response = requests.request("POST", url, headers=headers, data=payload)
+            if booking.total_amount is None:
+                return JsonResponse({'success': False, 'message': 'Booking has no payable amount'}, status=400)
+
+            payload = khalti_initiate_payload(request, request.user, booking, 'venue:payment-success')
+
+            try:
+                data = get_khalti_client().initiate(payload)
+            except KhaltiUnavailable as e:
+                return JsonResponse({'success': False, 'message': str(e)}, status=503)
+            except KhaltiError as e:
+                logger.error(
+                    "Khalti initiate failed for booking %s: %s", booking.id, e, extra={"booking_id": booking.id}
+                )
+                return JsonResponse({'success': False, 'message': 'Payment gateway error'}, status=502)
 
-            data = response.json()
+            # The booking is only marked paid once Khalti confirms the payment
+            record_initiation(booking, request.user, payload, data)
             return JsonResponse({'success': True, 'data': data})
         except BookingModel.DoesNotExist:
             return JsonResponse({'success': False, 'message': 'Booking not found'}, status=404)
@@ -205,38 +358,118 @@ class PaymentSuccessView(LoginRequiredMixin, TemplateView):
     def get(self, request, *args, **kwargs):
         context = super().get_context_data(**kwargs)
         pidx = request.GET.get('pidx')
-        if pidx:
-            transaction_id = request.GET.get('transaction_id')
-            if not KhaltiTransaction.objects.filter(transaction_id=transaction_id).exists():
-                tidx = request.GET.get('tidx')
-                txn_id = request.GET.get('txnId')
-                total_amount = request.GET.get('total_amount')
-                status = request.GET.get('status')
-                purchase_order_id = request.GET.get('purchase_order_id')
-                purchase_order_name = request.GET.get('purchase_order_name')
-
-                KhaltiTransaction.objects.create(
-                    booking_id=purchase_order_id,
-                    user=request.user,
-                    transaction_id=transaction_id,
-                    pidx=pidx,
-                    tidx=tidx,
-                    txn_id=txn_id,
-                    total_amount=total_amount,
-                    status=status,
-                    purchase_order_id=purchase_order_id,
-                    purchase_order_name=purchase_order_name,
+        purchase_order_id = request.GET.get('purchase_order_id')
+        if pidx and purchase_order_id:
+            try:
+                lookup = get_khalti_client().lookup(pidx)
+            except KhaltiError as e:
+                # Left unverified; reconcile_payments settles it later
+                logger.warning("Khalti lookup failed for %s: %s", pidx, e, extra={"pidx": pidx})
+                lookup = None
+
+            transaction, conflict = record_payment(pidx, lookup, purchase_order_id, request.user, request.GET)
+            if conflict:
+                logger.warning(
+                    "Paid booking %s lost its date after the hold expired", transaction.booking_id,
+                    extra={"pidx": pidx, "booking_id": transaction.booking_id},
                 )
         return self.render_to_response(context)
 
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, require_GET
 from django.views.decorators.csrf import ensure_csrf_cookie 
 
+
+@login_required
+async def pay_booking_async(request, id):
+    """
+    Async PayBookingView: the Khalti call is awaited on a shared httpx client,
+    so one ASGI worker can have many payment initiations in flight at once.
+    Under WSGI each request runs on its own short-lived event loop, so a
+    client is opened and closed per request there and nothing is gained
+    over PayBookingView; serve these views with ASGI.
+    """
+    booking = await BookingModel.objects.filter(id=id).afirst()
+    if booking is None:
+        return JsonResponse({'success': False, 'message': 'Booking not found'}, status=404)
+    if booking.total_amount is None:
+        return JsonResponse({'success': False, 'message': 'Booking has no payable amount'}, status=400)
+
+    user = await request.auser()
+    payload = khalti_initiate_payload(request, user, booking, 'venue:payment-success-async')
+    try:
+        async with async_khalti_client(shared=isinstance(request, ASGIRequest)) as client:
+            data = await client.initiate(payload)
+    except KhaltiUnavailable as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=503)
+    except KhaltiError as e:
+        logger.error("Khalti initiate failed for booking %s: %s", booking.id, e, extra={"booking_id": booking.id})
+        return JsonResponse({'success': False, 'message': 'Payment gateway error'}, status=502)
+
+    await sync_to_async(record_initiation)(booking, user, payload, data)
+    return JsonResponse({'success': True, 'data': data})
+
+
+@login_required
+async def payment_success_async(request):
+    """
+    Async PaymentSuccessView. The payment status comes from Khalti's lookup
+    API rather than the redirect's query string; if the lookup fails the
+    transaction is kept unverified and the booking is left on hold. Like
+    pay_booking_async, only worth it under ASGI.
+    """
+    pidx = request.GET.get('pidx')
+    purchase_order_id = request.GET.get('purchase_order_id')
+    if pidx and purchase_order_id:
+        try:
+            async with async_khalti_client(shared=isinstance(request, ASGIRequest)) as client:
+                lookup = await client.lookup(pidx)
+        except KhaltiError as e:
+            logger.warning("Khalti lookup failed for %s: %s", pidx, e, extra={"pidx": pidx})
+            lookup = None
+
+        user = await request.auser()
+        transaction, conflict = await sync_to_async(record_payment)(pidx, lookup, purchase_order_id, user, request.GET)
+        if conflict:
+            logger.warning(
+                "Paid booking %s lost its date after the hold expired", transaction.booking_id,
+                extra={"pidx": pidx, "booking_id": transaction.booking_id},
+            )
+    # Context processors and the base template still touch the ORM synchronously
+    return await sync_to_async(render)(request, 'venue/payment_success.html')
+
+
+@require_GET
+def venue_availability(request, venue_id):
+    """
+    Day-by-day availability (booked / available / past) for a venue, answered
+    with 304 when the client's ETag still matches the venue's booking version.
+    """
+    try:
+        start, end = parse_availability_range(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    etag = quote_etag(availability_etag(venue_id, start, end))
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    etag, payload = get_venue_availability(venue_id, start, end)
+    if payload is None:
+        return JsonResponse({'error': 'Venue not found'}, status=404)
+
+    response = JsonResponse(payload)
+    response['ETag'] = quote_etag(etag)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
 @require_http_methods(["POST"])
 @ensure_csrf_cookie
 def store_user_location(request):
     """
-    Store user's location in session for personalized recommendations
+    Store user's location in a signed cookie for personalized recommendations.
+    Kept out of the session so anonymous visitors don't get a session row.
     """
     try:
         data = json.loads(request.body)
@@ -265,15 +498,7 @@ def store_user_location(request):
                 status=400
             )
         
-        # Store in session
-        request.session['user_lat'] = lat
-        request.session['user_lng'] = lng
-        request.session.modified = True
-
-        print(request.session["user_lat"])
-        print(request.session["user_lng"])
-        
-        return JsonResponse({
+        response = JsonResponse({
             'success': True,
             'message': 'Location stored successfully',
             'location': {
@@ -281,6 +506,8 @@ def store_user_location(request):
                 'lng': lng
             }
         })
+        remember_user_location(request, response, lat, lng)
+        return response
         
     except json.JSONDecodeError:
         return JsonResponse(
@@ -291,4 +518,20 @@ def store_user_location(request):
         return JsonResponse(
             {'error': str(e)},
             status=500
-        )
\ No newline at end of file
+        )
+
+class VendorStatsView(VendorPermissionMixin, View):
+    """
+    Daily bookings, guests, revenue and occupancy for the requesting vendor's
+    venues over ``month`` or ``start``/``end`` (up to a year), read from the
+    VenueDailyStats rollups only.
+    """
+    max_days = 366
+
+    def get(self, request, *args, **kwargs):
+        try:
+            start, end = parse_availability_range(request.GET, max_days=self.max_days)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+        return JsonResponse({'success': True, 'data': vendor_stats(request.user, start, end)})
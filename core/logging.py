@@ -0,0 +1,104 @@
+"""
+Logging helpers wired up by LOGGING in core.settings.base: a request id
+carried in a context variable (so it follows sync_to_async and async views),
+and a queue handler so request threads never wait on log I/O.
+"""
+import atexit
+import copy
+import logging
+import queue
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+# (request id, perf_counter at request start) for the request being served
+_request = ContextVar("request", default=None)
+
+# Incoming X-Request-ID values are reused only if they look like an id
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def begin_request(request_id=None):
+    """Start a request context; returns (request_id, token for end_request)."""
+    if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+        request_id = uuid.uuid4().hex
+    return request_id, _request.set((request_id, time.perf_counter()))
+
+
+def end_request(token):
+    _request.reset(token)
+
+
+def current_request_id():
+    current = _request.get()
+    return current[0] if current else None
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds ``request_id`` and ``elapsed_ms`` (time since the request started) to every record."""
+
+    def filter(self, record):
+        current = _request.get()
+        if current is None:
+            record.request_id = None
+            record.elapsed_ms = None
+        else:
+            record.request_id = current[0]
+            record.elapsed_ms = round((time.perf_counter() - current[1]) * 1000, 2)
+        return True
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than failing to stop when the queue is full
+        self.queue.put(self._sentinel)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to a bounded queue drained by a QueueListener thread that
+    writes them to ``handlers``. When the queue is full the record is
+    dropped (and counted) rather than blocking the request thread.
+
+    Configured from LOGGING with ``"handlers": ["cfg://handlers.<name>"]``;
+    those handlers must sort before this one so dictConfig builds them first.
+    """
+
+    def __init__(self, handlers, queue_size=10000, respect_handler_level=True):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._stopped = False
+        # dictConfig passes a ConvertingList; indexing resolves each cfg:// entry
+        targets = [handlers[index] for index in range(len(handlers))]
+        self.listener = _Listener(self.queue, *targets, respect_handler_level=respect_handler_level)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued records and stop the listener thread (safe to call twice)."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self.listener.stop()
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but the traceback stays a separate field for the JSON formatter
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
@@ -0,0 +1,71 @@
+"""
+Prometheus metrics, exposed at /metrics.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory before
+the workers start: every worker then writes its samples there, /metrics
+aggregates all of them, and gunicorn.conf.py drops a dead worker's files.
+"""
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+REQUEST_LATENCY = Histogram(
+    "venuewise_http_request_duration_seconds", "Time to produce a response, by URL name",
+    ["view", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "venuewise_http_request_db_queries", "Database queries run per request, by URL name",
+    ["view"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float("inf")),
+)
+RECOMMENDATION_LATENCY = Histogram(
+    "venuewise_recommendation_duration_seconds", "Time to build venue recommendations",
+    ["source"],
+)
+RECOMMENDATION_FALLBACKS = Counter(
+    "venuewise_recommendation_fallbacks_total", "Venue pages that fell back to same-city venues",
+    ["reason"],
+)
+CACHE_LOOKUPS = Counter(
+    "venuewise_cache_lookups_total", "Cache lookups by cache and result (hit/miss)",
+    ["cache", "result"],
+)
+BOOKING_ATTEMPTS = Counter(
+    "venuewise_booking_attempts_total", "Booking attempts by kind and outcome (created/conflict)",
+    ["kind", "outcome"],
+)
+PAYMENT_GATEWAY_LATENCY = Histogram(
+    "venuewise_payment_gateway_duration_seconds", "Khalti API call latency",
+    ["endpoint", "outcome"],
+)
+
+
+def record_cache(cache, hits=0, misses=0):
+    if hits:
+        CACHE_LOOKUPS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, "miss").inc(misses)
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition; requires ``Authorization: Bearer <METRICS_TOKEN>``.
+    Fails closed: without a token configured it is only served when
+    METRICS_ALLOW_ANONYMOUS is on.
+    """
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return HttpResponseForbidden()
+    elif not getattr(settings, "METRICS_ALLOW_ANONYMOUS", False):
+        return HttpResponseForbidden()
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,414 @@
+import logging
+import mimetypes
+import os
+import random
+import re
+import time
+import traceback
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from core import metrics
+from core.logging import begin_request, end_request
+
+profiling_logger = logging.getLogger("core.profiling")
+request_logger = logging.getLogger("core.requests")
+
+# Preferred order when the client accepts several
+STATIC_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(request):
+    """Content codings the client accepts (q > 0) from its Accept-Encoding header."""
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serves collected static files from STATIC_ROOT before the URL resolver,
+    picking the precompressed ``.br``/``.gz`` variant written by
+    core.storage.CompressedManifestStaticFilesStorage that the client
+    accepts. Content-hashed names are cached for a year as immutable, the
+    rest for STATIC_UNHASHED_MAX_AGE seconds. Disabled under DEBUG (runserver
+    serves static files itself) or when STATIC_URL points at another host.
+    """
+    # Async-capable so it doesn't push async views onto the sync thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT or not settings.STATIC_URL.startswith("/"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = settings.STATIC_URL
+        self.root = settings.STATIC_ROOT
+        self.hashed_max_age = getattr(settings, "STATIC_HASHED_MAX_AGE", 60 * 60 * 24 * 365)
+        self.unhashed_max_age = getattr(settings, "STATIC_UNHASHED_MAX_AGE", 60)
+        # Per-process lookup of files already found on disk
+        self._files = {}
+        self._hashed_names = None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve_static(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve_static(request) or await self.get_response(request)
+
+    def serve_static(self, request):
+        if request.method in ("GET", "HEAD") and request.path.startswith(self.prefix):
+            return self.serve(request, request.path[len(self.prefix):])
+        return None
+
+    def hashed_names(self):
+        if self._hashed_names is None:
+            self._hashed_names = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+        return self._hashed_names
+
+    def find(self, name):
+        found = self._files.get(name)
+        if found is not None:
+            return found
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not name or not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        content_type, _ = mimetypes.guess_type(name)
+        found = {
+            "path": path,
+            "size": stat.st_size,
+            "mtime": int(stat.st_mtime),
+            "content_type": content_type or "application/octet-stream",
+            "immutable": name in self.hashed_names(),
+            "variants": {
+                coding: (path + suffix, os.path.getsize(path + suffix))
+                for coding, suffix in STATIC_ENCODINGS if os.path.isfile(path + suffix)
+            },
+        }
+        self._files[name] = found
+        return found
+
+    def serve(self, request, name):
+        found = self.find(name)
+        if found is None:
+            return None
+
+        path, size, coding = found["path"], found["size"], None
+        accepted = accepted_encodings(request)
+        for candidate, _ in STATIC_ENCODINGS:
+            if candidate in found["variants"] and candidate in accepted:
+                coding = candidate
+                path, size = found["variants"][candidate]
+                break
+
+        etag = quote_etag(f"{found['mtime']:x}-{size:x}" + (f"-{coding}" if coding else ""))
+        response = get_conditional_response(request, etag=etag, last_modified=found["mtime"])
+        if response is None:
+            if request.method == "HEAD":
+                response = HttpResponse(content_type=found["content_type"])
+            else:
+                response = FileResponse(open(path, "rb"), content_type=found["content_type"])
+            response["Content-Length"] = size
+            if coding:
+                response["Content-Encoding"] = coding
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(found["mtime"])
+        if found["variants"]:
+            response["Vary"] = "Accept-Encoding"
+        if found["immutable"]:
+            response["Cache-Control"] = f"public, max-age={self.hashed_max_age}, immutable"
+        else:
+            response["Cache-Control"] = f"public, max-age={self.unhashed_max_age}"
+        return response
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _view_label(request):
+    # URL names, never raw paths, so 404 probes can't explode label cardinality
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match and match.view_name else "unresolved"
+
+
+class RequestLogMiddleware:
+    """
+    Gives every request an id (a sane incoming X-Request-ID is reused),
+    which core.logging.RequestContextFilter stamps on each log record
+    emitted while serving it. Echoes the id as X-Request-ID and writes one
+    "core.requests" record per request with its status and duration.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.id, token = begin_request(request.headers.get("X-Request-ID"))
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response, started)
+        finally:
+            end_request(token)
+
+    async def __acall__(self, request):
+        request.id, token = begin_request(request.headers.get("X-Request-ID"))
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response, started)
+        finally:
+            end_request(token)
+
+    def finish(self, request, response, started):
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        request_logger.info(
+            "%s %s %s %.1fms", request.method, request.path, response.status_code, duration_ms,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "view": _view_label(request),
+                "status": response.status_code,
+                "duration_ms": duration_ms,
+            },
+        )
+        response["X-Request-ID"] = request.id
+        return response
+
+
+class MetricsMiddleware:
+    """Request latency by URL name, method and status, and queries per request, for /metrics."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        self.observe(request, response, started, counter.count)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        # Async views query from worker threads, where the counter can't see them
+        self.observe(request, response, started, None)
+        return response
+
+    def observe(self, request, response, started, queries):
+        view = _view_label(request)
+        metrics.REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(
+            time.perf_counter() - started
+        )
+        if queries is not None:
+            metrics.REQUEST_QUERIES.labels(view).observe(queries)
+
+
+def sql_fingerprint(sql):
+    """Collapse literals and IN lists so repeats of the same query shape compare equal."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)", "(...)", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _origin_frame():
+    """The innermost stack frame in project code (outside site-packages and this module)."""
+    root = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if frame.filename.startswith(root) and "site-packages" not in frame.filename and frame.filename != __file__:
+            return f"{os.path.relpath(frame.filename, root)}:{frame.lineno} in {frame.name}"
+    return None
+
+
+class RequestProfile:
+    """Queries, SQL time and view/template timings collected for one sampled request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.fingerprints = {}
+        self.view_started = self.view_finished = self.render_finished = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - started
+            fingerprint = sql_fingerprint(sql)
+            seen = self.fingerprints.get(fingerprint)
+            if seen is None:
+                self.fingerprints[fingerprint] = [1, None]
+            else:
+                seen[0] += 1
+                if seen[1] is None:
+                    # Walk the stack only once a query shape repeats
+                    seen[1] = _origin_frame()
+
+    def duplicates(self):
+        return sorted(
+            ({"sql": sql, "count": count, "origin": origin}
+             for sql, (count, origin) in self.fingerprints.items() if count > 1),
+            key=lambda duplicate: -duplicate["count"],
+        )
+
+    def timings(self):
+        """Milliseconds spent in total, in SQL, in the view and rendering its TemplateResponse."""
+        now = time.perf_counter()
+        timings = {"total": now - self.started, "db": self.sql_time}
+        if self.view_started is not None:
+            view_finished = self.view_finished or self.render_finished or now
+            timings["view"] = view_finished - self.view_started
+            if self.view_finished is not None and self.render_finished is not None:
+                timings["template"] = self.render_finished - self.view_finished
+        return {name: round(seconds * 1000, 2) for name, seconds in timings.items()}
+
+
+class RequestProfilingMiddleware:
+    """
+    Profiles a REQUEST_PROFILING_SAMPLE_RATE fraction of requests: query
+    count, total SQL time, repeated query shapes (with the project frame
+    that issued them) and view/template time. Results go out as a
+    "core.profiling" log record, and as a Server-Timing header for staff
+    users or everyone when REQUEST_PROFILING_SERVER_TIMING is on; a query shape
+    repeated REQUEST_PROFILING_N_PLUS_ONE_THRESHOLD times or more is logged
+    as a suspected N+1. Unsampled requests only pay for one random() call.
+
+    Queries run by async views happen on another thread and aren't counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, "REQUEST_PROFILING_SAMPLE_RATE", 0.0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.threshold = getattr(settings, "REQUEST_PROFILING_N_PLUS_ONE_THRESHOLD", 5)
+        self.server_timing = getattr(settings, "REQUEST_PROFILING_SERVER_TIMING", False)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        request.profile = profile = RequestProfile()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(profile))
+            response = self.get_response(request)
+        show_timing = self.server_timing or (hasattr(request, "user") and request.user.is_staff)
+        return self.report(request, response, profile, show_timing)
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        request.profile = profile = RequestProfile()
+        response = await self.get_response(request)
+        show_timing = self.server_timing or (hasattr(request, "auser") and (await request.auser()).is_staff)
+        return self.report(request, response, profile, show_timing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, "profile", None)
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        profile = getattr(request, "profile", None)
+        if profile is not None:
+            profile.view_finished = time.perf_counter()
+
+            def rendered(response):
+                profile.render_finished = time.perf_counter()
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, profile, show_timing):
+        timings = profile.timings()
+        duplicates = profile.duplicates()
+        match = request.resolver_match
+        record = {
+            "path": request.path,
+            "method": request.method,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": profile.queries,
+            "duplicate_queries": sum(duplicate["count"] - 1 for duplicate in duplicates),
+            **{f"{name}_ms": value for name, value in timings.items()},
+        }
+        profiling_logger.info(
+            "%s %s: %s queries in %.1fms, %.1fms total",
+            request.method, request.path, profile.queries, timings["db"], timings["total"], extra=record,
+        )
+
+        suspects = [duplicate for duplicate in duplicates if duplicate["count"] >= self.threshold]
+        if suspects:
+            profiling_logger.warning(
+                "Suspected N+1 on %s: %s ran %s times (%s)",
+                request.path, suspects[0]["sql"][:200], suspects[0]["count"], suspects[0]["origin"],
+                extra={**record, "suspects": suspects},
+            )
+
+        if show_timing:
+            entries = [f'db;dur={timings["db"]};desc="{profile.queries} queries"']
+            entries += [f"{name};dur={timings[name]}" for name in ("view", "template", "total") if name in timings]
+            response["Server-Timing"] = ", ".join(entries)
+        return response
@@ -0,0 +1,6 @@
+"""
+Settings profiles. ``core.settings`` is the development profile, so
+manage.py and existing tooling keep working unchanged; core.wsgi and
+core.asgi default to core.settings.production instead.
+"""
+from core.settings.dev import *  # noqa
@@ -0,0 +1,329 @@
+"""
+Django settings shared by every profile (core.settings.dev,
+core.settings.production).
+
+Generated by 'django-admin startproject' using Django 5.2.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.2/ref/settings/
+"""
+
+from pathlib import Path
+import os
+from dotenv import load_dotenv
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+load_dotenv(os.path.join(BASE_DIR, '.env'))
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'django-insecure-&mgq%u6^^6qh16uhupgvasc%19*g-v4@%2mcv24#@4l(809_9x'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+
+    # All Auth
+    'allauth',
+    'allauth.account',
+
+    # Tailwind
+    'tailwind',
+    'apps.theme',
+
+    'django_crontab',
+
+    # Custom Apps
+    'apps.users',
+    'apps.home',
+    'apps.venue',
+]
+
+
+AUTHENTICATION_BACKENDS = [
+    'django.contrib.auth.backends.ModelBackend',
+    'allauth.account.auth_backends.AuthenticationBackend',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    # Collected, precompressed static files (inactive under DEBUG)
+    'core.middleware.StaticFilesMiddleware',
+    # Request ids on every log record, one access record per request
+    'core.middleware.RequestLogMiddleware',
+    # Prometheus request latency and query counts (core.metrics)
+    'core.middleware.MetricsMiddleware',
+    # Query counts, SQL/view/template time and N+1 warnings for sampled requests
+    'core.middleware.RequestProfilingMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+
+    # Allauth
+    "allauth.account.middleware.AccountMiddleware",
+]
+
+ROOT_URLCONF = 'core.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [
+            os.path.join(BASE_DIR, "templates")
+        ],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'core.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv("DB_NAME"),
+        'USER': os.getenv("DB_USER"),
+        'PASSWORD': os.getenv("DB_PASSWORD"),
+        'HOST': os.getenv("DB_HOST", "127.0.0.1"),
+        'PORT': os.getenv("DB_PORT", "5432"),
+    }
+}
+
+
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'Asia/Kathmandu'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.2/howto/static-files/
+
+STATIC_URL = '/static/'
+STATICFILES_DIRS = [
+    os.path.join(BASE_DIR, "static")
+]
+STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+# collectstatic writes content-hashed names plus .gz/.br copies (the dev profile serves plain files)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.storage.CompressedManifestStaticFilesStorage"},
+}
+# Cache lifetimes for core.middleware.StaticFilesMiddleware
+STATIC_HASHED_MAX_AGE = 60 * 60 * 24 * 365
+STATIC_UNHASHED_MAX_AGE = int(os.getenv("STATIC_UNHASHED_MAX_AGE", "60"))
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+KNN_MODEL_DIR = os.path.join(BASE_DIR, "knn_models")
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+TAILWIND_APP_NAME = 'apps.theme'
+
+# All Auth
+AUTH_USER_MODEL="users.AuthUser"
+
+ACCOUNT_EMAIL_REQUIRED = True
+ACCOUNT_EMAIL_VERIFICATION = 'none'
+LOGIN_REDIRECT_URL = '/'
+ACCOUNT_AUTHENTICATED_REDIRECT_URL = '/'
+ACCOUNT_LOGIN_METHODS=["email"]
+ACCOUNT_FORMS = {
+    'signup': 'apps.users.forms.UserRegisterForm',
+    'login': 'apps.users.forms.UserLoginForm',
+}
+
+# Email Backend
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+EMAIL_HOST = 'smtp.gmail.com'
+EMAIL_PORT = 587
+EMAIL_USE_TLS = True
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
+
+
+# Identifies the deployed code; part of page ETags so a release invalidates browser caches
+RELEASE_VERSION = os.getenv("RELEASE_VERSION", "dev")
+
+# The default cache holds cross-process version keys (city directory, availability);
+# point both aliases at a shared backend (e.g. Redis) when running several workers.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "default"),
+    },
+    # Rendered venue/city cards (apps.venue.services.fragments)
+    "fragments": {
+        "BACKEND": os.getenv("FRAGMENT_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("FRAGMENT_CACHE_LOCATION", "fragments"),
+    },
+}
+FRAGMENT_CACHE_ALIAS = "fragments"
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", str(60 * 60 * 24)))
+
+# Khalti payment gateway (apps.venue.services.khalti)
+KHALTI_BASE_URL = os.getenv("KHALTI_BASE_URL", "https://dev.khalti.com/api/v2/")
+KHALTI_SECRET_KEY = os.getenv("KHALTI_LIVE_SECRET_KEY")
+KHALTI_CONNECT_TIMEOUT = float(os.getenv("KHALTI_CONNECT_TIMEOUT", "3.05"))
+KHALTI_READ_TIMEOUT = float(os.getenv("KHALTI_READ_TIMEOUT", "10"))
+KHALTI_MAX_RETRIES = int(os.getenv("KHALTI_MAX_RETRIES", "2"))
+KHALTI_BREAKER_THRESHOLD = int(os.getenv("KHALTI_BREAKER_THRESHOLD", "5"))
+KHALTI_BREAKER_RESET = float(os.getenv("KHALTI_BREAKER_RESET", "30"))
+
+# Payment reconciliation (apps.venue.tasks.reconcile_payments)
+KHALTI_RECONCILE_SCHEDULE = os.getenv("KHALTI_RECONCILE_SCHEDULE", "*/10 * * * *")
+KHALTI_RECONCILE_CHUNK_SIZE = int(os.getenv("KHALTI_RECONCILE_CHUNK_SIZE", "100"))
+KHALTI_RECONCILE_CONCURRENCY = int(os.getenv("KHALTI_RECONCILE_CONCURRENCY", "8"))
+
+# Booking status sweeper (apps.venue.tasks.update_booking_statuses)
+BOOKING_SWEEP_SCHEDULE = os.getenv("BOOKING_SWEEP_SCHEDULE", "0 0 * * *")
+BOOKING_SWEEP_CHUNK_SIZE = int(os.getenv("BOOKING_SWEEP_CHUNK_SIZE", "500"))
+
+# Unpaid bookings hold their date for this long before release_expired_holds frees it
+BOOKING_HOLD_TTL_MINUTES = int(os.getenv("BOOKING_HOLD_TTL_MINUTES", "15"))
+BOOKING_HOLD_RELEASE_SCHEDULE = os.getenv("BOOKING_HOLD_RELEASE_SCHEDULE", "* * * * *")
+
+# Visitor location lives in a signed cookie (apps.venue.services.location), not the session
+USER_LOCATION_COOKIE_NAME = "user_location"
+USER_LOCATION_COOKIE_AGE = 60 * 60 * 24 * 30
+# Roughly 100m; closer readings don't rewrite the cookie
+USER_LOCATION_TOLERANCE = float(os.getenv("USER_LOCATION_TOLERANCE", "0.001"))
+
+# Resized/WebP variants of uploaded images (apps.venue.services.images)
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1024)
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80"))
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", "2"))
+# Generate on a background thread pool; off runs inline after commit
+IMAGE_DERIVATIVES_ASYNC = True
+
+# Request profiling (core.middleware.RequestProfilingMiddleware); 0 disables it
+REQUEST_PROFILING_SAMPLE_RATE = float(os.getenv("REQUEST_PROFILING_SAMPLE_RATE", "0.05"))
+# One query shape repeated this many times in a request is logged as a suspected N+1
+REQUEST_PROFILING_N_PLUS_ONE_THRESHOLD = int(os.getenv("REQUEST_PROFILING_N_PLUS_ONE_THRESHOLD", "5"))
+# Server-Timing reveals query counts and timings: staff only, unless this is on
+REQUEST_PROFILING_SERVER_TIMING = False
+
+# JSON logs on stdout, written by a background thread (core.logging.NonBlockingQueueHandler)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "request_context": {"()": "core.logging.RequestContextFilter"},
+    },
+    "formatters": {
+        "json": {
+            "()": "pythonjsonlogger.json.JsonFormatter",
+            "fmt": "%(asctime)s %(levelname)s %(name)s %(message)s %(request_id)s %(elapsed_ms)s",
+            "rename_fields": {"asctime": "time", "levelname": "level", "name": "logger"},
+        },
+        "plain": {
+            "format": "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s",
+        },
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "stream": "ext://sys.stdout",
+            "formatter": "json",
+        },
+        # Sorts after "console", so dictConfig has built it by the time it's referenced here
+        "queue": {
+            "()": "core.logging.NonBlockingQueueHandler",
+            "handlers": ["cfg://handlers.console"],
+            "filters": ["request_context"],
+        },
+    },
+    "root": {
+        "handlers": ["queue"],
+        "level": LOG_LEVEL,
+    },
+    "loggers": {
+        # Through the queue like everything else, instead of Django's own console handler
+        "django": {"handlers": [], "level": "INFO"},
+        # Django already logs 4xx/5xx requests; core.requests covers every request
+        "django.request": {"level": "ERROR"},
+    },
+}
+
+# /metrics (core.metrics) requires "Authorization: Bearer <token>"; without a token
+# it answers 403 unless anonymous scraping is allowed (the dev profile does)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_ALLOW_ANONYMOUS = False
+
+SESSION_CLEANUP_SCHEDULE = os.getenv("SESSION_CLEANUP_SCHEDULE", "30 3 * * *")
+SESSION_CLEANUP_BATCH_SIZE = int(os.getenv("SESSION_CLEANUP_BATCH_SIZE", "1000"))
+
+CRONJOBS = [
+    (BOOKING_SWEEP_SCHEDULE, 'apps.venue.tasks.update_booking_statuses'),
+    (BOOKING_HOLD_RELEASE_SCHEDULE, 'apps.venue.tasks.release_expired_holds'),
+    (KHALTI_RECONCILE_SCHEDULE, 'apps.venue.tasks.reconcile_payments'),
+    (SESSION_CLEANUP_SCHEDULE, 'django.core.management.call_command', ['clear_expired_sessions']),
+]
+
+NPM_BIN_PATH = "npm.cmd"
\ No newline at end of file
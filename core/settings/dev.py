@@ -0,0 +1,37 @@
+"""Local development: debug pages, live reload and uncollected static files."""
+import copy
+import os
+
+from core.settings.base import *  # noqa
+from core.settings.base import INSTALLED_APPS, LOGGING, MIDDLEWARE, STORAGES
+
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+INSTALLED_APPS = INSTALLED_APPS + [
+    # Tailwind
+    'django_browser_reload',
+]
+
+MIDDLEWARE = MIDDLEWARE + [
+    # Tailwind
+    "django_browser_reload.middleware.BrowserReloadMiddleware",
+]
+
+STORAGES = {
+    **STORAGES,
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Profile every request locally
+REQUEST_PROFILING_SAMPLE_RATE = 1.0
+REQUEST_PROFILING_SERVER_TIMING = True
+
+# Scrape /metrics locally without a token
+METRICS_ALLOW_ANONYMOUS = True
+
+# Readable logs locally; LOG_LEVEL=INFO to also see every request and its profile
+LOGGING = copy.deepcopy(LOGGING)
+LOGGING["handlers"]["console"]["formatter"] = "plain"
+LOGGING["root"]["level"] = os.getenv("LOG_LEVEL", "WARNING")
@@ -0,0 +1,83 @@
+"""
+Production: no debug tooling, persistent (or pooled) database connections,
+cached template loading, a shared cache and cache-backed sessions.
+Requires DJANGO_SECRET_KEY, ALLOWED_HOSTS and REDIS_URL in the environment.
+"""
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from core.settings.base import *  # noqa
+from core.settings.base import DATABASES, TEMPLATES
+
+# Copies, so the base profile's dicts stay untouched
+DATABASES = copy.deepcopy(DATABASES)
+TEMPLATES = copy.deepcopy(TEMPLATES)
+
+DEBUG = False
+
+SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
+ALLOWED_HOSTS = [host.strip() for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host.strip()]
+CSRF_TRUSTED_ORIGINS = [
+    f"https://*{host}" if host.startswith(".") else f"https://{host}" for host in ALLOWED_HOSTS if host != "*"
+]
+
+# Database connections
+try:
+    import psycopg_pool  # noqa: F401
+except ImportError:  # psycopg2: keep one connection per worker thread instead of a pool
+    psycopg_pool = None
+
+if psycopg_pool is not None:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        },
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", "600"))
+# Ping reused connections once per request so a restarted Postgres doesn't surface as errors
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# Parse each template once per process
+TEMPLATES[0]["APP_DIRS"] = False
+TEMPLATES[0]["OPTIONS"]["loaders"] = [
+    ("django.template.loaders.cached.Loader", [
+        "django.template.loaders.filesystem.Loader",
+        "django.template.loaders.app_directories.Loader",
+    ]),
+]
+
+# Version keys and fragments must be shared by every worker process. Per-process
+# locmem is only acceptable for a single-process deployment or a local benchmark,
+# so it has to be asked for explicitly with ALLOW_LOCAL_CACHE=True.
+REDIS_URL = os.getenv("REDIS_URL")
+if not REDIS_URL and os.getenv("ALLOW_LOCAL_CACHE") != "True":
+    raise ImproperlyConfigured(
+        "Set REDIS_URL: without a shared cache, cache invalidation does not reach the other worker processes "
+        "(set ALLOW_LOCAL_CACHE=True to run with per-process caches anyway)"
+    )
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "venuewise",
+        },
+        "fragments": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "venuewise:fragments",
+        },
+    }
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+SESSION_COOKIE_SECURE = os.getenv("SECURE_COOKIES", "True") == "True"
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
+SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+
+CRONTAB_DJANGO_SETTINGS_MODULE = "core.settings.production"
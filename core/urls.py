@@ -19,6 +19,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from apps.venue.urls import store_user_location
+from core.metrics import metrics_view
 
 admin.site.site_title = "Venuewise"
 admin.site.site_header = "Venuewise Dashboard"
@@ -30,12 +31,14 @@ urlpatterns = [
     path('', include('apps.home.urls')),
     path('venue/', include('apps.venue.urls')),
     path('account/', include('apps.users.urls')),
-    path("__reload__/", include("django_browser_reload.urls")),
-
-    path('api/store-location/', store_user_location, name = "store-location")
+    path('api/store-location/', store_user_location, name = "store-location"),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
 
+if "django_browser_reload" in settings.INSTALLED_APPS:
+    urlpatterns.append(path("__reload__/", include("django_browser_reload.urls")))
+
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
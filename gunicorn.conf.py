@@ -0,0 +1,7 @@
+# Lets /metrics aggregate samples from every worker (see core/metrics.py).
+# Start gunicorn with PROMETHEUS_MULTIPROC_DIR pointing at an empty directory.
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
@@ -11,6 +11,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
             openModal(bookingModal);
             bookNow(vegPrice, nonVegPrice);
+            watchAvailability(bookNowBtn.getAttribute("data-availability-url"));
         })
     }
 
@@ -102,6 +103,40 @@ function closeModal(modal, bookingForm) {
 }
 
 
+const availabilityByMonth = new Map();
+
+function fetchAvailability(url, month) {
+    // One request per month; the browser revalidates repeats with the ETag
+    if (!availabilityByMonth.has(month)) {
+        const request = fetch(`${url}?month=${month}`)
+            .then(response => response.ok ? response.json() : {days: []})
+            .then(data => new Set(data.days.filter(day => day.status === 'booked').map(day => day.date)))
+            .catch(() => new Set());
+        availabilityByMonth.set(month, request);
+    }
+    return availabilityByMonth.get(month);
+}
+
+function watchAvailability(url) {
+    const dateInput = document.getElementById('id_booked_for');
+    if (!url || !dateInput || dateInput.dataset.availabilityBound) {
+        return;
+    }
+    dateInput.dataset.availabilityBound = "true";
+
+    const today = new Date().toISOString().slice(0, 7);
+    fetchAvailability(url, today);
+
+    dateInput.addEventListener('change', async function () {
+        const errorField = document.getElementById('booked_for_error');
+        if (!this.value) {
+            return;
+        }
+        const bookedDates = await fetchAvailability(url, this.value.slice(0, 7));
+        errorField.textContent = bookedDates.has(this.value) ? `The venue is already booked for ${this.value}` : "";
+    });
+}
+
 function bookNow(vegPrice, nonVegPrice) {
     const bookingModal = document.getElementById('bookingModal');
     const bookNowBtn = document.getElementById('bookNowBtn');